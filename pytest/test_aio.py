@@ -0,0 +1,51 @@
+import os, sys
+import pytest
+from uncompyle6.main import decompile_file
+if sys.version_info[0] < 3:
+    from StringIO import StringIO
+else:
+    from io import StringIO
+
+testdir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', 'test', 'bytecode_2.7')
+
+@pytest.mark.skipif(sys.version_info < (3, 4),
+                    reason="needs asyncio and concurrent.futures")
+def test_decompile_files(tmpdir):
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+    from uncompyle6 import aio
+
+    bogus = tmpdir.join('bogus.pyc')
+    bogus.write('not bytecode')
+    filenames = [os.path.join(testdir, name)
+                 for name in ('00_assign.pyc', '01_class.pyc', '05_if.pyc')]
+    filenames.append(str(bogus))
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    executor = ProcessPoolExecutor(2)
+    saved_stdout = sys.stdout
+    try:
+        single = loop.run_until_complete(
+            aio.decompile_file(filenames[0], executor, loop, stats=True))
+        results = loop.run_until_complete(asyncio.gather(
+            *aio.decompile_files(filenames, executor, loop, limit=2)))
+    finally:
+        executor.shutdown()
+        asyncio.set_event_loop(None)
+        loop.close()
+    assert sys.stdout is saved_stdout
+
+    assert single.status == 'ok'
+    assert single.stats['records'][0]['kind'] == 'file'
+    results = dict((result.filename, result) for result in results)
+    assert sorted(results) == sorted(filenames)
+    for filename in filenames[:3]:
+        out = StringIO()
+        decompile_file(filename, out)
+        assert results[filename].status == 'ok'
+        assert results[filename].source == out.getvalue()
+        assert results[filename].stats is None
+    assert results[str(bogus)].status == 'error'
+    assert results[str(bogus)].message
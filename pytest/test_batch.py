@@ -0,0 +1,57 @@
+import os, sys, time
+import pytest
+from uncompyle6 import batch
+from uncompyle6.batch import decompile_tree, summarize
+
+srcdir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      '..', 'test', 'bytecode_2.7')
+files = ['00_assign.pyc', '01_ops.pyc', '03_if_elif.pyc']
+
+def test_decompile_tree(tmpdir):
+    results = list(decompile_tree(srcdir, files, out_base=str(tmpdir),
+                                  numproc=2, prewarm=False))
+    assert sorted(r.filename for r in results) == files
+    assert set(r.status for r in results) == set(['ok'])
+    assert summarize(results) == (3, 3, 0, 0, 0)
+    for f in files:
+        assert os.path.exists(os.path.join(str(tmpdir), f[:-1]))
+
+def test_schedule():
+    scheduled = batch.schedule(srcdir, files)
+    sizes = [os.path.getsize(os.path.join(srcdir, f)) for f in scheduled]
+    assert sizes == sorted(sizes, reverse=True)
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'),
+                    reason="relies on workers being forked")
+def test_timeout(tmpdir, monkeypatch):
+    def slow_decompile_one(in_base, out_base, filename, outfile, options):
+        time.sleep(30)
+    monkeypatch.setattr(batch, 'decompile_one', slow_decompile_one)
+    start = time.time()
+    results = list(decompile_tree(srcdir, files[:1], out_base=str(tmpdir),
+                                  numproc=1, timeout=0.5, prewarm=False))
+    assert time.time() - start < 10
+    assert [r.status for r in results] == ['timeout']
+    assert summarize(results) == (0, 0, 1, 0, 0)
+
+def test_parse_budget(tmpdir):
+    from uncompyle6 import parser
+    from uncompyle6.main import main
+    saved = dict(parser.PARSE_BUDGET)
+    try:
+        result = main(srcdir, str(tmpdir), files[:1], [],
+                      parse_budget={'items': 10}, count_budget=True)
+    finally:
+        parser.PARSE_BUDGET.update(saved)
+    assert result == (0, 0, 0, 0, 1)
+
+def test_parse_budget_restored(tmpdir):
+    from uncompyle6 import parser
+    from uncompyle6.main import main
+    saved = dict(parser.PARSE_BUDGET)
+    # Without count_budget, going over the budget counts as a failure
+    assert main(srcdir, str(tmpdir), files[:1], [],
+                parse_budget={'items': 10}) == (0, 0, 1, 0)
+    assert parser.PARSE_BUDGET == saved
+    # A later run without a budget isn't held to the earlier one
+    assert main(srcdir, str(tmpdir), files[:1], []) == (1, 0, 0, 0)
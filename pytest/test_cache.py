@@ -0,0 +1,93 @@
+import os, sys
+from uncompyle6.cache import ResultCache
+from uncompyle6.main import decompile_file, decompile as decompile_code
+from uncompyle6.semantics import pysource
+from xdis.load import load_module
+if sys.version_info[0] < 3:
+    from StringIO import StringIO
+else:
+    from io import StringIO
+
+testdir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', 'test', 'bytecode_2.7')
+
+def decompile(filename, cache):
+    out = StringIO()
+    key = decompile_file(filename, out, cache=cache)
+    return key, out.getvalue()
+
+def test_result_cache(tmpdir):
+    cache = ResultCache(str(tmpdir))
+    filename = os.path.join(testdir, '00_assign.pyc')
+    key, source = decompile(filename, cache)
+    assert cache.get(key)['source'] in source
+
+    # The second time around nothing is decompiled
+    saved = pysource.deparse_code
+    def deparse_code(*args, **kwargs):
+        assert False, "should have come from the cache"
+    pysource.deparse_code = deparse_code
+    try:
+        assert decompile(filename, cache) == (key, source)
+    finally:
+        pysource.deparse_code = saved
+
+    # Showing the assembly bypasses the cache
+    assert decompile_file(filename, StringIO(), showasm=StringIO(),
+                          cache=cache) is None
+
+def test_result_cache_eviction(tmpdir):
+    cache = ResultCache(str(tmpdir), size=2500)
+    cache.put('a', {'source': 'x' * 1000, 'verify': {}})
+    cache.put('b', {'source': 'y' * 1000, 'verify': {}})
+    os.utime(cache.path('a'), (1, 1))
+    assert cache.get('b') is not None
+    cache.put('c', {'source': 'z' * 1000, 'verify': {}})
+    assert cache.get('a') is None
+    assert cache.get('b')['source'] == 'y' * 1000
+    assert cache.get('c') is not None
+    assert [n for n in os.listdir(str(tmpdir)) if n.endswith('.tmp')] == []
+
+def test_function_cache(tmpdir):
+    cache = ResultCache(str(tmpdir))
+    filename = os.path.join(testdir, '10_class.pyc')
+    version, timestamp, magic_int, co, is_pypy, source_size = \
+      load_module(filename)
+
+    parsed = []
+    saved = pysource.SourceWalker.build_ast
+    def build_ast(self, tokens, *args, **kwargs):
+        parsed.append(tokens)
+        return saved(self, tokens, *args, **kwargs)
+    pysource.SourceWalker.build_ast = build_ast
+    try:
+        sources = []
+        for function_cache in (None, cache, cache):
+            out = StringIO()
+            del parsed[:]
+            pysource.deparse_code(version, co, out, is_pypy=is_pypy,
+                                  function_cache=function_cache)
+            sources.append((out.getvalue(), len(parsed)))
+    finally:
+        pysource.SourceWalker.build_ast = saved
+
+    # The bodies come from the cache the second time, and only the
+    # module itself is parsed
+    assert sources[0] == sources[1]
+    assert sources[2] == (sources[0][0], 1)
+    assert sources[0][1] > 1
+
+def test_function_cache_only(tmpdir):
+    # A cache without a key for the whole file caches just the bodies
+    cache = ResultCache(str(tmpdir))
+    filename = os.path.join(testdir, '10_class.pyc')
+    version, timestamp, magic_int, co, is_pypy, source_size = \
+      load_module(filename)
+    sources = []
+    for i in range(2):
+        out = StringIO()
+        decompile_code(version, co, out, is_pypy=is_pypy, cache=cache)
+        sources.append(out.getvalue())
+    assert sources[0] == sources[1]
+    assert 'class ' in sources[0]
+    assert os.listdir(str(tmpdir))
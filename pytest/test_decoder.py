@@ -0,0 +1,45 @@
+import os
+from array import array
+from xdis.bytecode import Bytecode
+from xdis.code import iscode
+from xdis.load import load_module
+from uncompyle6 import PYTHON_VERSION
+from uncompyle6.scanner import get_scanner
+from uncompyle6.scanners.decoder import CodeInstructions
+
+testdir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', 'test')
+
+def check_code(scanner, co):
+    scanner.code = array('B', co.co_code)
+    instructions = CodeInstructions(scanner, co)
+    expected = list(Bytecode(co, scanner.opc))
+    assert len(instructions.offsets) == len(expected)
+    for i, inst in enumerate(expected):
+        assert instructions.offsets[i] == inst.offset
+        assert instructions.ops[i] == inst.opcode
+        assert instructions.argval(i) == inst.argval
+        assert instructions.argrepr(i) == inst.argrepr
+    for const in co.co_consts:
+        if iscode(const):
+            check_code(scanner, const)
+
+def test_decoder():
+    for bytecode, name in (('bytecode_2.7', '05_if.pyc'),
+                           ('bytecode_3.2', '01_delete_deref.pyc'),
+                           ('bytecode_3.5', '09_class_closure.pyc'),
+                           ('bytecode_3.6', '03_while_else.pyc')):
+        filename = os.path.join(testdir, bytecode, name)
+        version, timestamp, magic_int, co, is_pypy, source_size = \
+          load_module(filename)
+        check_code(get_scanner(version, is_pypy), co)
+
+def test_decoder_extended_arg():
+    # Enough names that some need an EXTENDED_ARG
+    if PYTHON_VERSION >= 3.6:
+        count = 300
+    else:
+        count = 70000
+    source = '\n'.join('x%d = %d' % (i, i) for i in range(count))
+    co = compile(source + '\nif x1:\n    y = 1\n', '<test>', 'exec')
+    check_code(get_scanner(PYTHON_VERSION), co)
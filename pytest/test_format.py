@@ -0,0 +1,19 @@
+from uncompyle6.semantics.consts import compile_format
+from uncompyle6.scanners.tok import Token
+
+def test_compile_format():
+    ops, tail = compile_format('%|for %[0]c in %p:\n%+%C%-')
+    assert [op[:3] for op in ops] == [
+        ('', None, '|'), ('for ', 0, 'c'), (' in ', None, 'p'),
+        (':\n', None, '+'), ('', None, 'C'), ('', None, '-')]
+    assert tail == ''
+    assert compile_format('%|for %[0]c in %p:\n%+%C%-')[0] is ops
+
+    ops, tail = compile_format("%|del %{pattr}\n")
+    prefix, child, typ, getter = ops[1]
+    assert (prefix, child, typ) == ('del ', None, '{')
+    assert getter(Token('DELETE_NAME', pattr='x')) == 'x'
+    assert tail == '\n'
+
+    ops, tail = compile_format("%{pattr + '!'}")
+    assert ops[0][3](Token('LOAD_NAME', pattr='x')) == 'x!'
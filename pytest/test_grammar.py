@@ -63,3 +63,141 @@ def test_dup_rule():
                   parser_debug={
                       'dups': True, 'transition': False, 'reduce': False,
                       'rules': False, 'errorstack': None, 'context': True})
+
+def test_parser_cache():
+    p = get_python_parser(PYTHON_VERSION, is_pypy=IS_PYPY)
+    q = get_python_parser(PYTHON_VERSION, is_pypy=IS_PYPY)
+    assert p is not q
+    assert p.rules == q.rules
+
+    # Custom rules added to one parser shouldn't show up in another
+    p.add_unique_rule("expr ::= expr LOAD_FOO", 'LOAD_FOO', 0, {})
+    assert "expr ::= expr LOAD_FOO" in p.new_rules
+    assert "expr ::= expr LOAD_FOO" not in q.new_rules
+    assert p.rules['expr'] != q.rules['expr']
+    r = get_python_parser(PYTHON_VERSION, is_pypy=IS_PYPY)
+    assert r.rules == q.rules
+
+    # Semantic actions are bound to the clone, not to the cached parser
+    rule = p.rules['expr'][0]
+    assert p.rule2func[rule](['x']).type == 'expr'
+    assert p.rule2func[rule].__defaults__[1] is p
+
+def test_grammar_cache(tmpdir):
+    from uncompyle6.parser import (get_python_parser, grammar_cache_path,
+                                   load_grammar, save_grammar)
+    p = get_python_parser(PYTHON_VERSION, is_pypy=IS_PYPY, use_cache=False)
+    path = grammar_cache_path(p.__class__, str(tmpdir))
+    assert load_grammar(p.__class__, path) is None
+    save_grammar(p, path)
+    q = load_grammar(p.__class__, path)
+    assert q.__class__ == p.__class__
+    assert q.rules == p.rules
+    assert q.rule2name == p.rule2name
+    assert set(q.rule2func.keys()) == set(p.rule2func.keys())
+
+    # A parser loaded from the cache can be customized and used
+    from uncompyle6.parser import parse
+    co = compile("x = [a + 1 for a in range(10)]\n", "<test>", "exec")
+    tokens, customize = get_scanner(PYTHON_VERSION, IS_PYPY).ingest(co)
+    assert parse(q, tokens, customize) == 'stmts'
+
+def test_push_pop_rules():
+    p = get_python_parser(PYTHON_VERSION, is_pypy=IS_PYPY)
+    rules = dict((lhs, list(r)) for lhs, r in p.rules.items())
+    rule2name = dict(p.rule2name)
+    new_rules = set(p.new_rules)
+    p.push_rules()
+    customize = {}
+    p.add_unique_rule("expr ::= expr LOAD_FOO", 'LOAD_FOO', 0, customize)
+    p.add_unique_rule("foo ::= LOAD_FOO", 'LOAD_FOO', 0, customize)
+    assert 'foo' in p.rules
+    p.pop_rules()
+    assert p.rules == rules
+    assert p.rule2name == rule2name
+    assert set(p.rule2func.keys()) == set(rule2name.keys())
+    assert p.new_rules == new_rules
+    assert p.rule_stack == []
+
+    # Custom rules added when parsing are kept only up to a limit
+    from uncompyle6 import parser
+    co = compile("x = [a, b, c]\nf(x, 1)\n", "<test>", "exec")
+    scanner = get_scanner(PYTHON_VERSION, IS_PYPY)
+    tokens, customize = scanner.ingest(co)
+    assert parser.parse(p, tokens, customize) == 'stmts'
+    assert p.rules_added() > 0
+    saved = parser.MAX_CUSTOM_RULES
+    parser.MAX_CUSTOM_RULES = 0
+    try:
+        co = compile("f(1, 2, 3)\n", "<test>", "exec")
+        tokens, customize = scanner.ingest(co)
+        assert parser.parse(p, tokens, customize) == 'stmts'
+    finally:
+        parser.MAX_CUSTOM_RULES = saved
+    # Going back to the base grammar dropped the BUILD_LIST_3 rule
+    assert not [r for r in p.new_rules if r.endswith('BUILD_LIST_3')]
+    p.pop_rules()
+    assert p.rules == rules
+
+def test_parse_budget():
+    import pytest
+    from uncompyle6.parser import parse, ParseBudgetExceeded
+    co = compile("x = [a, b, c]\nf(x, 1)\n", "<test>", "exec")
+    scanner = get_scanner(PYTHON_VERSION, IS_PYPY)
+    p = get_python_parser(PYTHON_VERSION, is_pypy=IS_PYPY)
+    for budget in ({'items': 10}, {'states': 5}, {'seconds': -1}):
+        p.budget = budget
+        tokens, customize = scanner.ingest(co)
+        with pytest.raises(ParseBudgetExceeded):
+            parse(p, tokens, customize)
+    p.budget = {'items': 100000, 'states': 100000, 'seconds': 100}
+    tokens, customize = scanner.ingest(co)
+    assert parse(p, tokens, customize) == 'stmts'
+
+def test_parse_budget_states():
+    # Only the states a parse adds count, not those left from earlier
+    # parses with the same parser
+    from uncompyle6.parser import parse
+    scanner = get_scanner(PYTHON_VERSION, IS_PYPY)
+    p = get_python_parser(PYTHON_VERSION, is_pypy=IS_PYPY)
+    source = ("for x in a:\n"
+              "    if x or b: y = {k: x for k in b}\n"
+              "    elif x and not b: continue\n"
+              "while a:\n"
+              "    try: del a[1:2]\n"
+              "    except KeyError as e: raise\n"
+              "    finally: a = [a, b, (a, b)]\n"
+              "with a as b: c = a\n"
+              "x = lambda a, b=1: a if b else -a\n")
+    co = compile(source, "<test>", "exec")
+    tokens, customize = scanner.ingest(co)
+    assert parse(p, tokens, customize) == 'stmts'
+    assert len(p.states) > 100
+    p.budget = {'states': 100}
+    tokens, customize = scanner.ingest(compile("x = 1\n", "<test>", "exec"))
+    assert parse(p, tokens, customize) == 'stmts'
+
+def test_parse_tables():
+    # The parse tables PythonParser builds are the ones spark would
+    from spark_parser import GenericParser
+    from uncompyle6.parser import parse
+    co = compile("def f(a, *b, **c):\n"
+                 "    for x in a:\n"
+                 "        if x or b: yield {k: x for k in c}\n"
+                 "while f:\n"
+                 "    try: del a[1:2]\n"
+                 "    except KeyError as e: raise\n", "<test>", "exec")
+    scanner = get_scanner(PYTHON_VERSION, IS_PYPY)
+    tokens, customize = scanner.ingest(co)
+    p = get_python_parser(PYTHON_VERSION, is_pypy=IS_PYPY)
+    q = get_python_parser(PYTHON_VERSION, is_pypy=IS_PYPY)
+    q.makeState = lambda state, sym: GenericParser.makeState(q, state, sym)
+    q.makeSet = lambda tokens, sets, i: GenericParser.makeSet(q, tokens, sets, i)
+    assert parse(p, tokens, customize) == parse(q, tokens, customize)
+    assert p.edges == q.edges
+    assert p.cores == q.cores
+    assert sorted(p.states.keys()) == sorted(q.states.keys())
+    for k in p.states:
+        for attr in ('items', 'complete', 'T'):
+            assert getattr(p.states[k], attr) == getattr(q.states[k], attr)
+    assert p.links == q.links
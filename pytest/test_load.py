@@ -0,0 +1,38 @@
+import os
+import xdis.load
+from uncompyle6.load import load_module, prefetch
+
+testdir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', 'test')
+
+def test_load_module():
+    for bytecode in ('bytecode_2.7', 'bytecode_3.6', 'bytecode_3.2'):
+        dirname = os.path.join(testdir, bytecode)
+        for name in sorted(os.listdir(dirname))[:10]:
+            if not name.endswith('.pyc'):
+                continue
+            filename = os.path.join(dirname, name)
+            version, timestamp, magic_int, co, is_pypy, source_size = \
+              load_module(filename)
+            expected = xdis.load.load_module(filename)
+            assert (version, timestamp, magic_int, is_pypy, source_size) == \
+              expected[:3] + expected[4:], filename
+            assert co.co_code == expected[3].co_code
+            assert len(co.co_consts) == len(expected[3].co_consts)
+
+def test_prefetch(tmpdir):
+    bogus = tmpdir.join('bogus.pyc')
+    bogus.write('not bytecode')
+    filenames = [os.path.join(testdir, 'bytecode_2.7', '00_assign.pyc'),
+                 str(bogus), str(tmpdir.join('missing.pyc')),
+                 os.path.join(testdir, 'bytecode_3.6', '00_assign.pyc')]
+    loaded = list(prefetch(filenames))
+    assert [filename for filename, pyc in loaded] == filenames
+    assert loaded[0][1].supported and loaded[3][1].supported
+    assert not loaded[1][1].supported
+    assert loaded[2][1] is None
+    assert load_module(filenames[3], pyc=loaded[3][1])[0] == 3.6
+    assert loaded[3][1].mapping is None
+    for filename, pyc in loaded:
+        if pyc is not None:
+            pyc.close()
@@ -0,0 +1,136 @@
+import os
+from array import array
+from xdis.load import load_module
+from uncompyle6.scanner import get_scanner
+
+testdir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', 'test')
+
+def scanners():
+    for bytecode, name in (('bytecode_2.7', '05_if.pyc'),
+                           ('bytecode_3.6', '03_while_else.pyc'),
+                           ('bytecode_3.4', '10_for.pyc')):
+        filename = os.path.join(testdir, bytecode, name)
+        version, timestamp, magic_int, co, is_pypy, source_size = \
+          load_module(filename)
+        scanner = get_scanner(version, is_pypy)
+        scanner.code = array('B', co.co_code)
+        yield scanner
+
+def linear_instrs(scanner, start, end, instr):
+    return [offset for offset in scanner.decode_range(start, end)
+            if scanner.code[offset] in instr]
+
+def test_instr_queries():
+    for scanner in scanners():
+        opc = scanner.opc
+        code = scanner.code
+        offsets = list(scanner.decode_range(0, len(code)))
+        jumps = [offset for offset in offsets
+                 if code[offset] in opc.hasjrel + opc.hasjabs]
+        targets = set(scanner.get_target(offset) for offset in jumps)
+        for instr in ([opc.JUMP_ABSOLUTE], [opc.RETURN_VALUE],
+                      opc.hasjrel + opc.hasjabs):
+            for start in offsets[:6] + [1]:
+                for end in (len(code), len(code) // 2, start):
+                    found = linear_instrs(scanner, start, end, instr)
+                    assert scanner.all_instr(start, end, instr) == found
+                    assert (scanner.first_instr(start, end, instr)
+                            == (found[0] if found else None))
+                    assert (scanner.last_instr(start, end, instr)
+                            == (found[-1] if found else None))
+                    if instr == [opc.RETURN_VALUE]:
+                        continue
+                    for target in targets:
+                        exact = [offset for offset in found
+                                 if scanner.get_target(offset) == target]
+                        beyond = [offset for offset in found
+                                  if scanner.get_target(offset) >= target]
+                        assert (scanner.all_instr(start, end, instr, target)
+                                == exact)
+                        assert scanner.all_instr(start, end, instr, target,
+                                                 True) == beyond
+                        assert (scanner.first_instr(start, end, instr, target)
+                                == (exact[0] if exact else None))
+                        assert (scanner.last_instr(start, end, instr, target)
+                                == (exact[-1] if exact else None))
+
+def test_find_parent():
+    scanner = get_scanner(3.6)
+    scanner.structs = structs = [{'type': 'root', 'start': 0, 'end': 100}]
+    assert scanner.find_parent(0) is structs[0]
+    structs.append({'type': 'while-loop', 'start': 10, 'end': 50})
+    structs.append({'type': 'if-then', 'start': 20, 'end': 30})
+    structs.append({'type': 'else', 'start': 60, 'end': 70})
+    assert scanner.find_parent(10) is structs[1]
+    assert scanner.find_parent(24) is structs[2]
+    assert scanner.find_parent(30) is structs[1]
+    assert scanner.find_parent(60) is structs[3]
+    assert scanner.find_parent(80) is structs[0]
+
+    # A new list of structures starts over
+    scanner.structs = [{'type': 'root', 'start': 0, 'end': 100},
+                       {'type': 'if-then', 'start': 20, 'end': 30}]
+    assert scanner.find_parent(24) is scanner.structs[1]
+
+def test_instruction_table():
+    for scanner in scanners():
+        code = scanner.code
+        table = scanner.get_instructions()
+        assert list(table.offsets) == list(scanner.decode_range(0, len(code)))
+        for i, offset in enumerate(table.offsets):
+            op = code[offset]
+            assert table.ops[i] == op
+            assert table.index[offset] == i
+            if op >= scanner.opc.HAVE_ARGUMENT:
+                if scanner.version >= 3.6:
+                    assert table.args[i] == code[offset+1]
+                else:
+                    assert table.args[i] == scanner.get_argument(offset)
+                if op in scanner.opc.hasjrel + scanner.opc.hasjabs:
+                    assert table.targets[i] == scanner.get_target(offset)
+            else:
+                assert table.args[i] == table.targets[i] == -1
+        assert list(scanner.op_range(2, len(code))) == \
+          list(scanner.decode_range(2, len(code)))
+        assert scanner.get_instructions() is table
+
+def test_lines_data():
+    for filename in ('bytecode_2.7/05_if.pyc', 'bytecode_3.6/03_while_else.pyc'):
+        version, timestamp, magic_int, co, is_pypy, source_size = \
+          load_module(os.path.join(testdir, filename))
+        scanner = get_scanner(version, is_pypy)
+        scanner.code = array('B', co.co_code)
+        codelen = len(scanner.code)
+        if version >= 3.0:
+            scanner.build_lines_data(co)
+        else:
+            scanner.build_lines_data(co, codelen)
+        starts = sorted(scanner.opc.findlinestarts(co))
+        lines = scanner.lines
+        assert len(lines) == codelen
+        for i, (start, line_no) in enumerate(starts):
+            if i + 1 < len(starts):
+                end = starts[i+1][0]
+            else:
+                end = codelen
+            for offset in range(start, end):
+                assert lines[offset].next == end
+                # Scanner2 gives the starting offset after the first line
+                if version >= 3.0 or i == 0:
+                    assert lines[offset].l_no == line_no
+        assert lines[-1] == lines[codelen-1]
+        l_no, next_offset = lines[0]
+        assert next_offset == lines[0].next
+
+def test_load_asserts():
+    from uncompyle6 import PYTHON_VERSION
+    co = compile('def f(x):\n'
+                 '    assert x\n'
+                 '    if x:\n'
+                 '        raise AssertionError\n', '<test>', 'exec')
+    scanner = get_scanner(PYTHON_VERSION)
+    tokens, customize = scanner.ingest(co.co_consts[0])
+    assert [t.type for t in tokens
+            if t.type in ('LOAD_ASSERT', 'LOAD_GLOBAL')] == \
+      ['LOAD_ASSERT', 'LOAD_GLOBAL']
@@ -0,0 +1,96 @@
+import sys
+from uncompyle6 import PYTHON_VERSION, IS_PYPY
+from uncompyle6.semantics.pysource import deparse_code
+from uncompyle6.stats import DecompileStats, PHASES
+if sys.version_info[0] < 3:
+    from StringIO import StringIO
+else:
+    from io import StringIO
+
+def test_stats():
+    source = ("class C:\n"
+              "    def f(self, a):\n"
+              "        return [x + 1 for x in a]\n"
+              "g = lambda y: y\n")
+    co = compile(source, '<test>', 'exec')
+    stats = DecompileStats()
+    deparse_code(PYTHON_VERSION, co, out=StringIO(), is_pypy=IS_PYPY,
+                 stats=stats)
+
+    assert len(stats.records) == 1
+    module = stats.records[0]
+    assert (module.kind, module.name) == ('code', '<module>')
+    assert module.tokens > 0 and module.parse_items > 0
+    assert module.ast_nodes > 0
+    for phase in ('ingest', 'parse', 'checker', 'gen_source'):
+        assert phase in module.phases
+    gen_source = module.phases['gen_source']
+    assert gen_source['self_seconds'] <= gen_source['seconds']
+
+    kinds = [(child.kind, child.name) for child in module.children]
+    assert kinds == [('class', 'C'), ('lambda', '<lambda>')]
+    klass = module.children[0]
+    assert [(child.kind, child.name) for child in klass.children] == [
+        ('function', 'f')]
+    comprehension = klass.children[0].children[0]
+    assert comprehension.kind == 'comprehension'
+    assert comprehension.tokens > 0
+
+    totals = stats.totals()
+    assert sorted(totals.keys()) == sorted(PHASES)
+    assert totals['load'] == 0.0
+    assert stats.as_dict()['records'][0]['children'][0]['name'] == 'C'
+
+def test_stats_rss_growth():
+    try:
+        import resource
+    except ImportError:
+        return
+    stats = DecompileStats()
+    # Enough to push the process's peak up, whatever it was
+    size = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        size *= 1024
+    big = []
+    with stats.code('code', 'first'):
+        with stats.phase('parse'):
+            big.append(bytearray(size))
+            for i in range(0, len(big[0]), 4096):
+                big[0][i] = 1
+    del big[:]
+    with stats.code('code', 'second'):
+        with stats.phase('parse'):
+            pass
+    first, second = [record.phases['parse'] for record in stats.records]
+    assert first['max_rss_growth'] > 0
+    # The peak stays where it was, which isn't the second one's doing
+    assert second['max_rss_growth'] == 0
+
+def test_stats_self_rss_growth():
+    try:
+        import resource
+    except ImportError:
+        return
+    stats = DecompileStats()
+    size = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        size *= 1024
+    big = []
+    with stats.code('code', 'outer'):
+        with stats.phase('gen_source'):
+            with stats.code('function', 'inner'):
+                with stats.phase('parse'):
+                    big.append(bytearray(size))
+                    for i in range(0, len(big[0]), 4096):
+                        big[0][i] = 1
+    del big[:]
+    outer = stats.records[0]
+    inner = outer.children[0]
+    growth = inner.phases['parse']['max_rss_growth']
+    assert growth > 0
+    # The nested function's growth is the outer gen_source's too, but
+    # not its own doing
+    assert outer.phases['gen_source']['max_rss_growth'] >= growth
+    assert outer.phases['gen_source']['self_max_rss_growth'] < growth
+    totals = stats.totals('self_max_rss_growth')
+    assert totals['parse'] == growth
@@ -0,0 +1,45 @@
+import os, sys
+from uncompyle6.main import decompile_file
+from uncompyle6.semantics.pysource import StreamingOutput
+if sys.version_info[0] < 3:
+    from StringIO import StringIO
+else:
+    from io import StringIO
+
+testdir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', 'test')
+
+def decompile(filename, stream):
+    out = StringIO()
+    try:
+        decompile_file(filename, out, stream=stream)
+    except Exception as e:
+        return repr(e)
+    return out.getvalue()
+
+def test_stream_output():
+    for bytecode in ('bytecode_2.7', 'bytecode_3.6', 'ok_lib2.7'):
+        dirname = os.path.join(testdir, bytecode)
+        for name in sorted(os.listdir(dirname))[:15]:
+            if not name.endswith('.pyc'):
+                continue
+            filename = os.path.join(dirname, name)
+            assert decompile(filename, True) == decompile(filename, False), \
+              filename
+
+def test_streaming_output():
+    out = StringIO()
+    stream = StreamingOutput(out, pending_newlines=2)
+    stream.write('\n')
+    stream.flush()
+    assert out.getvalue() == ''
+    stream.write('\n\nx = 1')
+    assert stream.getvalue() == '\n\nx = 1'
+    stream.flush()
+    assert out.getvalue() == '\n\n\nx = 1'
+    assert stream.getvalue() == 'x = 1'
+    stream.write('\ny = 2\n\n')
+    stream.flush()
+    assert out.getvalue() == '\n\n\nx = 1\ny = 2'
+    assert stream.getvalue() == ''
+    assert stream.finish() == 2
@@ -0,0 +1,30 @@
+from uncompyle6 import PYTHON_VERSION
+from uncompyle6.scanner import get_scanner
+from uncompyle6.scanners.tok import Token, token_class
+
+def test_token():
+    t = Token('LOAD_NAME', attr=0, pattr='x', offset=3)
+    assert not hasattr(t, '__dict__') or t.__dict__ == {}
+    assert t.opc is None
+    assert t == Token('LOAD_NAME', pattr='x', offset=10)
+
+    # Fragments sets these
+    t.parent = None
+    t.start, t.finish = 0, 1
+    assert t.__dict__ == {}
+    # Anything else still works
+    t.foo = 1
+    assert t.foo == 1
+
+def test_token_class():
+    scanner = get_scanner(PYTHON_VERSION)
+    assert issubclass(scanner.Token, Token)
+    assert scanner.Token.opc is scanner.opc
+    assert token_class(Token, scanner.opc) is scanner.Token
+    t = scanner.Token('LOAD_CONST', offset=0)
+    assert t.opc is scanner.opc
+    assert t.__dict__ == {}
+
+    # An opc passed explicitly still wins
+    t = Token('JUMP_ABSOLUTE', opc=scanner.opc)
+    assert t.opc is scanner.opc
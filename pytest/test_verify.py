@@ -0,0 +1,54 @@
+import os, py_compile
+from uncompyle6 import verify
+from uncompyle6.cache import ResultCache
+from uncompyle6.main import VerifyStage
+
+def compile_source(tmpdir, name, source):
+    src = tmpdir.join(name + '.py')
+    src.write(source)
+    pyc = str(tmpdir.join(name + '.pyc'))
+    py_compile.compile(str(src), pyc, doraise=True)
+    return pyc, str(src)
+
+def test_get_scanner():
+    scan, scanner = verify.get_scanner(2.7, False)
+    assert verify.get_scanner(2.7, False)[1] is scanner
+    assert verify.get_scanner(3.6, False)[1] is not scanner
+
+def test_verify_stage(tmpdir):
+    good, good_src = compile_source(tmpdir, 'good', 'x = 1\n')
+    bad, bad_src = compile_source(tmpdir, 'bad', 'x = 1\n')
+    tmpdir.join('bad.py').write('x = 1\nprint(x)\n')
+    for jobs in (1, 2):
+        stage = VerifyStage(False, jobs)
+        try:
+            stage.submit('good', good, good_src)
+            stage.submit('bad', bad, bad_src)
+            outcomes = list(stage.finished(wait=True))
+        finally:
+            stage.close()
+        assert [(name, ok) for name, outfile, ok, msg in outcomes] == \
+          [('good', True), ('bad', False)]
+        assert outcomes[1][1] == bad_src
+        assert not list(stage.finished(wait=True))
+
+def test_verify_stage_cache(tmpdir):
+    pyc, src = compile_source(tmpdir, 'mod', 'x = 1\n')
+    cache = ResultCache(str(tmpdir.join('cache')))
+    cache.put('key', {'source': '', 'verify': {}})
+    stage = VerifyStage(True, 2, cache)
+    try:
+        stage.submit('mod', pyc, src, 'key')
+        assert list(stage.finished(wait=True))[0][2]
+    finally:
+        stage.close()
+    assert cache.get('key')['verify'] == {'weak': (True, None)}
+
+    # The next time the outcome comes from the cache
+    os.remove(pyc)
+    stage = VerifyStage(True, 2, cache)
+    try:
+        stage.submit('mod', pyc, src, 'key')
+        assert list(stage.finished()) == [('mod', src, True, None)]
+    finally:
+        stage.close()
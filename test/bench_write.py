@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# emacs-mode: -*-python-*-
+
+"""
+bench_write.py -- micro-benchmark SourceWalker.write()
+
+Decompiles the test/ok_lib* corpora with SourceWalker.write() and with
+the character-at-a-time version it replaced, checks that the output is
+the same, and reports the time spent generating source (the gen_source
+phase of uncompyle6.stats, not counting nested code objects) and in
+write() itself, best of --repeat runs.
+
+Usage:
+
+  bench_write.py [--repeat N] [DIR...]
+"""
+
+from __future__ import print_function
+
+import getopt, os, sys, time
+
+from uncompyle6.main import decompile_file
+from uncompyle6.semantics.pysource import SourceWalker
+from uncompyle6.stats import DecompileStats
+
+if sys.version_info[0] < 3:
+    from StringIO import StringIO
+else:
+    from io import StringIO
+
+def get_srcdir():
+    filename = os.path.normcase(os.path.dirname(__file__))
+    return os.path.realpath(filename)
+
+src_dir = get_srcdir()
+
+
+def reference_write(self, *data):
+    """SourceWalker.write() as it was before it was reworked"""
+    if (len(data) == 0) or (len(data) == 1 and data[0] == ''):
+        return
+    out = ''.join((str(j) for j in data))
+    n = 0
+    for i in out:
+        if i == '\n':
+            n += 1
+            if n == len(out):
+                self.pending_newlines = max(self.pending_newlines, n)
+                return
+        elif n:
+            self.pending_newlines = max(self.pending_newlines, n)
+            out = out[n:]
+            break
+        else:
+            break
+
+    if self.pending_newlines > 0:
+        self.f.write('\n'*self.pending_newlines)
+        self.pending_newlines = 0
+
+    for i in out[::-1]:
+        if i == '\n':
+            self.pending_newlines += 1
+        else:
+            break
+
+    if self.pending_newlines:
+        out = out[:-self.pending_newlines]
+    self.f.write(out)
+
+
+def corpus_files(dirs):
+    files = []
+    for dirname in dirs:
+        for root, _, basenames in os.walk(dirname):
+            for n in basenames:
+                if n.endswith('.pyc') or n.endswith('.pyo'):
+                    files.append(os.path.join(root, n))
+    files.sort()
+    return files
+
+
+def timed_write(write, timing):
+    def wrapper(self, *data):
+        start = time.time()
+        write(self, *data)
+        timing[0] += time.time() - start
+    return wrapper
+
+
+def render(files, write):
+    """Decompile *files* using *write* for SourceWalker.write(), and
+    return (outputs, gen_source seconds, write() seconds)."""
+    timing = [0.0]
+    stats = DecompileStats()
+    outputs = []
+    saved_write = SourceWalker.write
+    SourceWalker.write = timed_write(write, timing)
+    try:
+        for filename in files:
+            out = StringIO()
+            try:
+                decompile_file(filename, out, stats=stats)
+            except Exception as e:
+                out.write('\n# %s' % e)
+            outputs.append(out.getvalue())
+    finally:
+        SourceWalker.write = saved_write
+    return outputs, stats.totals()['gen_source'], timing[0]
+
+
+if __name__ == '__main__':
+    opts, dirs = getopt.getopt(sys.argv[1:], '', ['repeat='])
+    repeat = 5
+    for opt, val in opts:
+        if opt == '--repeat':
+            repeat = int(val)
+    if not dirs:
+        dirs = [os.path.join(src_dir, d) for d in sorted(os.listdir(src_dir))
+                if d.startswith('ok_lib')]
+    files = corpus_files(dirs)
+
+    # Build the grammars before timing anything
+    render(files, SourceWalker.write)
+
+    results = {}
+    for name, write in (('reference', reference_write),
+                        ('current', SourceWalker.write)):
+        best = None
+        for i in range(repeat):
+            outputs, gen_source, write_seconds = render(files, write)
+            if best is None or gen_source < best[1]:
+                best = (outputs, gen_source, write_seconds)
+        results[name] = best
+
+    if results['reference'][0] != results['current'][0]:
+        print('Output differs!')
+        sys.exit(1)
+
+    print('%d files, best of %d' % (len(files), repeat))
+    print('%-10s %12s %12s' % ('write()', 'gen_source', 'in write()'))
+    for name in ('reference', 'current'):
+        print('%-10s %11.3fs %11.3fs' % ((name,) + results[name][1:]))
+    print('write() speedup: %.2fx' %
+          (results['reference'][2] / results['current'][2]))
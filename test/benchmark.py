@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# emacs-mode: -*-python-*-
+
+"""
+benchmark.py -- time decompiling the bytecode test corpora
+
+For each corpus, say test/bytecode_2.7 or test/ok_lib3.4, this reports
+the number of files that failed to decompile, files/sec and tokens/sec
+over those that didn't, the peak resident set size of the process, and
+the seconds spent in each phase of decompilation and how much each
+raised the peak RSS (see uncompyle6.stats). Each corpus is run in a
+fresh process, so that the peak RSS is its own and grammars aren't
+already built, and each is run --repeat times keeping the fastest run.
+
+Usage-Examples:
+
+  # benchmark all corpora and save the results as a baseline
+  benchmark.py --save baseline.json
+
+  # later, compare against that baseline; the exit status is 1 if more
+  # files fail or anything got more than 10% slower or bigger. Phases
+  # taking under --min-seconds (0.1) and growth in peak RSS of under
+  # --min-rss (1024, in getrusage()'s units) aren't counted.
+  benchmark.py --compare baseline.json
+
+  # just the Python 2.7 and 3.4 corpora, allowing 25% slack
+  benchmark.py --compare baseline.json --threshold 25 --bytecode-2.7 --ok-3.4
+"""
+
+from __future__ import print_function
+
+import getopt, json, multiprocessing, os, platform, sys, time
+
+from uncompyle6 import PYTHON_VERSION
+from uncompyle6.main import decompile_file
+from uncompyle6.stats import DecompileStats, PHASES, max_rss
+from uncompyle6.version import VERSION
+
+def get_srcdir():
+    filename = os.path.normcase(os.path.dirname(__file__))
+    return os.path.realpath(filename)
+
+src_dir = get_srcdir()
+
+corpora = {}
+for vers in (1.5,
+             2.1, 2.2, 2.3, 2.4, 2.5, 2.6, 2.7,
+             3.0, 3.1, 3.2, 3.3,
+             3.4, 3.5, 3.6, 'pypy3.2', 'pypy2.7'):
+    corpora['bytecode-%s' % vers] = os.path.join(src_dir, 'bytecode_%s' % vers)
+for vers in (2.6, 2.7, 3.2, 3.4):
+    corpora['ok-%s' % vers] = os.path.join(src_dir, 'ok_lib%s' % vers)
+
+# Measurements where bigger is better; for everything else smaller is
+METRICS_UP = ('files_per_sec', 'tokens_per_sec')
+
+# Measurements where any increase is a regression
+METRICS_EXACT = ('failed',)
+
+def help():
+    print(__doc__)
+    sys.exit(1)
+
+
+def corpus_files(corpus_dir):
+    files = []
+    for root, dirs, basenames in os.walk(corpus_dir):
+        for n in basenames:
+            if n.endswith('.pyc') or n.endswith('.pyo'):
+                files.append(os.path.join(root, n))
+    files.sort()
+    return files
+
+
+def count_tokens(records):
+    return sum((record.tokens or 0) + count_tokens(record.children)
+               for record in records)
+
+
+def run_corpus(corpus_dir):
+    """Decompile every file in *corpus_dir* once, returning a dict of
+    measurements."""
+    stats = DecompileStats()
+    failed = 0
+    out = open(os.devnull, 'w')
+    for filename in corpus_files(corpus_dir):
+        recorded = len(stats.records)
+        try:
+            decompile_file(filename, out, stats=stats)
+        except Exception:
+            failed += 1
+            # Measure only the files that decompile, so that a file
+            # failing sooner than it used to doesn't look faster
+            del stats.records[recorded:]
+            pass
+        pass
+    out.close()
+
+    seconds = sum(record.seconds for record in stats.records)
+    tokens = count_tokens(stats.records)
+    files = len(stats.records)
+    return {
+        'files': files,
+        'failed': failed,
+        'tokens': tokens,
+        'seconds': seconds,
+        'files_per_sec': files / seconds if seconds else 0.0,
+        'tokens_per_sec': tokens / seconds if seconds else 0.0,
+        'phases': stats.totals(),
+        'phases_rss_growth': stats.totals('self_max_rss_growth'),
+        'max_rss': max_rss(),
+        }
+
+
+def bench_corpus(corpus_dir, repeat):
+    """Run *corpus_dir* *repeat* times, each in a new process, keeping
+    the fastest run."""
+    best = None
+    for i in range(repeat):
+        pool = multiprocessing.Pool(1)
+        try:
+            result = pool.apply(run_corpus, (corpus_dir,))
+        finally:
+            pool.terminate()
+            pool.join()
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+
+def environment():
+    return {
+        'uncompyle6': VERSION,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+
+def flatten(result):
+    """Return the measurements in *result* we look for regressions in,
+    as a dict."""
+    metrics = {
+        'failed': result['failed'],
+        'files_per_sec': result['files_per_sec'],
+        'tokens_per_sec': result['tokens_per_sec'],
+        'max_rss': result['max_rss'],
+        }
+    for phase in PHASES:
+        metrics['%s_seconds' % phase] = result['phases'].get(phase, 0.0)
+    # Baselines saved before this was measured don't have it
+    rss_growth = result.get('phases_rss_growth')
+    if rss_growth is not None:
+        for phase in PHASES:
+            metrics['%s_rss_growth' % phase] = rss_growth.get(phase, 0)
+    return metrics
+
+
+def compare(baseline, current, threshold, min_seconds=0.1, min_rss=1024):
+    """Return a list of (corpus, metric, old, new, percent) for the
+    measurements in *current* that are worse than in *baseline*: any
+    more files failing, or more than *threshold* percent worse
+    otherwise. A phase taking under *min_seconds* both times, or whose
+    growth in peak RSS went up by less than *min_rss*, isn't counted;
+    at that size the difference is mostly noise."""
+    regressions = []
+    for corpus in sorted(current):
+        if corpus not in baseline:
+            continue
+        old_metrics = flatten(baseline[corpus])
+        new_metrics = flatten(current[corpus])
+        for metric in sorted(new_metrics):
+            old, new = old_metrics.get(metric), new_metrics[metric]
+            if old is None or new is None:
+                continue
+            if metric in METRICS_EXACT:
+                if new > old:
+                    change = ((new - old) * 100.0 / old if old
+                              else float('inf'))
+                    regressions.append((corpus, metric, old, new, change))
+                continue
+            if metric.endswith('_seconds') and max(old, new) < min_seconds:
+                continue
+            if metric.endswith('_rss_growth') and new - old < min_rss:
+                continue
+            if metric in METRICS_UP:
+                if not old:
+                    continue
+                change = (old - new) * 100.0 / old
+            elif old:
+                change = (new - old) * 100.0 / old
+            elif new > old:
+                # Nothing before, so any (big enough) growth is too much
+                change = float('inf')
+            else:
+                continue
+            if change > threshold:
+                regressions.append((corpus, metric, old, new, change))
+    return regressions
+
+
+def report(results):
+    print('%-18s %6s %6s %9s %10s %10s' %
+          ('corpus', 'files', 'failed', 'files/s', 'tokens/s', 'max rss'))
+    for corpus in sorted(results):
+        result = results[corpus]
+        print('%-18s %6d %6d %9.1f %10.0f %10s' %
+              (corpus, result['files'], result['failed'],
+               result['files_per_sec'], result['tokens_per_sec'],
+               result['max_rss']))
+        print('    ' + '  '.join('%s %.3fs' % (phase, result['phases'][phase])
+                                 for phase in PHASES))
+        rss_growth = result.get('phases_rss_growth')
+        if rss_growth is not None and result['max_rss'] is not None:
+            print('    rss growth ' +
+                  '  '.join('%s %d' % (phase, rss_growth[phase])
+                            for phase in PHASES))
+        pass
+    return
+
+
+if __name__ == '__main__':
+    corpora_keys = sorted(corpora.keys())
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'h',
+                                   ['help', 'save=', 'compare=',
+                                    'threshold=', 'min-seconds=',
+                                    'min-rss=', 'repeat=']
+                                   + corpora_keys)
+    except getopt.GetoptError as e:
+        print(e, file=sys.stderr)
+        help()
+
+    save = baseline_file = None
+    threshold = 10.0
+    min_seconds = 0.1
+    min_rss = 1024
+    repeat = 3
+    selected = []
+    for opt, val in opts:
+        if opt in ('-h', '--help'):
+            help()
+        elif opt == '--save':
+            save = val
+        elif opt == '--compare':
+            baseline_file = val
+        elif opt == '--threshold':
+            threshold = float(val)
+        elif opt == '--min-seconds':
+            min_seconds = float(val)
+        elif opt == '--min-rss':
+            min_rss = int(val)
+        elif opt == '--repeat':
+            repeat = int(val)
+        elif opt[2:] in corpora_keys:
+            selected.append(opt[2:])
+        pass
+
+    if not selected:
+        selected = corpora_keys
+
+    results = {}
+    for corpus in selected:
+        corpus_dir = corpora[corpus]
+        if not corpus_files(corpus_dir):
+            print("No bytecode in %s. Skipping" % corpus_dir, file=sys.stderr)
+            continue
+        results[corpus] = bench_corpus(corpus_dir, repeat)
+        pass
+
+    report(results)
+
+    if save:
+        with open(save, 'w') as f:
+            json.dump({'environment': environment(), 'results': results},
+                      f, indent=2, sort_keys=True)
+        print('Saved results to %s' % save)
+
+    if baseline_file:
+        with open(baseline_file) as f:
+            baseline = json.load(f)
+        env = environment()
+        for key in ('uncompyle6', 'python', 'implementation', 'machine'):
+            if baseline['environment'].get(key) != env[key]:
+                print('Note: baseline %s is %s; now %s' %
+                      (key, baseline['environment'].get(key), env[key]))
+        regressions = compare(baseline['results'], results, threshold,
+                              min_seconds, min_rss)
+        if regressions:
+            print('Regressions against %s (more failures, or more '
+                  'than %g%% worse):' % (baseline_file, threshold))
+            for corpus, metric, old, new, change in regressions:
+                print('  %-18s %-20s %12.4g -> %12.4g  (%+.1f%%)' %
+                      (corpus, metric, old, new, change))
+            sys.exit(1)
+        print('No regressions of more than %g%% against %s' %
+              (threshold, baseline_file))
+    sys.exit(0)
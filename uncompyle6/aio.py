@@ -0,0 +1,179 @@
+#  Copyright (c) 2017 by Rocky Bernstein
+"""
+Decompilation for asyncio programs.
+
+The functions here return asyncio futures and do the decompiling in a
+pool of worker processes, so an event loop is never held up by it and
+many files can be in hand at once. Nothing is written to the calling
+process's sys.stdout or sys.stderr: the source, any error, whatever the
+decompiler printed and, if asked for, timings all come back in a
+DecompileResult.
+
+Example:
+
+    import asyncio
+    from uncompyle6.aio import decompile_file, decompile_files
+
+    @asyncio.coroutine
+    def report(filenames):
+        result = yield from decompile_file(filenames[0])
+        print(result.source)
+        for next_result in decompile_files(filenames[1:], limit=8):
+            result = yield from next_result
+            print(result.filename, result.status, result.message)
+
+This needs Python 3.4 or later, for asyncio and concurrent.futures.
+"""
+
+import asyncio, os, sys
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+
+from uncompyle6 import parser
+from uncompyle6.cache import ResultCache
+from uncompyle6.main import decompile_file as _decompile_file
+from uncompyle6.parser import ParserError, ParseBudgetExceeded
+from uncompyle6.semantics.pysource import SourceWalkerError
+from uncompyle6.stats import DecompileStats
+
+# The result of decompiling one file. *status* is one of:
+#  'ok'       decompiled; the text is in *source*
+#  'failed'   decompilation failed; *source* has what was produced
+#  'budget'   parsing exceeded the parse budget
+#  'memory'   ran out of memory
+#  'crashed'  the worker process died
+#  'error'    some other exception
+# *message* describes the failure, *output* is whatever the decompiler
+# printed, and *stats* is DecompileStats.as_dict() if stats were asked
+# for, else None.
+DecompileResult = namedtuple('DecompileResult',
+                             'filename status source message output stats')
+
+_executor = None
+
+def get_executor():
+    """Return the pool of worker processes used when none is given, one
+    per CPU, starting it if need be."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor()
+    return _executor
+
+def decompile_in_worker(filename, options):
+    """Decompile *filename* and return a DecompileResult. This is what
+    runs in the worker processes, one file at a time, which is why it
+    can take over sys.stdout and sys.stderr while it does.
+
+    *options* may have 'stats', true for timings, 'parse_budget', a
+    dict as for uncompyle6.main.main(), and 'cache', a directory for an
+    uncompyle6.cache.ResultCache.
+    """
+    stats = DecompileStats() if options.get('stats') else None
+    cache = None
+    if options.get('cache'):
+        cache = ResultCache(options['cache'])
+    saved_budget = dict(parser.PARSE_BUDGET)
+    parser.PARSE_BUDGET.update(options.get('parse_budget') or {})
+    out = StringIO()
+    output = StringIO()
+    saved_streams = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = output
+    status, message = 'ok', None
+    try:
+        _decompile_file(filename, out, stats=stats, cache=cache)
+    except (ValueError, SyntaxError, ParserError, SourceWalkerError) as e:
+        status, message = 'failed', str(e)
+    except ParseBudgetExceeded as e:
+        status, message = 'budget', str(e)
+    except MemoryError:
+        status, message = 'memory', 'out of memory'
+    except Exception as e:
+        status, message = 'error', '%s: %s' % (e.__class__.__name__, e)
+    finally:
+        sys.stdout, sys.stderr = saved_streams
+        parser.PARSE_BUDGET.clear()
+        parser.PARSE_BUDGET.update(saved_budget)
+    return DecompileResult(filename, status, out.getvalue(), message,
+                           output.getvalue(),
+                           stats.as_dict() if stats is not None else None)
+
+def decompile_file(filename, executor=None, loop=None, **options):
+    """
+    Return an asyncio future for the DecompileResult of decompiling
+    *filename* in *executor*, a concurrent.futures.ProcessPoolExecutor,
+    by default get_executor(). *options* are as for
+    decompile_in_worker().
+
+    The future doesn't raise: a worker that dies gives a 'crashed'
+    result, and if it was in the default pool a new pool is started
+    for what comes after.
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    if executor is None:
+        executor = get_executor()
+    result = loop.create_future()
+
+    def crashed(e):
+        global _executor
+        if executor is _executor:
+            _executor = None
+        result.set_result(DecompileResult(filename, 'crashed', None,
+                                          '%s: %s' % (e.__class__.__name__, e),
+                                          '', None))
+
+    def done(future):
+        if result.cancelled():
+            return
+        if future.cancelled():
+            result.cancel()
+        elif future.exception() is not None:
+            crashed(future.exception())
+        else:
+            result.set_result(future.result())
+
+    try:
+        future = loop.run_in_executor(executor, decompile_in_worker,
+                                      filename, options)
+    except RuntimeError as e:
+        # The pool is broken or shut down
+        crashed(e)
+    else:
+        future.add_done_callback(done)
+    return result
+
+def decompile_files(filenames, executor=None, loop=None, limit=None,
+                    **options):
+    """
+    Decompile *filenames* as decompile_file() does, with at most *limit*
+    of them (by default, the number of CPUs) handed to the pool at a
+    time. Returns an iterator of futures, as asyncio.as_completed()
+    does: each one that is waited for gives the next DecompileResult to
+    finish. Those are waited for in the current event loop, so *loop*
+    should be that one.
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    if not limit:
+        limit = os.cpu_count() or 1
+    results = [loop.create_future() for filename in filenames]
+    pending = deque(zip(filenames, results))
+
+    def start():
+        while pending:
+            filename, result = pending.popleft()
+            if result.cancelled():
+                continue
+            future = decompile_file(filename, executor, loop, **options)
+            future.add_done_callback(lambda future: finished(future, result))
+            return
+
+    def finished(future, result):
+        if not (future.cancelled() or result.cancelled()):
+            result.set_result(future.result())
+        start()
+
+    for i in range(min(limit, len(pending))):
+        start()
+    return asyncio.as_completed(results)
@@ -0,0 +1,272 @@
+#  Copyright (c) 2017 by Rocky Bernstein
+"""
+Decompile many bytecode files using a pool of worker processes.
+
+Each worker process builds the grammars once at start-up and then
+decompiles one file at a time, so parsers are reused across files.
+Files are handed out largest first, which keeps the long-running
+files from being started last and so leaving the other workers idle
+at the end. A worker that runs past the per-file timeout or dies is
+replaced and the file is reported, rather than silently lost.
+
+Example:
+
+    from uncompyle6.batch import decompile_tree
+    for result in decompile_tree('/usr/lib/python2.7', out_base='/tmp/out',
+                                 numproc=4, timeout=60):
+        if result.status != 'ok':
+            print(result.filename, result.status, result.message)
+"""
+
+from __future__ import print_function
+
+import multiprocessing, os, sys, time
+from collections import deque, namedtuple
+
+try:
+    from Queue import Empty
+except ImportError:
+    from queue import Empty
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from uncompyle6.main import main
+
+# The result of decompiling one file. *status* is one of:
+#  'ok'             decompiled (and verified, if asked for)
+#  'failed'         decompilation failed
+#  'verify_failed'  decompiled but verification failed
+#  'budget'         parsing exceeded the parse budget
+#  'skipped'        file doesn't exist
+#  'timeout'        took longer than the per-file timeout
+#  'memory'         ran out of memory
+#  'crashed'        the worker process died
+#  'error'          some other exception; see *message*
+FileResult = namedtuple('FileResult', 'filename status elapsed message')
+
+FAILED_STATUSES = frozenset(['failed', 'timeout', 'memory', 'crashed', 'error'])
+
+# How often, in seconds, the parent checks on its workers
+POLL_INTERVAL = 0.1
+
+
+def find_bytecode_files(in_base):
+    """Return the .pyc and .pyo files under directory *in_base*, relative
+    to it.
+    """
+    files = []
+    for root, _, dir_files in os.walk(in_base):
+        for df in dir_files:
+            if df.endswith('.pyc') or df.endswith('.pyo'):
+                files.append(os.path.relpath(os.path.join(root, df), in_base))
+    return files
+
+
+def schedule(in_base, files):
+    """Order *files* so that the largest ones come first."""
+    def size(filename):
+        try:
+            return os.path.getsize(os.path.join(in_base, filename))
+        except OSError:
+            return 0
+    return sorted(files, key=size, reverse=True)
+
+
+def decompile_one(in_base, out_base, filename, outfile, options):
+    """Decompile a single file via main() and return a FileResult."""
+    start = time.time()
+    message = None
+    try:
+        tot, okay, failed, verify_failed, budget = main(in_base, out_base,
+                                                        [filename], [],
+                                                        outfile,
+                                                        count_budget=True,
+                                                        **options)
+    except MemoryError:
+        status, message = 'memory', 'out of memory'
+    except Exception as e:
+        status, message = 'error', '%s: %s' % (e.__class__.__name__, e)
+    else:
+        if failed:
+            status = 'failed'
+        elif budget:
+            status = 'budget'
+        elif verify_failed:
+            status = 'verify_failed'
+        elif tot:
+            status = 'ok'
+        else:
+            status = 'skipped'
+    return FileResult(filename, status, time.time() - start, message)
+
+
+def _worker(worker_id, tasks, results, in_base, out_base, outfile, options,
+            memory_limit, prewarm):
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    if prewarm:
+        from uncompyle6.parser import prewarm_parsers
+        prewarm_parsers()
+    while True:
+        filename = tasks.get()
+        if filename is None:
+            break
+        results.put((worker_id,
+                     decompile_one(in_base, out_base, filename, outfile,
+                                   options)))
+        pass
+    return
+
+
+class _Worker(object):
+    def __init__(self, worker_id, results, args):
+        self.worker_id = worker_id
+        self.tasks = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_worker, args=(worker_id, self.tasks, results) + args)
+        self.process.daemon = True
+        self.process.start()
+        self.filename = None
+        self.started = None
+
+    def submit(self, filename):
+        self.filename = filename
+        self.started = time.time()
+        self.tasks.put(filename)
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+
+
+def decompile_tree(in_base, files=None, out_base=None, outfile=None,
+                   numproc=None, timeout=None, memory_limit=None,
+                   prewarm=True, **options):
+    """Decompile *files* (by default every .pyc and .pyo file below
+    *in_base*) using *numproc* worker processes, by default one per
+    CPU. *out_base*, *outfile* and *options* are as for
+    uncompyle6.main.main().
+
+    *timeout* is a per-file limit in seconds; a worker exceeding it is
+    killed and replaced. *memory_limit* is a limit in bytes on the
+    address space of each worker, where the platform supports it.
+
+    This is a generator yielding a FileResult for each file as it
+    finishes.
+    """
+    if files is None:
+        files = find_bytecode_files(in_base)
+    if not numproc:
+        numproc = multiprocessing.cpu_count()
+    pending = deque(schedule(in_base, files))
+    numproc = min(numproc, len(pending))
+
+    results = multiprocessing.Queue()
+    args = (in_base, out_base, outfile, options, memory_limit, prewarm)
+    workers = {}
+
+    def start_worker(worker_id):
+        worker = workers[worker_id] = _Worker(worker_id, results, args)
+        if pending:
+            worker.submit(pending.popleft())
+        return worker
+
+    def finished(worker_id, result):
+        worker = workers[worker_id]
+        if result.filename != worker.filename:
+            # From a worker killed just after it finished its file
+            return None
+        worker.filename = None
+        if pending:
+            worker.submit(pending.popleft())
+        return result
+
+    def failed(worker, status, message):
+        result = FileResult(worker.filename, status,
+                            time.time() - worker.started, message)
+        worker.kill()
+        start_worker(worker.worker_id)
+        return result
+
+    try:
+        for i in range(numproc):
+            start_worker(i)
+
+        while any(w.filename is not None for w in workers.values()):
+            try:
+                worker_id, result = results.get(timeout=POLL_INTERVAL)
+            except Empty:
+                pass
+            else:
+                result = finished(worker_id, result)
+                if result:
+                    yield result
+                continue
+
+            now = time.time()
+            for worker in list(workers.values()):
+                if worker.filename is None:
+                    continue
+                if not worker.process.is_alive():
+                    # It may have finished its file just before dying.
+                    try:
+                        worker_id, result = results.get(timeout=POLL_INTERVAL)
+                    except Empty:
+                        yield failed(worker, 'crashed', 'exit code %s' %
+                                     worker.process.exitcode)
+                    else:
+                        result = finished(worker_id, result)
+                        if result:
+                            yield result
+                elif timeout and now - worker.started > timeout:
+                    yield failed(worker, 'timeout',
+                                 'exceeded %s seconds' % timeout)
+                    pass
+                pass
+            pass
+    finally:
+        for worker in workers.values():
+            if worker.process.is_alive():
+                if worker.filename is None:
+                    worker.tasks.put(None)
+                    worker.process.join(1)
+                if worker.process.is_alive():
+                    worker.kill()
+                pass
+            pass
+    return
+
+
+def summarize(results):
+    """Return (tot_files, okay_files, failed_files, verify_failed_files,
+    budget_files) for *results* in the form uncompyle6.main.main()
+    returns them with count_budget.
+    """
+    tot_files = okay_files = failed_files = verify_failed_files = 0
+    budget_files = 0
+    for result in results:
+        if result.status in FAILED_STATUSES:
+            failed_files += 1
+            continue
+        elif result.status == 'budget':
+            budget_files += 1
+            continue
+        elif result.status == 'skipped':
+            continue
+        tot_files += 1
+        if result.status == 'ok':
+            okay_files += 1
+        elif result.status == 'verify_failed':
+            verify_failed_files += 1
+            pass
+        pass
+    return (tot_files, okay_files, failed_files, verify_failed_files,
+            budget_files)
+
+
+if __name__ == '__main__':
+    for result in decompile_tree(sys.argv[1], out_base=sys.argv[2]):
+        print(result)
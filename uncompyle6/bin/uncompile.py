@@ -33,10 +33,33 @@ Options:
   -c <file>     attempts a disassembly after compiling <file>
   -d            print timestamps
   -p <integer>  use <integer> number of processes
+  --timeout <seconds>
+                with -p (2 or more), give up on a file after <seconds>
+  --max-memory <megabytes>
+                with -p (2 or more), limit the memory of each process
+  --max-parse-states <integer>
+  --max-parse-items <integer>
+  --parse-timeout <seconds>
+                give up on a file when parsing a single code object
+                needs more than this many parser states, Earley items
+                or seconds
   -r            recurse directories looking for .pyc and .pyo files
   --verify      compare generated source with input byte-code
+  --verify-jobs <integer>
+                verify files in this many processes, by default one
+                per CPU, while the next files are decompiled
   --linemaps    generated line number correspondencies between byte-code
                 and generated source output
+  --stream      write out each top-level statement as soon as it has been
+                decompiled, rather than each module at the end
+  --stats=json  write the time spent in each phase of decompiling each
+                file and code object to stderr as JSON (not with -p)
+  --cache <dir> keep decompiled source, and the outcome of verifying it,
+                in <dir>, and reuse it for byte code seen before; this
+                includes functions and classes in otherwise changed files
+  --cache-size <megabytes>
+                evict the least recently used entries of the --cache
+                directory when it holds more than this (default 256)
   --help        show this message
 
 Debugging Options:
@@ -74,6 +97,9 @@ def main_bin():
 
     do_verify = recurse_dirs = False
     numproc = 0
+    timeout = memory_limit = None
+    stats = cache_dir = None
+    cache_size = 256 * 1024 * 1024
     outfile = '-'
     out_base = None
     codes = []
@@ -83,7 +109,11 @@ def main_bin():
     try:
         opts, files = getopt.getopt(sys.argv[1:], 'hagtdrVo:c:p:',
                                     'help asm grammar linemaps recurse timestamp tree '
-                                    'verify version showgrammar'.split(' '))
+                                    'verify verify-jobs= version showgrammar timeout= '
+                                    'max-memory= max-parse-states= '
+                                    'max-parse-items= parse-timeout= '
+                                    'stats= stream cache= cache-size='
+                                    .split(' '))
     except getopt.GetoptError as e:
         print('%s: %s' % (os.path.basename(sys.argv[0]), e),  file=sys.stderr)
         sys.exit(-1)
@@ -98,6 +128,8 @@ def main_bin():
             sys.exit(0)
         elif opt == '--verify':
             options['do_verify'] = True
+        elif opt == '--verify-jobs':
+            options['verify_jobs'] = int(val)
         elif opt == '--linemaps':
             options['do_linemaps'] = True
         elif opt in ('--asm', '-a'):
@@ -116,12 +148,39 @@ def main_bin():
             codes.append(val)
         elif opt == '-p':
             numproc = int(val)
+        elif opt == '--timeout':
+            timeout = float(val)
+        elif opt == '--max-memory':
+            memory_limit = int(val) * 1024 * 1024
+        elif opt == '--max-parse-states':
+            options.setdefault('parse_budget', {})['states'] = int(val)
+        elif opt == '--max-parse-items':
+            options.setdefault('parse_budget', {})['items'] = int(val)
+        elif opt == '--parse-timeout':
+            options.setdefault('parse_budget', {})['seconds'] = float(val)
+        elif opt == '--stream':
+            options['stream'] = True
+        elif opt == '--cache':
+            cache_dir = val
+        elif opt == '--cache-size':
+            cache_size = int(val) * 1024 * 1024
+        elif opt == '--stats':
+            if val != 'json':
+                print('%s: --stats only supports json' % program,
+                      file=sys.stderr)
+                sys.exit(-1)
+            from uncompyle6.stats import DecompileStats
+            stats = options['stats'] = DecompileStats()
         elif opt in ('--recurse', '-r'):
             recurse_dirs = True
         else:
             print(opt, file=sys.stderr)
             usage()
 
+    if cache_dir:
+        from uncompyle6.cache import ResultCache
+        options['cache'] = ResultCache(cache_dir, cache_size)
+
     # expand directory if specified
     if recurse_dirs:
         expanded_files = []
@@ -157,10 +216,20 @@ def main_bin():
     if timestamp:
         print(time.strftime(timestampfmt))
 
+    if stats and numproc > 1:
+        print('%s: --stats can not be used with -p' % program,
+              file=sys.stderr)
+        sys.exit(-1)
+
+    if (timeout is not None or memory_limit is not None) and numproc <= 1:
+        print('%s: --timeout and --max-memory need -p 2 or more' % program,
+              file=sys.stderr)
+        sys.exit(-1)
+
     if numproc <= 1:
         try:
             result = main(src_base, out_base, files, codes, outfile,
-                          **options)
+                          count_budget=True, **options)
             if len(files) > 1:
                 mess = status_msg(do_verify, *result)
                 print('# ' + mess)
@@ -169,60 +238,28 @@ def main_bin():
             pass
         except verify.VerifyCmpError:
             raise
+        if stats:
+            import json
+            json.dump(stats.as_dict(), sys.stderr, indent=2)
+            sys.stderr.write("\n")
     else:
-        from multiprocessing import Process, Queue
+        from uncompyle6.batch import decompile_tree, summarize
 
+        results = []
         try:
-            from Queue import Empty
-        except ImportError:
-            from Queue import Empty
-
-        fqueue = Queue(len(files)+numproc)
-        for f in files:
-            fqueue.put(f)
-        for i in range(numproc):
-            fqueue.put(None)
-
-        rqueue = Queue(numproc)
-
-        def process_func():
-            try:
-                (tot_files, okay_files, failed_files, verify_failed_files) = (0, 0, 0, 0)
-                while 1:
-                    f = fqueue.get()
-                    if f is None:
-                        break
-                    (t, o, f, v) = \
-                      main(src_base, out_base, [f], codes, outfile, **options)
-                    tot_files += t
-                    okay_files += o
-                    failed_files += f
-                    verify_failed_files += v
-            except (Empty, KeyboardInterrupt):
-                pass
-            rqueue.put((tot_files, okay_files, failed_files, verify_failed_files))
-            rqueue.close()
-
-        try:
-            procs = [Process(target=process_func) for i in range(numproc)]
-            for p in procs:
-                p.start()
-            for p in procs:
-                p.join()
-            try:
-                (tot_files, okay_files, failed_files, verify_failed_files) = (0, 0, 0, 0)
-                while True:
-                    (t, o, f, v) = rqueue.get(False)
-                    tot_files += t
-                    okay_files += o
-                    failed_files += f
-                    verify_failed_files += v
-            except Empty:
-                pass
-            print('# decompiled %i files: %i okay, %i failed, %i verify failed' %
-                  (tot_files, okay_files, failed_files, verify_failed_files))
+            for result in decompile_tree(src_base, files, out_base, outfile,
+                                         numproc=numproc, timeout=timeout,
+                                         memory_limit=memory_limit,
+                                         **options):
+                results.append(result)
+                if result.message:
+                    sys.stderr.write("\n# file %s\n# %s: %s\n" %
+                                     (result.filename, result.status,
+                                      result.message))
         except (KeyboardInterrupt, OSError):
             pass
+        print('# ' + status_msg(options.get('do_verify', False),
+                                *summarize(results)))
 
     if timestamp:
         print(time.strftime(timestampfmt))
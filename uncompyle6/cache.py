@@ -0,0 +1,153 @@
+#  Copyright (c) 2017 by Rocky Bernstein
+"""
+An on-disk cache of decompiled source, so that byte code that has
+been decompiled before doesn't have to be decompiled again.
+
+Entries are keyed by a hash of the marshalled code in a .pyc file
+(everything after its header, so timestamps don't matter) together
+with its magic number and the versions of uncompyle6 and of the
+Python running it, which affects how constants come out. Each entry
+is a file of its own, written to a temporary name and renamed into
+place, so several processes can share a cache directory. Once the
+entries take up more than the cache's size, the least recently used
+ones are removed.
+
+The same store also holds the generated bodies of functions and
+classes, keyed by the contents of their code objects; see code_key().
+"""
+
+import hashlib, os, pickle, sys, tempfile
+
+from xdis.code import iscode
+from uncompyle6.version import VERSION
+
+# Default bound on the total size of the entries in a ResultCache
+RESULT_CACHE_SIZE = 256 * 1024 * 1024
+
+def header_size(magic_int):
+    """Return the size of the header of a .pyc file with magic number
+    *magic_int*; see xdis.load.load_module()."""
+    if 3200 <= magic_int < 20121:
+        return 12
+    return 8
+
+# The parts of a code object that code_digest() looks at. The file name
+# and first line number are left out, so that a function that has only
+# moved keeps its digest.
+CODE_ATTRS = ('co_name', 'co_argcount', 'co_kwonlyargcount', 'co_nlocals',
+              'co_flags', 'co_code', 'co_names', 'co_varnames',
+              'co_freevars', 'co_cellvars', 'co_lnotab')
+
+def code_digest(co, h):
+    """Add the contents of code object *co*, including those of the
+    code objects among its constants, to hash *h*."""
+    for attr in CODE_ATTRS:
+        h.update(repr(getattr(co, attr, None)).encode('utf-8'))
+    for const in co.co_consts:
+        if iscode(const):
+            h.update(b'<code>')
+            code_digest(const, h)
+        else:
+            h.update(repr((type(const).__name__, const)).encode('utf-8'))
+        pass
+    return
+
+class ResultCache(object):
+    """
+    Decompiled source, and the outcome of verifying it, stored as one
+    file per entry in *directory*. An entry is a dict with keys
+    'source', the decompiled text, and 'verify', a dict from
+    verification mode to (ok, message). Entries for the bodies of
+    functions and classes are described in
+    uncompyle6.semantics.pysource.BodyRecorder.
+    """
+    suffix = '.pickle'
+
+    def __init__(self, directory, size=RESULT_CACHE_SIZE):
+        self.directory = directory
+        self.size = size
+        # Bytes written since the last evict(); None before the first
+        self.written = None
+
+    def key(self, filename, magic_int):
+        """Return the key for the code in .pyc file *filename*, which
+        has magic number *magic_int*."""
+        with open(filename, 'rb') as fp:
+            data = fp.read()
+        h = hashlib.sha1(data[:4])
+        h.update(data[header_size(magic_int):])
+        h.update(('%s\n%s' % (VERSION, sys.version)).encode('utf-8'))
+        return h.hexdigest()
+
+    def code_key(self, co, context):
+        """Return the key for the source generated for code object *co*
+        in *context*, a tuple of whatever else the source depends on."""
+        h = hashlib.sha1(('%s\n%s\n%r' % (VERSION, sys.version, context))
+                         .encode('utf-8'))
+        code_digest(co, h)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        """Return the entry for *key*, or None if there isn't one."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as fp:
+                entry = pickle.load(fp)
+            # The modification time records when an entry was last used
+            os.utime(path, None)
+        except Exception:
+            return None
+        return entry
+
+    def put(self, key, entry):
+        """Store *entry* under *key*, and then evict entries if the
+        cache may have grown too big. The directory is looked over on
+        the first put() and then whenever another 1/16th of the cache's
+        size has been written."""
+        data = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(data)
+            os.rename(tmp_path, self.path(key))
+        except (IOError, OSError):
+            # The cache is only an optimization
+            return
+        if self.written is not None:
+            self.written += len(data)
+        if self.written is None or self.written > self.size // 16:
+            self.evict()
+            self.written = 0
+        return
+
+    def evict(self):
+        """Remove the least recently used entries until the rest fit in
+        self.size bytes."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Removed by some other process
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        return
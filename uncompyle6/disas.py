@@ -25,7 +25,8 @@ import uncompyle6
 
 from xdis.main import disassemble_file as xdisassemble_file
 from xdis.code import iscode
-from xdis.load import check_object_path, load_module
+from xdis.load import check_object_path
+from uncompyle6.load import load_module
 from uncompyle6.scanner import get_scanner
 
 def disco(version, co, out=None, is_pypy=False):
@@ -0,0 +1,198 @@
+#  Copyright (c) 2017 by Rocky Bernstein
+"""
+Loading bytecode files from memory maps.
+
+load_module() is xdis.load.load_module(), except that the file is
+memory-mapped rather than read: the header is decoded in place, and the
+code is unmarshalled straight from the mapping, so the file's contents
+aren't first copied into a string. Files with the odd magic numbers
+xdis treats specially are handed over to xdis.
+
+For runs over many files, prefetch() maps each file ahead of time in a
+background thread and asks the operating system to start reading it
+in, so that the next file is usually in memory by the time the current
+one has been decompiled. It also looks at each file's magic number, so
+that files uncompyle6 can't handle are skipped without loading them.
+
+Example:
+
+    from uncompyle6.load import prefetch
+    for filename, pyc in prefetch(filenames):
+        if pyc is not None and not pyc.supported:
+            pyc.close()
+            continue
+        decompile_file(filename, pyc=pyc)
+"""
+
+import marshal, mmap, os, threading
+from struct import unpack_from
+
+from xdis import magics
+import xdis.load, xdis.unmarshal
+
+from uncompyle6 import PYTHON3
+from uncompyle6.scanner import PYTHON_VERSIONS
+
+if PYTHON3:
+    import queue
+else:
+    import Queue as queue
+
+# Number of files prefetch() keeps mapped ahead of the one in use
+PREFETCH_AHEAD = 4
+
+# Magic numbers of files loaded by xdis.load.load_module() rather than
+# from a mapping: interim 3.3, and the two dropbox variants
+XDIS_MAGICS = (3361, 62135, 62215)
+
+def magic_version(magic):
+    """Return the Python version for bytecode with magic number *magic*,
+    or None if it isn't known."""
+    if magic[0:1] in ('0', b'0'):
+        # PyPy 3.2; see xdis.load.load_module()
+        magic = magics.int2magic(3180+7)
+    try:
+        return float(magics.versions[magic][:3])
+    except KeyError:
+        return None
+
+class MappedPyc(object):
+    """
+    A bytecode file mapped into memory. *supported* says whether its
+    magic number is one uncompyle6 can decompile; *mapping* is None if
+    the file is empty.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.mapping = None
+        self.magic = b''
+        fp = open(filename, 'rb')
+        try:
+            size = os.fstat(fp.fileno()).st_size
+            if size > 0:
+                self.mapping = mmap.mmap(fp.fileno(), 0,
+                                         access=mmap.ACCESS_READ)
+                if hasattr(os, 'posix_fadvise'):
+                    # Start reading it in now, rather than a page fault
+                    # at a time when it gets unmarshalled
+                    os.posix_fadvise(fp.fileno(), 0, size,
+                                     os.POSIX_FADV_WILLNEED)
+                self.magic = self.mapping[0:4]
+        finally:
+            # The mapping stays valid after the file is closed
+            fp.close()
+        self.magic_int = None
+        if len(self.magic) == 4:
+            self.magic_int = magics.magic2int(self.magic)
+        self.supported = magic_version(self.magic) in PYTHON_VERSIONS
+
+    def close(self):
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+
+def load_module(filename, code_objects=None, pyc=None):
+    """
+    Like xdis.load.load_module(filename, code_objects), but reads the
+    file through a memory map. *pyc* is a MappedPyc of *filename* to use,
+    from prefetch() say; it is closed once the code is loaded.
+
+    Returns (version, timestamp, magic_int, code object, is_pypy,
+    source_size).
+    """
+    if code_objects is None:
+        code_objects = {}
+    if pyc is None:
+        pyc = MappedPyc(filename)
+    try:
+        data = pyc.mapping
+        if (data is None or len(data) < 8 or pyc.magic_int in XDIS_MAGICS
+            or pyc.magic[0:1] in ('0', b'0')
+            or magic_version(pyc.magic) is None):
+            # Let xdis deal with it, or report what's wrong with it
+            return xdis.load.load_module(filename, code_objects)
+
+        magic_int = pyc.magic_int
+        version = magic_version(pyc.magic)
+        timestamp = unpack_from('I', data, 4)[0]
+        if 3200 <= magic_int < 20121:
+            source_size = unpack_from('I', data, 8)[0]
+            start = 12
+        else:
+            source_size = None
+            start = 8
+
+        if magic_int == magics.PYTHON_MAGIC_INT:
+            if PYTHON3:
+                view = memoryview(data)
+                try:
+                    co = marshal.loads(view[start:])
+                finally:
+                    view.release()
+            else:
+                co = marshal.loads(data[start:])
+        else:
+            if len(data) <= start or data[start:start+1] not in (b'c', b'\xe3'):
+                # xdis gives the error for what isn't a code object
+                return xdis.load.load_module(filename, code_objects)
+            # mmap objects read and seek like files, which is all
+            # xdis.unmarshal needs
+            data.seek(start)
+            co = xdis.unmarshal.load_code(data, magic_int, code_objects)
+    finally:
+        pyc.close()
+    return version, timestamp, magic_int, co, xdis.load.is_pypy(magic_int), \
+      source_size
+
+def prefetch(filenames, ahead=PREFETCH_AHEAD):
+    """
+    Generate (filename, pyc) for each of *filenames* in turn, where pyc
+    is a MappedPyc of it made in a background thread, at most *ahead*
+    files in advance. pyc is None for files that don't exist or that
+    aren't .pyc or .pyo files. The caller closes each pyc, or passes it
+    on to load_module() which does.
+    """
+    mapped = queue.Queue(ahead)
+    done = []
+
+    def worker():
+        for filename in filenames:
+            pyc = None
+            if ((filename.endswith('.pyc') or filename.endswith('.pyo'))
+                and os.path.isfile(filename)):
+                try:
+                    pyc = MappedPyc(filename)
+                except Exception:
+                    # load_module() will come across it again
+                    pass
+            while not done:
+                try:
+                    mapped.put((filename, pyc), timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            else:
+                if pyc is not None:
+                    pyc.close()
+                return
+            pass
+        return
+
+    thread = threading.Thread(target=worker)
+    thread.daemon = True
+    thread.start()
+    try:
+        for i in range(len(filenames)):
+            yield mapped.get()
+    finally:
+        # Stop the worker, and close what it mapped that wasn't used.
+        # Anything it queues after this is closed when the queue goes.
+        done.append(True)
+        while True:
+            try:
+                filename, pyc = mapped.get_nowait()
+            except queue.Empty:
+                break
+            if pyc is not None:
+                pyc.close()
+    return
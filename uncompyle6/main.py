@@ -1,22 +1,35 @@
 from __future__ import print_function
-import datetime, os, subprocess, sys, tempfile
+import datetime, multiprocessing, os, sys, tempfile
+from collections import deque
 
 from uncompyle6 import verify, IS_PYPY
 from xdis.code import iscode
 from uncompyle6.disas import check_object_path
 from uncompyle6.semantics import pysource
-from uncompyle6.parser import ParserError
+from uncompyle6 import parser
+from uncompyle6.parser import ParserError, ParseBudgetExceeded
 from uncompyle6.version import VERSION
 from uncompyle6.linenumbers import line_number_mapping
+from uncompyle6.stats import maybe_code, maybe_phase
+from uncompyle6.load import load_module, prefetch
 
-from xdis.load import load_module
+if sys.version_info[0] < 3:
+    from StringIO import StringIO
+else:
+    from io import StringIO
 
 def decompile(
         bytecode_version, co, out=None, showasm=None, showast=False,
         timestamp=None, showgrammar=False, code_objects={},
-        source_size=None, is_pypy=False, magic_int=None):
+        source_size=None, is_pypy=False, magic_int=None, stats=None,
+        stream=False, cache=None, cache_key=None):
     """
     ingests and deparses a given code block 'co'
+
+    If *cache* is an uncompyle6.cache.ResultCache, the bodies of
+    functions and classes are cached there. If *cache_key* is given
+    too, the whole source is taken from its entry for that key if
+    there is one, and stored there otherwise.
     """
     assert iscode(co)
 
@@ -40,54 +53,246 @@ def decompile(
         print('# Size of source mod 2**32: %d bytes' % source_size,
                file=real_out)
 
+    cache_source = cache is not None and cache_key is not None
+    if cache_source:
+        entry = cache.get(cache_key)
+        if entry is not None:
+            real_out.write(entry['source'])
+            return
+        # The source has to be collected to be stored
+        out = StringIO()
+
     try:
         pysource.deparse_code(bytecode_version, co, out, showasm, showast,
                               showgrammar, code_objects=code_objects,
-                              is_pypy=is_pypy)
+                              is_pypy=is_pypy, stats=stats, stream=stream,
+                              function_cache=cache)
     except pysource.SourceWalkerError as e:
         # deparsing failed
         raise pysource.SourceWalkerError(str(e))
+    finally:
+        if cache_source:
+            # Pass on what was written even if deparsing failed
+            real_out.write(out.getvalue())
+
+    if cache_source:
+        cache.put(cache_key, {'source': out.getvalue(), 'verify': {}})
 
 # For compatiblity
 uncompyle = decompile
 
 def decompile_file(filename, outstream=None, showasm=None, showast=False,
-                   showgrammar=False):
+                   showgrammar=False, stats=None, stream=False, cache=None,
+                   pyc=None):
     """
     decompile Python byte-code file (.pyc)
+
+    If *cache* is an uncompyle6.cache.ResultCache, the result is looked
+    up there first; the key used is returned. Nothing is cached when
+    showing the assembly, syntax tree or grammar.
+
+    *pyc* is an uncompyle6.load.MappedPyc of *filename* to load it from,
+    if it has already been mapped.
     """
 
     filename = check_object_path(filename)
+    if pyc is not None and pyc.filename != filename:
+        pyc.close()
+        pyc = None
     code_objects = {}
-    (version, timestamp, magic_int, co, is_pypy,
-     source_size) = load_module(filename, code_objects)
-
-    if type(co) == list:
-        for con in co:
-            decompile(version, con, outstream, showasm, showast,
-                      timestamp, showgrammar, code_objects=code_objects,
-                      is_pypy=is_pypy, magic_int=magic_int)
-    else:
-        decompile(version, co, outstream, showasm, showast,
-                  timestamp, showgrammar,
-                  code_objects=code_objects, source_size=source_size,
-                  is_pypy=is_pypy, magic_int=magic_int)
+    with maybe_code(stats, 'file', filename):
+        with maybe_phase(stats, 'load'):
+            (version, timestamp, magic_int, co, is_pypy,
+             source_size) = load_module(filename, code_objects, pyc)
+
+        cache_key = None
+        if type(co) == list:
+            for con in co:
+                decompile(version, con, outstream, showasm, showast,
+                          timestamp, showgrammar, code_objects=code_objects,
+                          is_pypy=is_pypy, magic_int=magic_int, stats=stats,
+                          stream=stream)
+        else:
+            if cache is not None and not (showasm or showast or showgrammar):
+                cache_key = cache.key(filename, magic_int)
+            else:
+                cache = None
+            decompile(version, co, outstream, showasm, showast,
+                      timestamp, showgrammar,
+                      code_objects=code_objects, source_size=source_size,
+                      is_pypy=is_pypy, magic_int=magic_int, stats=stats,
+                      stream=stream, cache=cache, cache_key=cache_key)
     co = None
+    return cache_key
+
+def verify_file(infile, outfile, weak_verify, cache=None, cache_key=None):
+    """
+    verify.compare_code_with_srcfile(), with the outcome looked up in,
+    or else recorded in, *cache*'s entry for *cache_key* if given.
+    """
+    if cache is None or cache_key is None:
+        return verify.compare_code_with_srcfile(infile, outfile,
+                                                weak_verify=weak_verify)
+    entry, outcome = cached_verify(cache, cache_key, weak_verify)
+    if outcome is None:
+        outcome = verify_outcome(infile, outfile, weak_verify)
+        record_verify(cache, cache_key, entry, weak_verify, outcome)
+    ok, msg = outcome
+    if not ok:
+        raise verify.VerifyCmpError(msg)
+    return msg
+
+def verify_outcome(infile, outfile, weak_verify):
+    """
+    verify.compare_code_with_srcfile() giving (ok, message) rather than
+    raising VerifyCmpError, whose subclasses can't be passed back from
+    a worker process.
+    """
+    try:
+        return True, verify.compare_code_with_srcfile(infile, outfile,
+                                                      weak_verify=weak_verify)
+    except verify.VerifyCmpError as e:
+        return False, str(e)
+
+def cached_verify(cache, cache_key, weak_verify):
+    """Return (entry, outcome): *cache*'s entry for *cache_key* and the
+    (ok, message) of verifying it in this mode, either None if not
+    there."""
+    entry = cache.get(cache_key)
+    if entry is None:
+        return None, None
+    return entry, entry['verify'].get('weak' if weak_verify else 'strong')
+
+def record_verify(cache, cache_key, entry, weak_verify, outcome):
+    """Add *outcome* to *entry*, as got from cached_verify()."""
+    if entry is not None:
+        entry['verify']['weak' if weak_verify else 'strong'] = outcome
+        cache.put(cache_key, entry)
+    return
+
+class VerifyStage(object):
+    """
+    Verification of decompiled files as a stage of its own. Files are
+    handed to a pool of *jobs* worker processes, by default one per CPU,
+    as they are decompiled, and verified while decompilation goes on
+    with the next ones; finished() gives the outcomes. With *jobs* 1,
+    files are verified as they are submitted.
+
+    Each worker keeps the scanners it has made; see
+    verify.get_scanner(). At most *backlog* files, by default four per
+    worker, wait to be verified before finished() waits for the oldest.
+    """
+    def __init__(self, weak_verify, jobs=None, cache=None, backlog=None):
+        self.weak_verify = weak_verify
+        self.cache = cache
+        if not jobs:
+            jobs = multiprocessing.cpu_count()
+        self.pool = None
+        if jobs > 1:
+            self.pool = multiprocessing.Pool(jobs)
+        self.backlog = backlog or 4 * jobs
+        # (filename, outfile, cache_key, entry, outcome or AsyncResult)
+        self.pending = deque()
+
+    def submit(self, filename, infile, outfile, cache_key=None):
+        """Verify *outfile* against *infile*, reporting it as
+        *filename*."""
+        entry = outcome = None
+        if self.cache is not None and cache_key is not None:
+            entry, outcome = cached_verify(self.cache, cache_key,
+                                           self.weak_verify)
+        if outcome is None:
+            if self.pool is None:
+                outcome = verify_outcome(infile, outfile, self.weak_verify)
+                record_verify(self.cache, cache_key, entry, self.weak_verify,
+                              outcome)
+            else:
+                outcome = self.pool.apply_async(
+                    verify_outcome, (infile, outfile, self.weak_verify))
+        self.pending.append((filename, outfile, cache_key, entry, outcome))
+        return
+
+    def finished(self, wait=False):
+        """
+        Generate (filename, outfile, ok, message) for the files verified
+        so far, in the order they were submitted, or if *wait* is true
+        for all of them once they are.
+        """
+        while self.pending:
+            filename, outfile, cache_key, entry, outcome = self.pending[0]
+            if not isinstance(outcome, tuple):
+                if not (wait or outcome.ready()
+                        or len(self.pending) > self.backlog):
+                    return
+                outcome = outcome.get()
+                record_verify(self.cache, cache_key, entry,
+                              self.weak_verify, outcome)
+            self.pending.popleft()
+            ok, msg = outcome
+            yield filename, outfile, ok, msg
+        return
+
+    def close(self):
+        """Stop the workers, dropping what hasn't been verified."""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        return
 
 # For compatiblity
 uncompyle_file = decompile_file
 
+class TeeOutput(object):
+    """
+    Output stream writing to both *out*, typically sys.stdout, and
+    file *fp*. close() closes *fp* but only flushes *out*.
+    """
+    def __init__(self, out, fp):
+        self.out = out
+        self.fp = fp
+
+    def write(self, data):
+        self.out.write(data)
+        self.fp.write(data)
+
+    def flush(self):
+        self.out.flush()
+        self.fp.flush()
+
+    def close(self):
+        self.out.flush()
+        self.fp.close()
+
 
 # FIXME: combine into an options parameter
 def main(in_base, out_base, files, codes, outfile=None,
          showasm=None, showast=False, do_verify=False,
          showgrammar=False, raise_on_error=False,
-         do_linemaps=False):
+         do_linemaps=False, parse_budget=None, stats=None, stream=False,
+         cache=None, verify_jobs=None, count_budget=False):
     """
     in_base	base directory for input files
     out_base	base directory for output files (ignored when
     files	list of filenames to be uncompyled (relative to src_base)
     outfile	write output to this filename (overwrites out_base)
+    parse_budget	dict of limits to set in uncompyle6.parser.PARSE_BUDGET
+    stats	uncompyle6.stats.DecompileStats to record timings in
+    stream	write each top-level statement out as soon as it is
+		generated, rather than each module at the end
+    cache	uncompyle6.cache.ResultCache to take decompiled source
+		and verification outcomes from, and store them in
+    verify_jobs	number of processes verifying files while the next
+		ones are decompiled, by default one per CPU; see
+		VerifyStage
+
+    count_budget	return a fifth count, of the files given up on because
+		parsing exceeded the parse budget; otherwise they are
+		counted in failed_files
+
+    Returns (tot_files, okay_files, failed_files, verify_failed_files),
+    or with count_budget, (tot_files, okay_files, failed_files,
+    verify_failed_files, budget_files).
 
     For redirecting output to
     - <filename>		outfile=<filename> (out_base is ignored)
@@ -105,114 +310,155 @@ def main(in_base, out_base, files, codes, outfile=None,
             pass
         return open(outfile, 'w')
 
+    # The budget is put back as it was once the files are done
+    saved_budget = dict(parser.PARSE_BUDGET)
+    if parse_budget:
+        parser.PARSE_BUDGET.update(parse_budget)
+
     tot_files = okay_files = failed_files = verify_failed_files = 0
+    budget_files = 0
 
-    for filename in files:
-        infile = os.path.join(in_base, filename)
-        if not os.path.exists(infile):
-            sys.stderr.write("File '%s' doesn't exist. Skipped\n"
-                             % infile)
-            continue
-
-        # print (infile, file=sys.stderr)
-
-        if outfile: # outfile was given as parameter
-            outstream = _get_outstream(outfile)
-        elif out_base is None:
-            outstream = sys.stdout
-            if do_linemaps or do_verify:
-                prefix = os.path.basename(filename)
-                if prefix.endswith('.py'):
-                    prefix = prefix[:-len('.py')]
-                junk, outfile = tempfile.mkstemp(suffix=".py",
-                                             prefix=prefix)
-                # Unbuffer output if possible
-                buffering = -1 if sys.stdout.isatty() else 0
-                sys.stdout = os.fdopen(sys.stdout.fileno(), 'w', buffering)
-                tee = subprocess.Popen(["tee", outfile], stdin=subprocess.PIPE)
-                os.dup2(tee.stdin.fileno(), sys.stdout.fileno())
-                os.dup2(tee.stdin.fileno(), sys.stderr.fileno())
-        else:
-            if filename.endswith('.pyc'):
-                outfile = os.path.join(out_base, filename[0:-1])
+    # The next few files are mapped while the current one is decompiled
+    loaded = prefetch([os.path.join(in_base, filename) for filename in files])
+    given_outfile = outfile
+
+    verifier = None
+    if do_verify:
+        # Checked as they are decompiled, other than for a single file
+        verifier = VerifyStage(do_verify == 'weak',
+                               verify_jobs if len(files) > 1 else 1, cache)
+
+    def verified(outcomes):
+        """Report failures among *outcomes*, from verifier.finished(),
+        and return how many there were."""
+        count = 0
+        for filename, outfile, ok, msg in outcomes:
+            if not ok:
+                print(msg)
+                count += 1
+                os.rename(outfile, outfile + '_unverified')
+                sys.stderr.write("### Error Verifying %s\n" % filename)
+                sys.stderr.write(msg + "\n")
+            pass
+        return count
+
+    try:
+        for filename in files:
+            infile, pyc = next(loaded)
+            outfile = given_outfile
+            if not os.path.exists(infile):
+                sys.stderr.write("File '%s' doesn't exist. Skipped\n"
+                                 % infile)
+                continue
+            if pyc is not None and not pyc.supported:
+                pyc.close()
+                sys.stderr.write("File '%s' isn't bytecode of a supported "
+                                 "Python version. Skipped\n" % infile)
+                continue
+
+            # print (infile, file=sys.stderr)
+
+            if outfile: # outfile was given as parameter
+                outstream = _get_outstream(outfile)
+            elif out_base is None:
+                outstream = sys.stdout
+                if do_linemaps or do_verify:
+                    prefix = os.path.basename(filename)
+                    if prefix.endswith('.py'):
+                        prefix = prefix[:-len('.py')]
+                    fd, outfile = tempfile.mkstemp(suffix=".py",
+                                                   prefix=prefix)
+                    # Show the source, and keep a copy to check
+                    outstream = TeeOutput(sys.stdout, os.fdopen(fd, 'w'))
             else:
-                outfile = os.path.join(out_base, filename) + '_dis'
-            outstream = _get_outstream(outfile)
-        # print(outfile, file=sys.stderr)
+                if filename.endswith('.pyc'):
+                    outfile = os.path.join(out_base, filename[0:-1])
+                else:
+                    outfile = os.path.join(out_base, filename) + '_dis'
+                outstream = _get_outstream(outfile)
+            # print(outfile, file=sys.stderr)
 
-        # Try to uncompile the input file
-        try:
-            decompile_file(infile, outstream, showasm, showast, showgrammar)
-            tot_files += 1
-        except (ValueError, SyntaxError, ParserError, pysource.SourceWalkerError) as e:
-            sys.stdout.write("\n")
-            sys.stderr.write("\n# file %s\n# %s\n" % (infile, e))
-            failed_files += 1
-        except KeyboardInterrupt:
+            # Try to uncompile the input file
+            try:
+                cache_key = decompile_file(infile, outstream, showasm, showast,
+                                           showgrammar, stats, stream, cache,
+                                           pyc)
+                tot_files += 1
+            except (ValueError, SyntaxError, ParserError, pysource.SourceWalkerError) as e:
+                sys.stdout.write("\n")
+                sys.stderr.write("\n# file %s\n# %s\n" % (infile, e))
+                failed_files += 1
+            except ParseBudgetExceeded as e:
+                sys.stdout.write("\n")
+                sys.stderr.write("\n# file %s\n# %s" % (infile, e))
+                budget_files += 1
+            except KeyboardInterrupt:
+                if verifier is not None:
+                    verifier.close()
+                if outfile:
+                    outstream.close()
+                    os.remove(outfile)
+                sys.stdout.write("\n")
+                sys.stderr.write("\nLast file: %s   " % (infile))
+                raise
+            # except:
+            #     failed_files += 1
+            #     if outfile:
+            #         outstream.close()
+            #         os.rename(outfile, outfile + '_failed')
+            #     else:
+            #         sys.stderr.write("\n# %s" % sys.exc_info()[1])
+            #         sys.stderr.write("\n# Can't uncompile %s\n" % infile)
+            else: # uncompile successful
+                if outfile:
+                    if do_linemaps:
+                        outstream.flush()
+                        mapping = line_number_mapping(infile, outfile)
+                        outstream.write("\n\n## Line number correspondences\n")
+                        import pprint
+                        s = pprint.pformat(mapping, indent=2, width=80)
+                        s2 = '##' + '\n##'.join(s.split("\n")) + "\n"
+                        outstream.write(s2)
+                    outstream.close()
+
+                    if do_verify:
+                        verifier.submit(filename, infile, outfile, cache_key)
+                    pass
+                elif do_verify:
+                    sys.stderr.write("\n### uncompile successful, but no file to compare against\n")
+                    pass
+                else:
+                    okay_files += 1
+                    if not outfile:
+                        mess = '\n# okay decompiling'
+                        # mem_usage = __memUsage()
+                        print(mess, infile)
+            if verifier is not None:
+                verify_failed_files += verified(verifier.finished())
             if outfile:
-                outstream.close()
-                os.remove(outfile)
-            sys.stdout.write("\n")
-            sys.stderr.write("\nLast file: %s   " % (infile))
-            raise
-        # except:
-        #     failed_files += 1
-        #     if outfile:
-        #         outstream.close()
-        #         os.rename(outfile, outfile + '_failed')
-        #     else:
-        #         sys.stderr.write("\n# %s" % sys.exc_info()[1])
-        #         sys.stderr.write("\n# Can't uncompile %s\n" % infile)
-        else: # uncompile successful
+                sys.stdout.write("%s\r" %
+                                 status_msg(do_verify, tot_files, okay_files, failed_files,
+                                            verify_failed_files, budget_files))
+                sys.stdout.flush()
+        if verifier is not None:
+            verify_failed_files += verified(verifier.finished(wait=True))
+            verifier.close()
             if outfile:
-                if do_linemaps:
-                    mapping = line_number_mapping(infile, outfile)
-                    outstream.write("\n\n## Line number correspondences\n")
-                    import pprint
-                    s = pprint.pformat(mapping, indent=2, width=80)
-                    s2 = '##' + '\n##'.join(s.split("\n")) + "\n"
-                    outstream.write(s2)
-                outstream.close()
-
-                if do_verify:
-                    weak_verify = do_verify == 'weak'
-                    try:
-                        msg = verify.compare_code_with_srcfile(infile, outfile, weak_verify=weak_verify)
-                        if not outfile:
-                            if not msg:
-                                print('\n# okay decompiling %s' % infile)
-                                okay_files += 1
-                            else:
-                                print('\n# %s\n\t%s', infile, msg)
-                    except verify.VerifyCmpError as e:
-                        print(e)
-                        verify_failed_files += 1
-                        os.rename(outfile, outfile + '_unverified')
-                        sys.stderr.write("### Error Verifying %s\n" % filename)
-                        sys.stderr.write(str(e) + "\n")
-                        if not outfile:
-                            if raise_on_error:
-                                raise
-                            pass
-                        pass
-                pass
-            elif do_verify:
-                sys.stderr.write("\n### uncompile successful, but no file to compare against\n")
-                pass
-            else:
-                okay_files += 1
-                if not outfile:
-                    mess = '\n# okay decompiling'
-                    # mem_usage = __memUsage()
-                    print(mess, infile)
-        if outfile:
-            sys.stdout.write("%s\r" %
-                             status_msg(do_verify, tot_files, okay_files, failed_files, verify_failed_files))
-            sys.stdout.flush()
+                sys.stdout.write("%s\r" %
+                                 status_msg(do_verify, tot_files, okay_files,
+                                            failed_files, verify_failed_files,
+                                            budget_files))
+    finally:
+        parser.PARSE_BUDGET.clear()
+        parser.PARSE_BUDGET.update(saved_budget)
     if outfile:
         sys.stdout.write("\n")
         sys.stdout.flush()
-    return (tot_files, okay_files, failed_files, verify_failed_files)
+    if not count_budget:
+        return (tot_files, okay_files, failed_files + budget_files,
+                verify_failed_files)
+    return (tot_files, okay_files, failed_files, verify_failed_files,
+            budget_files)
 
 
 # ---- main ----
@@ -228,9 +474,11 @@ else:
         return ''
 
 def status_msg(do_verify, tot_files, okay_files, failed_files,
-               verify_failed_files):
-    if tot_files == 1:
-        if failed_files:
+               verify_failed_files, budget_files=0):
+    if tot_files + budget_files == 1:
+        if budget_files:
+            return "\n# decompile exceeded parse budget"
+        elif failed_files:
             return "\n# decompile failed"
         elif verify_failed_files:
             return "\n# decompile verify failed"
@@ -241,4 +489,6 @@ def status_msg(do_verify, tot_files, okay_files, failed_files,
     mess = "decompiled %i files: %i okay, %i failed" % (tot_files, okay_files, failed_files)
     if do_verify:
         mess += (", %i verify failed" % verify_failed_files)
+    if budget_files:
+        mess += (", %i over parse budget" % budget_files)
     return mess
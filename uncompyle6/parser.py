@@ -8,11 +8,16 @@ Common uncompyle parser routines.
 
 from __future__ import print_function
 
-import sys
+import copy, hashlib, os, pickle, sys, tempfile, time
 
 from xdis.code import iscode
 from spark_parser import GenericASTBuilder, DEFAULT_DEBUG as PARSER_DEFAULT_DEBUG
+from spark_parser.spark import _State
 from uncompyle6.show import maybe_show_asm
+from uncompyle6.version import VERSION
+
+if sys.version_info[0] >= 3:
+    intern = sys.intern
 
 
 class ParserError(Exception):
@@ -24,6 +29,34 @@ class ParserError(Exception):
         return "Parse error at or near `%r' instruction at offset %s\n" % \
                (self.token, self.offset)
 
+class ParseBudgetExceeded(Exception):
+    """Raised when parsing a code object takes more work than allowed
+    by the parse budget; see PARSE_BUDGET."""
+    def __init__(self, what, limit, token):
+        self.what = what
+        self.limit = limit
+        self.token = token
+
+    def __str__(self):
+        if self.token is None:
+            where = 'at end of instructions'
+        else:
+            where = ("at or near `%r' instruction at offset %s" %
+                     (self.token, self.token.offset))
+        return "Parse budget of %s %s exceeded %s\n" % (self.limit, self.what,
+                                                        where)
+
+# Limits on the work done in parsing a single code object. If any of
+# them is exceeded, ParseBudgetExceeded is raised. A value of None
+# means no limit.
+#   states:  number of parser states added, which are built lazily
+#   items:   number of Earley items
+#   seconds: wall-clock time
+PARSE_BUDGET = {'states': None, 'items': None, 'seconds': None}
+
+# Maximum number of custom rules parse() lets accumulate in a parser
+MAX_CUSTOM_RULES = 200
+
 nop_func = lambda self, args: None
 
 class PythonParser(GenericASTBuilder):
@@ -37,6 +70,390 @@ class PythonParser(GenericASTBuilder):
              'print_items',
              # PyPy:
              'kvlist_n'])
+        # Saved grammar states; see push_rules() and pop_rules()
+        self.rule_stack = []
+        # If not None, overrides PARSE_BUDGET for this parser
+        self.budget = None
+
+    def clone(self, debug=None):
+        """Return a copy of this parser that can be customized and used
+        for parsing without affecting this one. Grammar rules, the
+        customization sets (new_rules, added_rules, ...) and any
+        computed parse tables are copied; the semantic actions in
+        rule2func are rebound to the copy.
+        """
+        # Note: copy.copy() would go through spark's pickling support
+        # which rebuilds the grammar; that is what we want to avoid.
+        p = self.__class__.__new__(self.__class__)
+        p.__dict__.update(self.__dict__)
+        for name, value in self.__dict__.items():
+            if isinstance(value, (dict, list, set)):
+                setattr(p, name, copy.copy(value))
+                pass
+            pass
+        p.rules = dict((lhs, list(rules)) for lhs, rules in self.rules.items())
+        for rule in self.rule2func:
+            if rule[0] != self._START:
+                # Actions added via addRule() close over the parser
+                # they were added to, so they have to be recreated.
+                p.rule2func[rule] = p.preprocess(rule, None)[1]
+                pass
+            pass
+        if debug is not None:
+            p.debug = debug
+        return p
+
+    # Attributes which push_rules() doesn't save: the grammar itself is
+    # handled separately and the parse tables are recomputed by spark
+    # whenever the grammar changes.
+    _unsaved_attrs = frozenset(
+        ['rules', 'rule2func', 'rule2name', 'ruleschanged', 'rule_stack',
+         'nullable', 'newrules', 'new2old', 'edges', 'cores', 'states',
+         'links', 'debug', 'profile_info', 'transitions', 'predictions',
+         'nonkernels', 'members'])
+
+    def push_rules(self):
+        """Save the current grammar and customization state, so that
+        rules added afterwards, e.g. by add_custom_rules(), can be
+        removed by a matching pop_rules(). This way one parser can be
+        reused for many code objects without its grammar growing.
+        """
+        counts = dict((lhs, len(rules)) for lhs, rules in self.rules.items())
+        counts[None] = sum(counts.values())
+        saved = {}
+        for name, value in self.__dict__.items():
+            if name not in self._unsaved_attrs:
+                if isinstance(value, (dict, list, set)):
+                    value = copy.copy(value)
+                saved[name] = value
+                pass
+            pass
+        self.rule_stack.append((counts, saved))
+        return
+
+    def pop_rules(self):
+        """Remove the rules added since the last push_rules() and
+        restore the customization state saved there.
+        """
+        counts, saved = self.rule_stack.pop()
+        for lhs in list(self.rules.keys()):
+            rules = self.rules[lhs]
+            n = counts.get(lhs, 0)
+            if len(rules) == n:
+                continue
+            for rule in rules[n:]:
+                del self.rule2func[rule]
+                del self.rule2name[rule]
+                pass
+            if n == 0:
+                del self.rules[lhs]
+            else:
+                del rules[n:]
+            self.ruleschanged = True
+            pass
+        for name in list(self.__dict__.keys()):
+            if name not in self._unsaved_attrs and name not in saved:
+                delattr(self, name)
+            pass
+        self.__dict__.update(saved)
+        return
+
+    def parse(self, tokens, debug=None):
+        budget = self.budget if self.budget is not None else PARSE_BUDGET
+        self.max_states = budget.get('states')
+        self.max_items = budget.get('items')
+        self.max_seconds = budget.get('seconds')
+        if self.max_seconds is not None:
+            self.deadline = time.time() + self.max_seconds
+        self.item_count = 0
+        # Parse states are kept from one parse to the next until the
+        # grammar changes; only those this parse adds count against
+        # the budget.
+        if self.ruleschanged:
+            self.states_before = 0
+        else:
+            self.states_before = len(self.states)
+        if self.ruleschanged or not hasattr(self, 'transitions'):
+            # spark is about to rebuild the parse tables; the ones
+            # makeState() keeps go with them.
+            self.transitions = {}
+            self.predictions = {}
+            self.nonkernels = {}
+        # Items in each Earley set, for fast membership tests
+        self.members = {}
+        # The type of each token, read once and interned like the
+        # grammar's symbols, so that looking up a transition on it
+        # compares strings by identity; see makeSet()
+        self.token_types = [intern(self.typestring(token))
+                            for token in tokens]
+        return super(PythonParser, self).parse(tokens, debug)
+
+    def rules_added(self):
+        """Return the number of rules added since the last push_rules()."""
+        total = self.rule_stack[-1][0][None]
+        return sum(len(rules) for rules in self.rules.values()) - total
+
+    def makeState(self, state, sym):
+        """spark's makeState(), but rather than scanning all the items of
+        *state* for those with *sym* next on every call, they are grouped
+        by next symbol once per state; see group_items(). And what each
+        nonterminal predicts is worked out once per grammar; see
+        prediction(). States are numbered, and their items ordered,
+        exactly as spark does.
+        """
+        transitions = self.transitions.get(state)
+        if transitions is None:
+            transitions = self.transitions[state] = self.group_items(state)
+        kitems = list(transitions.get(sym, ()))
+        tcore = tuple(sorted(kitems))
+        if tcore in self.cores:
+            return self.cores[tcore]
+
+        k = self.cores[tcore] = len(self.states)
+        K = _State(k, kitems)
+        self.states[k] = K
+
+        edges = self.edges
+        rules = self.newrules
+        predicted = []
+        for rule, pos in kitems:
+            rhs = rule[1]
+            if pos == len(rhs):
+                K.complete.append(rule)
+                continue
+            nextSym = intern(rhs[pos])
+            key = (k, nextSym)
+            if nextSym not in rules:
+                if key not in edges:
+                    edges[key] = None
+                    K.T.append(nextSym)
+            else:
+                edges[key] = None
+                if nextSym not in predicted:
+                    predicted.append(nextSym)
+            pass
+
+        if not predicted:
+            return k
+
+        # The epsilon-nonkernel state holds the items of the
+        # nonterminals K predicts, then of the ones those predict, and
+        # so on, each in the order it is first predicted.
+        seen = set(predicted)
+        predictions = self.predictions
+        for nonterminal in predicted:
+            if nonterminal in predictions:
+                nonterminals = predictions[nonterminal][3]
+            else:
+                nonterminals = self.prediction(nonterminal)[3]
+            for nextSym in nonterminals:
+                if nextSym not in seen:
+                    seen.add(nextSym)
+                    predicted.append(nextSym)
+            pass
+
+        tcore = tuple(sorted(predicted))
+        if tcore in self.cores:
+            self.edges[(k, None)] = self.cores[tcore]
+            return k
+
+        nk = self.cores[tcore] = self.edges[(k, None)] = k+1
+        NK = _State(nk, [])
+        self.nonkernels[nk] = tuple(predicted)
+        for nonterminal in predicted:
+            items, complete, T, NT, _ = predictions[nonterminal]
+            NK.items.extend(items)
+            NK.complete.extend(complete)
+            for nextSym in T:
+                key = (nk, nextSym)
+                if key not in self.edges:
+                    self.edges[key] = None
+                    NK.T.append(nextSym)
+            for nextSym in NT:
+                self.edges[(nk, nextSym)] = None
+            pass
+        self.states[nk] = NK
+        return k
+
+    def group_items(self, state):
+        """Return a dict giving, for each symbol that comes next in
+        some item of *state*, the kernel items moving over it leads to.
+        """
+        transitions = {}
+        predicted = self.nonkernels.get(state)
+        if predicted is None:
+            for rule, pos in self.states[state].items:
+                rhs = rule[1]
+                if pos < len(rhs):
+                    kitem = (rule, self.skip(rule, pos+1))
+                    if rhs[pos] in transitions:
+                        transitions[rhs[pos]].append(kitem)
+                    else:
+                        transitions[rhs[pos]] = [kitem]
+                pass
+        else:
+            for nonterminal in predicted:
+                for nextSym, kitems in self.prediction(nonterminal)[4].items():
+                    if nextSym in transitions:
+                        transitions[nextSym].extend(kitems)
+                    else:
+                        transitions[nextSym] = list(kitems)
+                pass
+        return transitions
+
+    def prediction(self, nonterminal):
+        """Return what predicting *nonterminal* adds to a state: its
+        items, the rules among them that are complete, the terminals
+        and nonterminals that come next in the others, and a dict of
+        the kernel items each of those next symbols leads to."""
+        prediction = self.predictions.get(nonterminal)
+        if prediction is None:
+            rules = self.newrules
+            items = tuple((rule, self.skip(rule))
+                          for rule in rules[nonterminal])
+            complete, T, NT = [], [], []
+            transitions = {}
+            for rule, pos in items:
+                rhs = rule[1]
+                if pos == len(rhs):
+                    complete.append(rule)
+                    continue
+                nextSym = rhs[pos]
+                if nextSym not in rules:
+                    if nextSym not in T:
+                        T.append(nextSym)
+                elif nextSym not in NT:
+                    NT.append(nextSym)
+                kitem = (rule, self.skip(rule, pos+1))
+                if nextSym in transitions:
+                    transitions[nextSym].append(kitem)
+                else:
+                    transitions[nextSym] = [kitem]
+                pass
+            prediction = self.predictions[nonterminal] = (
+                items, tuple(complete), tuple(T), tuple(NT), transitions)
+        return prediction
+
+    def makeSet(self, tokens, sets, i):
+        """spark's makeSet(), with membership in the Earley sets tested
+        against a set rather than the list, goto() inlined, token types
+        taken from self.token_types, and with the parse budget checked
+        afterwards."""
+        cur, next = sets[i], sets[i+1]
+        members = self.members
+        cur_members = members.get(i)
+        if cur_members is None:
+            cur_members = members[i] = set(cur)
+        next_members = members.get(i+1)
+        if next_members is None:
+            next_members = members[i+1] = set(next)
+        links = self.links
+        edges = self.edges
+
+        if tokens is not None:
+            token = tokens[i]
+            ttype = self.token_types[i]
+        else:
+            ttype = None
+            token = None
+        # gotoT(), inlined unless it is to print what it does
+        inline_goto = ttype is not None and not self.debug['rules']
+        if ttype is not None:
+            fn, arg = self.gotoT, ttype
+        else:
+            fn, arg = self.gotoST, token
+
+        for item in cur:
+            ptr = (item, i)
+            state, parent = item
+            if inline_goto:
+                key = (state, ttype)
+                if key in edges:
+                    k = edges[key]
+                    if k is None:
+                        k = edges[key] = self.makeState(state, ttype)
+                    targets = (k,)
+                else:
+                    targets = ()
+            else:
+                targets = fn(state, arg)
+            for k in targets:
+                if k is not None:
+                    new = (k, parent)
+                    key = (new, i+1)
+                    if new not in next_members:
+                        next_members.add(new)
+                        next.append(new)
+                        links[key] = []
+                    links[key].append((ptr, None))
+                    nk = edges.get((k, None))
+                    if nk is not None:
+                        new = (nk, i+1)
+                        if new not in next_members:
+                            next_members.add(new)
+                            next.append(new)
+
+            if parent == i:
+                continue
+
+            for rule in self.states[state].complete:
+                lhs, rhs = rule
+                if self.debug['reduce']:
+                    self.debug_reduce(rule, tokens, parent, i)
+                if self.profile_info is not None:
+                    self.profile_rule(rule)
+                if lhs in self.check_reduce and tokens:
+                    if self.check_reduce[lhs] == 'AST':
+                        ast = self.reduce_ast(rule, tokens, item, i, sets)
+                    else:
+                        ast = None
+                    invalid = self.reduce_is_invalid(rule, ast, tokens, parent, i)
+                    if ast:
+                        del ast
+                    if invalid:
+                        if self.debug['reduce']:
+                            print("Reduce %s invalid by check" % lhs)
+                        continue
+                    pass
+                for pitem in sets[parent]:
+                    pstate, pparent = pitem
+                    key = (pstate, lhs)
+                    if key not in edges:
+                        continue
+                    k = edges[key]
+                    if k is None:
+                        k = self.goto(pstate, lhs)
+                    if k is not None:
+                        new = (k, pparent)
+                        key = (new, i)
+                        if new not in cur_members:
+                            cur_members.add(new)
+                            cur.append(new)
+                            links[key] = []
+                        links[key].append(((pitem, parent), (item, i, rule)))
+                        nk = edges.get((k, None))
+                        if nk is not None:
+                            new = (nk, i)
+                            if new not in cur_members:
+                                cur_members.add(new)
+                                cur.append(new)
+
+        self.item_count += len(cur)
+        if self.max_items is not None and self.item_count > self.max_items:
+            self.budget_exceeded('Earley items', self.max_items, tokens, i)
+        if (self.max_states is not None and
+            len(self.states) - self.states_before > self.max_states):
+            self.budget_exceeded('parse states', self.max_states, tokens, i)
+        if self.max_seconds is not None and time.time() > self.deadline:
+            self.budget_exceeded('seconds', self.max_seconds, tokens, i)
+        return
+
+    def budget_exceeded(self, what, limit, tokens, i):
+        if tokens is not None and i < len(tokens):
+            token = tokens[i]
+        else:
+            token = None
+        raise ParseBudgetExceeded(what, limit, token)
 
     def ast_first_offset(self, ast):
         if hasattr(ast, 'offset'):
@@ -589,78 +1006,199 @@ class PythonParser(GenericASTBuilder):
 
 
 def parse(p, tokens, customize):
+    # Custom rules from earlier code objects are kept, since the code
+    # objects of a module tend to need the same ones and then the
+    # parse tables don't have to be recomputed. But once more than
+    # MAX_CUSTOM_RULES have piled up, we go back to the base grammar.
+    if not p.rule_stack:
+        p.push_rules()
+    elif p.rules_added() > MAX_CUSTOM_RULES:
+        p.pop_rules()
+        p.push_rules()
     p.add_custom_rules(tokens, customize)
     ast = p.parse(tokens)
     #  p.cleanup()
     return ast
 
 
+# If set to a directory, grammars are saved there the first time they
+# are built and loaded from there afterwards, which is cheaper than
+# collecting the p_* docstring rules again.
+GRAMMAR_CACHE_DIR = os.environ.get('UNCOMPYLE6_GRAMMAR_CACHE', None)
+
+def grammar_digest(parser_class):
+    """Return a hex digest identifying the grammar of *parser_class*:
+    its p_* rule docstrings along with the uncompyle6 and spark
+    versions. It changes whenever the grammar source changes.
+    The __init__ methods are included too, since a saved grammar
+    also holds the attributes they set.
+    """
+    from spark_parser import VERSION as SPARK_VERSION
+    h = hashlib.sha1(('%s %s' % (VERSION, SPARK_VERSION)).encode('utf-8'))
+    for klass in parser_class.__mro__:
+        for name in sorted(klass.__dict__.keys()):
+            if name.startswith('p_'):
+                doc = klass.__dict__[name].__doc__ or ''
+                h.update(('%s.%s\n%s' % (klass.__name__, name, doc)).encode('utf-8'))
+            elif name == '__init__' and hasattr(klass.__dict__[name], '__code__'):
+                code = klass.__dict__[name].__code__
+                h.update(code.co_code)
+                h.update(repr(code.co_names).encode('utf-8'))
+                pass
+            pass
+        pass
+    return h.hexdigest()
+
+def grammar_cache_path(parser_class, cache_dir):
+    return os.path.join(cache_dir, '%s-%s-%s.pickle' %
+                        (parser_class.__name__, VERSION,
+                         grammar_digest(parser_class)[:16]))
+
+def save_grammar(p, path):
+    """Write the rule tables of parser *p* to *path*. The semantic
+    actions in rule2func are closures and can't be pickled; they are
+    recreated by load_grammar(). The file is written to a temporary
+    name and then renamed, so readers never see a partial file.
+    """
+    state = p.__dict__.copy()
+    del state['rule2func']
+    del state['debug']
+    state['grammar_digest'] = grammar_digest(p.__class__)
+    cache_dir = os.path.dirname(path)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fp:
+            pickle.dump(state, fp, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        # The cache is only an optimization
+        pass
+    return
+
+def load_grammar(parser_class, path, debug_parser=PARSER_DEFAULT_DEBUG):
+    """Return a parser of class *parser_class* using the rule tables
+    saved in *path*, or None if there is no usable saved grammar.
+    """
+    try:
+        with open(path, 'rb') as fp:
+            state = pickle.load(fp)
+    except Exception:
+        return None
+    if (not isinstance(state, dict) or
+        state.pop('grammar_digest', None) != grammar_digest(parser_class)):
+        return None
+    p = parser_class.__new__(parser_class)
+    p.__dict__.update(state)
+    p.debug = debug_parser
+    p.rule2func = {}
+    for rules in p.rules.values():
+        for rule in rules:
+            if rule[0] == p._START:
+                p.rule2func[rule] = lambda args: args[1]
+            else:
+                p.rule2func[rule] = p.preprocess(rule, None)[1]
+            pass
+        pass
+    return p
+
+def new_parser(parser_class, debug_parser):
+    """Create a parser of class *parser_class*, going through the
+    on-disk grammar cache when GRAMMAR_CACHE_DIR is set.
+    """
+    if not GRAMMAR_CACHE_DIR:
+        return parser_class(debug_parser)
+    path = grammar_cache_path(parser_class, GRAMMAR_CACHE_DIR)
+    p = load_grammar(parser_class, path, debug_parser)
+    if p is None:
+        p = parser_class(debug_parser)
+        save_grammar(p, path)
+    return p
+
+# Parsers built by get_python_parser() keyed by (version, compile_mode,
+# is_pypy). Collecting the p_* grammar docstrings into rule tables
+# is much more expensive than copying the result, so we hand out
+# clones of these.
+PARSER_CACHE = {}
+
 def get_python_parser(
         version, debug_parser=PARSER_DEFAULT_DEBUG, compile_mode='exec',
-        is_pypy = False):
+        is_pypy = False, use_cache=True):
     """Returns parser object for Python version 2 or 3, 3.2, 3.5on,
     etc., depending on the parameters passed.  *compile_mode* is either
     'exec', 'eval', or 'single'. See
     https://docs.python.org/3.6/library/functions.html#compile for an
     explanation of the different modes.
+
+    Unless *use_cache* is False, the grammar for a given version is
+    built once and each call returns a clone of it, so custom rules
+    added to the parser returned do not leak into other parsers.
     """
 
+    # Grammar coverage is accumulated per parser object, so don't
+    # share parsers when that is being collected.
+    use_cache = use_cache and 'SPARK_PARSER_COVERAGE' not in os.environ
+    key = (version, compile_mode, is_pypy)
+    if use_cache and key in PARSER_CACHE:
+        return PARSER_CACHE[key].clone(debug_parser)
+
     # FIXME: there has to be a better way...
     if version < 3.0:
         if version == 1.5:
             import uncompyle6.parsers.parse15 as parse15
             if compile_mode == 'exec':
-                p = parse15.Python15Parser(debug_parser)
+                p = new_parser(parse15.Python15Parser, debug_parser)
             else:
-                p = parse15.Python15ParserSingle(debug_parser)
+                p = new_parser(parse15.Python15ParserSingle, debug_parser)
         elif version == 2.1:
             import uncompyle6.parsers.parse21 as parse21
             if compile_mode == 'exec':
-                p = parse21.Python21Parser(debug_parser)
+                p = new_parser(parse21.Python21Parser, debug_parser)
             else:
-                p = parse21.Python21ParserSingle(debug_parser)
+                p = new_parser(parse21.Python21ParserSingle, debug_parser)
         elif version == 2.2:
             import uncompyle6.parsers.parse22 as parse22
             if compile_mode == 'exec':
-                p = parse22.Python22Parser(debug_parser)
+                p = new_parser(parse22.Python22Parser, debug_parser)
             else:
-                p = parse22.Python22ParserSingle(debug_parser)
+                p = new_parser(parse22.Python22ParserSingle, debug_parser)
         elif version == 2.3:
             import uncompyle6.parsers.parse23 as parse23
             if compile_mode == 'exec':
-                p = parse23.Python23Parser(debug_parser)
+                p = new_parser(parse23.Python23Parser, debug_parser)
             else:
-                p = parse23.Python23ParserSingle(debug_parser)
+                p = new_parser(parse23.Python23ParserSingle, debug_parser)
         elif version == 2.4:
             import uncompyle6.parsers.parse24 as parse24
             if compile_mode == 'exec':
-                p = parse24.Python24Parser(debug_parser)
+                p = new_parser(parse24.Python24Parser, debug_parser)
             else:
-                p = parse24.Python24ParserSingle(debug_parser)
+                p = new_parser(parse24.Python24ParserSingle, debug_parser)
         elif version == 2.5:
             import uncompyle6.parsers.parse25 as parse25
             if compile_mode == 'exec':
-                p = parse25.Python25Parser(debug_parser)
+                p = new_parser(parse25.Python25Parser, debug_parser)
             else:
-                p = parse25.Python25ParserSingle(debug_parser)
+                p = new_parser(parse25.Python25ParserSingle, debug_parser)
         elif version == 2.6:
             import uncompyle6.parsers.parse26 as parse26
             if compile_mode == 'exec':
-                p = parse26.Python26Parser(debug_parser)
+                p = new_parser(parse26.Python26Parser, debug_parser)
             else:
-                p = parse26.Python26ParserSingle(debug_parser)
+                p = new_parser(parse26.Python26ParserSingle, debug_parser)
         elif version == 2.7:
             import uncompyle6.parsers.parse27 as parse27
             if compile_mode == 'exec':
-                p = parse27.Python27Parser(debug_parser)
+                p = new_parser(parse27.Python27Parser, debug_parser)
             else:
-                p = parse27.Python27ParserSingle(debug_parser)
+                p = new_parser(parse27.Python27ParserSingle, debug_parser)
         else:
             import uncompyle6.parsers.parse2 as parse2
             if compile_mode == 'exec':
-                p = parse2.Python2Parser(debug_parser)
+                p = new_parser(parse2.Python2Parser, debug_parser)
             else:
-                p = parse2.Python2ParserSingle(debug_parser)
+                p = new_parser(parse2.Python2ParserSingle, debug_parser)
                 pass
             pass
         pass
@@ -669,54 +1207,74 @@ def get_python_parser(
         if version == 3.0:
             import uncompyle6.parsers.parse30 as parse30
             if compile_mode == 'exec':
-                p = parse30.Python30Parser(debug_parser)
+                p = new_parser(parse30.Python30Parser, debug_parser)
             else:
-                p = parse30.Python30ParserSingle(debug_parser)
+                p = new_parser(parse30.Python30ParserSingle, debug_parser)
         elif version == 3.1:
             import uncompyle6.parsers.parse31 as parse31
             if compile_mode == 'exec':
-                p = parse31.Python31Parser(debug_parser)
+                p = new_parser(parse31.Python31Parser, debug_parser)
             else:
-                p = parse31.Python31ParserSingle(debug_parser)
+                p = new_parser(parse31.Python31ParserSingle, debug_parser)
         elif version == 3.2:
             import uncompyle6.parsers.parse32 as parse32
             if compile_mode == 'exec':
-                p = parse32.Python32Parser(debug_parser)
+                p = new_parser(parse32.Python32Parser, debug_parser)
             else:
-                p = parse32.Python32ParserSingle(debug_parser)
+                p = new_parser(parse32.Python32ParserSingle, debug_parser)
         elif version == 3.3:
             import uncompyle6.parsers.parse33 as parse33
             if compile_mode == 'exec':
-                p = parse33.Python33Parser(debug_parser)
+                p = new_parser(parse33.Python33Parser, debug_parser)
             else:
-                p = parse33.Python33ParserSingle(debug_parser)
+                p = new_parser(parse33.Python33ParserSingle, debug_parser)
         elif version == 3.4:
             import uncompyle6.parsers.parse34 as parse34
             if compile_mode == 'exec':
-                p = parse34.Python34Parser(debug_parser)
+                p = new_parser(parse34.Python34Parser, debug_parser)
             else:
-                p = parse34.Python34ParserSingle(debug_parser)
+                p = new_parser(parse34.Python34ParserSingle, debug_parser)
         elif version == 3.5:
             import uncompyle6.parsers.parse35 as parse35
             if compile_mode == 'exec':
-                p = parse35.Python35Parser(debug_parser)
+                p = new_parser(parse35.Python35Parser, debug_parser)
             else:
-                p = parse35.Python35ParserSingle(debug_parser)
+                p = new_parser(parse35.Python35ParserSingle, debug_parser)
         elif version == 3.6:
             import uncompyle6.parsers.parse36 as parse36
             if compile_mode == 'exec':
-                p = parse36.Python36Parser(debug_parser)
+                p = new_parser(parse36.Python36Parser, debug_parser)
             else:
-                p = parse36.Python36ParserSingle(debug_parser)
+                p = new_parser(parse36.Python36ParserSingle, debug_parser)
         else:
             if compile_mode == 'exec':
-                p = parse3.Python3Parser(debug_parser)
+                p = new_parser(parse3.Python3Parser, debug_parser)
             else:
-                p = parse3.Python3ParserSingle(debug_parser)
+                p = new_parser(parse3.Python3ParserSingle, debug_parser)
     p.version = version
     # p.dumpGrammar() # debug
+    if use_cache:
+        PARSER_CACHE[key] = p
+        return p.clone(debug_parser)
     return p
 
+def prewarm_parsers(versions=None, compile_modes=('exec',), is_pypy=False):
+    """Build and cache the grammars for *versions* (by default all
+    the versions we handle) and *compile_modes* ahead of time, e.g. at
+    process start-up, so that later calls to get_python_parser() only
+    pay for a clone.
+    """
+    if versions is None:
+        from uncompyle6.scanner import PYTHON_VERSIONS
+        versions = PYTHON_VERSIONS
+    for version in versions:
+        for compile_mode in compile_modes:
+            get_python_parser(version, compile_mode=compile_mode,
+                              is_pypy=is_pypy)
+            pass
+        pass
+    return
+
 class PythonParserSingle(PythonParser):
     def p_call_stmt_single(self, args):
         '''
@@ -828,14 +828,14 @@ class Python3Parser(PythonParser):
                 last += 1
             return tokens[first].attr == tokens[last].offset
         elif lhs == 'while1stmt':
-            if tokens[last] in ('COME_FROM_LOOP', 'JUMP_BACK'):
+            if self.token_types[last] in ('COME_FROM_LOOP', 'JUMP_BACK'):
                 # jump_back should be right afer SETUP_LOOP. Test?
                 last += 1
             while last < len(tokens) and isinstance(tokens[last].offset, str):
                 last += 1
             if last < len(tokens):
                 offset = tokens[last].offset
-                assert tokens[first] == 'SETUP_LOOP'
+                assert self.token_types[first] == 'SETUP_LOOP'
                 if offset != tokens[first].attr:
                     return True
             return False
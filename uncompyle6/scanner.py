@@ -13,9 +13,12 @@ scanners, e.g. for Python 2.7 or 3.4.
 from __future__ import print_function
 
 import sys
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
 
 from uncompyle6 import PYTHON3, IS_PYPY
-from uncompyle6.scanners.tok import Token
+from uncompyle6.scanners.tok import Token, token_class
 
 # The byte code versions we support
 PYTHON_VERSIONS = (1.5,
@@ -45,6 +48,177 @@ class Code(object):
                 setattr(self, i, getattr(co, i))
         self._tokens, self._customize = scanner.ingest(co, classname)
 
+# What Scanner.lines gives for an offset: the line number, and the
+# offset where the next line starts
+LineTuple = namedtuple('LineTuple', ['l_no', 'next'])
+
+class LineTable(object):
+    '''
+    Scanner.lines: a LineTuple for each offset of the code, when indexed
+    by the offset. The values are kept in two arrays, filled a line at
+    a time, rather than as a tuple for every offset.
+    '''
+    def __init__(self):
+        self.l_nos = array('i')
+        self.nexts = array('i')
+
+    def extend(self, l_no, next_offset, count):
+        """Add *count* offsets on line *l_no*, with the next line
+        starting at *next_offset*."""
+        if count > 0:
+            self.l_nos.extend(array('i', [l_no]) * count)
+            self.nexts.extend(array('i', [next_offset]) * count)
+
+    def __len__(self):
+        return len(self.l_nos)
+
+    def __getitem__(self, offset):
+        return LineTuple(self.l_nos[offset], self.nexts[offset])
+
+class InstructionTable(object):
+    '''
+    The instructions in byte code *code*, decoded once from its start
+    the way Scanner.op_range() steps through it. For the i-th
+    instruction, offsets[i] is its offset, ops[i] its opcode, args[i]
+    its argument, or -1 if it has none, and targets[i] where it jumps
+    to, or -1 if it isn't a jump; index[offset] is i, or -1 for an
+    offset inside an instruction.
+
+    The table also finds instructions for Scanner.first_instr(),
+    last_instr() and all_instr() by bisection, rather than by going
+    through every instruction between start and end.
+    '''
+    def __init__(self, scanner, code):
+        self.code = code
+        opc = scanner.opc
+        sizes = scanner.op_sizes
+        have_argument = opc.HAVE_ARGUMENT
+        hasjrel = frozenset(opc.hasjrel)
+        hasjabs = frozenset(opc.hasjabs)
+        wordcode = scanner.version >= 3.6
+        codelen = len(code)
+
+        self.offsets = offsets = array('i')
+        self.ops = ops = array('i')
+        self.args = args = array('i')
+        self.targets = targets = array('i')
+        self.index = index = array('i', [-1]) * codelen
+        # Opcode -> offsets of the instructions with it, in order
+        self.by_op = by_op = {}
+
+        offset = i = 0
+        while offset < codelen:
+            op = code[offset]
+            size = sizes[op]
+            arg = target = -1
+            if op >= have_argument and offset + size <= codelen:
+                if wordcode:
+                    arg = code[offset+1]
+                else:
+                    arg = code[offset+1] + code[offset+2] * 256
+                if op in hasjrel:
+                    target = offset + size + arg
+                elif op in hasjabs:
+                    target = arg
+            offsets.append(offset)
+            ops.append(op)
+            args.append(arg)
+            targets.append(target)
+            index[offset] = i
+            if op in by_op:
+                by_op[op].append(offset)
+            else:
+                by_op[op] = [offset]
+            offset += size
+            i += 1
+        # Opcode -> {jump target: offsets}, filled in by sources()
+        self.by_target = {}
+
+    def truncated(self, code):
+        """Return the table of *code*, the first instructions of this
+        table's code, up to the end of one of them."""
+        table = InstructionTable.__new__(InstructionTable)
+        table.code = code
+        n = bisect_left(self.offsets, len(code))
+        table.offsets = self.offsets[:n]
+        table.ops = self.ops[:n]
+        table.args = self.args[:n]
+        table.targets = self.targets[:n]
+        table.index = self.index[:len(code)]
+        table.by_op = {}
+        for op, offsets in self.by_op.items():
+            i = bisect_left(offsets, len(code))
+            if i:
+                table.by_op[op] = offsets[:i]
+        table.by_target = {}
+        return table
+
+    def offset_range(self, start, end):
+        """Return the offsets of the instructions from *start* up to
+        *end*, or None if *start* isn't the offset of an instruction."""
+        if start < len(self.index) and self.index[start] < 0:
+            return None
+        offsets = self.offsets
+        return offsets[bisect_left(offsets, start):bisect_left(offsets, end)]
+
+    def find(self, start, end, instr):
+        """Return the offsets from *start* up to *end* of the
+        instructions with an opcode in *instr*, in order, or None if
+        *start* isn't the offset of an instruction."""
+        if start < len(self.index) and self.index[start] < 0:
+            return None
+        found = []
+        for op in set(instr):
+            offsets = self.by_op.get(op)
+            if offsets:
+                found.extend(offsets[bisect_left(offsets, start):
+                                     bisect_left(offsets, end)])
+        if len(found) > 1:
+            found.sort()
+        return found
+
+    def sequence_ends(self, start, end, sequence):
+        """Return the offsets of the last instructions of the runs of
+        instructions with the opcodes in *sequence*, a tuple, that start
+        from *start* up to *end*."""
+        offsets = self.by_op.get(sequence[0], [])
+        ops, index = self.ops, self.index
+        length = len(sequence)
+        found = []
+        for offset in offsets[bisect_left(offsets, start):
+                              bisect_left(offsets, end)]:
+            i = index[offset]
+            if tuple(ops[i:i+length]) == sequence:
+                found.append(self.offsets[i+length-1])
+        return found
+
+    def sources(self, start, end, instr, target):
+        """Like find(), but only for the instructions whose target, as
+        Scanner.get_target() gives it, is *target*. The opcodes in
+        *instr* must have arguments."""
+        if start < len(self.index) and self.index[start] < 0:
+            return None
+        found = []
+        for op in set(instr):
+            by_target = self.by_target.get(op)
+            if by_target is None:
+                by_target = self.by_target[op] = {}
+                index, args, targets = self.index, self.args, self.targets
+                for offset in self.by_op.get(op, []):
+                    i = index[offset]
+                    dest = targets[i] if targets[i] >= 0 else args[i]
+                    if dest in by_target:
+                        by_target[dest].append(offset)
+                    else:
+                        by_target[dest] = [offset]
+            offsets = by_target.get(target)
+            if offsets:
+                found.extend(offsets[bisect_left(offsets, start):
+                                     bisect_left(offsets, end)])
+        if len(found) > 1:
+            found.sort()
+        return found
+
 class Scanner(object):
 
     def __init__(self, version, show_asm=None, is_pypy=False):
@@ -63,6 +237,19 @@ class Scanner(object):
             raise TypeError("%s is not a Python version I know about" % version)
 
         self.opname = self.opc.opname
+        # Size of each opcode's instructions; see op_size()
+        if version >= 3.6:
+            self.op_sizes = [2] * 256
+        else:
+            self.op_sizes = [1 if op < self.opc.HAVE_ARGUMENT else 3
+                             for op in range(256)]
+        # InstructionTable of self.code, made when first needed
+        self.instructions = None
+        # For find_parent(): the self.structs list it was last used on,
+        # how many of them it has seen, and those not yet ended
+        self.parent_structs = None
+        self.structs_seen = 0
+        self.open_structs = []
         # FIXME: This weird Python2 behavior is not Python3
         self.resetTokenClass()
 
@@ -105,6 +292,37 @@ class Scanner(object):
             else:
                 print('%i\t%s\t' % (i, self.opname[op]))
 
+    def get_instructions(self):
+        """Return the InstructionTable of self.code, making it if need
+        be."""
+        if (self.instructions is None
+            or self.instructions.code is not self.code):
+            self.instructions = InstructionTable(self, self.code)
+        return self.instructions
+
+    def instr_offsets(self, start, end, instr, target=None):
+        """
+        Return the offsets of the <instr> instructions from start to
+        end, in order; <instr> is a list of opcodes. If <target> is
+        given, only those whose target is <target> are returned.
+        """
+        table = self.get_instructions()
+        has_arg = bool(instr) and min(instr) >= self.opc.HAVE_ARGUMENT
+        if target is not None and has_arg:
+            found = table.sources(start, end, instr, target)
+        else:
+            found = table.find(start, end, instr)
+        if found is None:
+            # start isn't an instruction offset; decode from it anyway
+            code = self.code
+            found = [offset for offset in self.decode_range(start, end)
+                     if code[offset] in instr]
+            has_arg = False
+        if target is not None and not has_arg:
+            found = [offset for offset in found
+                     if self.get_target(offset) == target]
+        return found
+
     def first_instr(self, start, end, instr, target=None, exact=True):
         """
         Find the first <instr> in the block from start to end.
@@ -124,21 +342,20 @@ class Scanner(object):
         except:
             instr = [instr]
 
+        if target is None or exact:
+            found = self.instr_offsets(start, end, instr, target)
+            return found[0] if found else None
+
         result_offset = None
         current_distance = len(code)
-        for offset in self.op_range(start, end):
-            op = code[offset]
-            if op in instr:
-                if target is None:
-                    return offset
-                dest = self.get_target(offset)
-                if dest == target:
-                    return offset
-                elif not exact:
-                    new_distance = abs(target - dest)
-                    if new_distance < current_distance:
-                        current_distance = new_distance
-                        result_offset = offset
+        for offset in self.instr_offsets(start, end, instr):
+            dest = self.get_target(offset)
+            if dest == target:
+                return offset
+            new_distance = abs(target - dest)
+            if new_distance < current_distance:
+                current_distance = new_distance
+                result_offset = offset
         return result_offset
 
     def last_instr(self, start, end, instr, target=None, exact=True):
@@ -164,23 +381,22 @@ class Scanner(object):
         except:
             instr = [instr]
 
+        if target is None or exact:
+            found = self.instr_offsets(start, end, instr, target)
+            return found[-1] if found else None
+
         result_offset = None
         current_distance = len(code)
-        for offset in self.op_range(start, end):
-            op = code[offset]
-            if op in instr:
-                if target is None:
+        for offset in self.instr_offsets(start, end, instr):
+            dest = self.get_target(offset)
+            if dest == target:
+                current_distance = 0
+                result_offset = offset
+            else:
+                new_distance = abs(target - dest)
+                if new_distance <= current_distance:
+                    current_distance = new_distance
                     result_offset = offset
-                else:
-                    dest = self.get_target(offset)
-                    if dest == target:
-                        current_distance = 0
-                        result_offset = offset
-                    elif not exact:
-                        new_distance = abs(target - dest)
-                        if new_distance <= current_distance:
-                            current_distance = new_distance
-                            result_offset = offset
         return result_offset
 
     def all_instr(self, start, end, instr, target=None, include_beyond_target=False):
@@ -200,18 +416,13 @@ class Scanner(object):
         except:
             instr = [instr]
 
+        if target is None or not include_beyond_target:
+            return self.instr_offsets(start, end, instr, target)
+
         result = []
-        for offset in self.op_range(start, end):
-            op = code[offset]
-            if op in instr:
-                if target is None:
-                    result.append(offset)
-                else:
-                    t = self.get_target(offset)
-                    if include_beyond_target and t >= target:
-                        result.append(offset)
-                    elif t == target:
-                        result.append(offset)
+        for offset in self.instr_offsets(start, end, instr):
+            if self.get_target(offset) >= target:
+                result.append(offset)
         return result
 
     def op_hasArgument(self, op):
@@ -222,9 +433,21 @@ class Scanner(object):
         Iterate through positions of opcodes, skipping
         arguments.
         """
+        offsets = self.get_instructions().offset_range(start, end)
+        if offsets is None:
+            return self.decode_range(start, end)
+        return offsets
+
+    def decode_range(self, start, end):
+        """
+        op_range() for when start may be in the middle of an
+        instruction: decode the code from there on.
+        """
+        sizes = self.op_sizes
+        code = self.code
         while start < end:
             yield start
-            start += self.op_size(self.code[start])
+            start += sizes[code[start]]
 
     def next_offset(self, op, offset):
         return offset + self.op_size(op)
@@ -234,10 +457,7 @@ class Scanner(object):
         Return size of operator with its arguments
         for given opcode <op>.
         """
-        if op < self.opc.HAVE_ARGUMENT:
-            return 2 if self.version >= 3.6 else 1
-        else:
-            return 2 if self.version >= 3.6 else 3
+        return self.op_sizes[op]
 
     def remove_mid_line_ifs(self, ifs):
         """
@@ -258,6 +478,42 @@ class Scanner(object):
     def resetTokenClass(self):
         return self.setTokenClass(Token)
 
+    def find_parent(self, offset):
+        """
+        Return the inner-most structure in self.structs around <offset>,
+        as detect_control_flow() needs. The offsets asked about must
+        not decrease for as long as self.structs is the same list, as
+        structures that end before an offset are passed over after it.
+        """
+        structs = self.structs
+        if self.parent_structs is not structs:
+            self.parent_structs = structs
+            self.structs_seen = 0
+            self.open_structs = []
+        open_structs = self.open_structs
+        if self.structs_seen < len(structs):
+            open_structs.extend(structs[self.structs_seen:])
+            self.structs_seen = len(structs)
+
+        parent = structs[0]
+        start = parent['start']
+        end = parent['end']
+        ended = False
+        for struct in open_structs:
+            current_start = struct['start']
+            current_end   = struct['end']
+            if current_end <= offset:
+                ended = True
+            elif ((current_start <= offset)
+                  and (current_start >= start and current_end <= end)):
+                start = current_start
+                end = current_end
+                parent = struct
+        if ended:
+            self.open_structs = [struct for struct in open_structs
+                                 if struct['end'] > offset]
+        return parent
+
     def restrict_to_parent(self, target, parent):
         """Restrict target to parent structure boundaries."""
         if not (parent['start'] < target < parent['end']):
@@ -266,7 +522,7 @@ class Scanner(object):
 
     def setTokenClass(self, tokenClass):
         # assert isinstance(tokenClass, types.ClassType)
-        self.Token = tokenClass
+        self.Token = token_class(tokenClass, self.opc)
         return self.Token
 
 def op_has_argument(op, opc):
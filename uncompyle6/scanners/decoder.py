@@ -0,0 +1,149 @@
+#  Copyright (c) 2017 by Rocky Bernstein
+"""
+Instruction decoding for the scanners' token loops.
+
+Scanner.get_instructions() decodes co_code into an InstructionTable of
+arrays. CodeInstructions adds to that what tokens are made from: each
+instruction's full argument, with the arguments of any EXTENDED_ARGs
+before it folded in, and its argval and argrepr, which are worked out
+from the code object when a token asks for them, the same way xdis's
+get_instructions_bytes() does. Unlike iterating over an xdis Bytecode,
+no Instruction is made for each instruction.
+"""
+
+from array import array
+
+# How argval and argrepr are got from an instruction's argument
+ARG_CONST, ARG_NAME, ARG_JREL, ARG_JABS, ARG_LOCAL, ARG_COMPARE, \
+  ARG_FREE, ARG_NARGS, ARG_FORMAT = range(1, 10)
+
+# Argument kind for each opcode, by opcode module
+_arg_kinds = {}
+
+def arg_kinds(opc):
+    """Return a list giving the kind of argument of each opcode of
+    opcode module *opc*, or None for those without one, in the order
+    xdis looks for them."""
+    kinds = _arg_kinds.get(opc)
+    if kinds is None:
+        kinds = [None] * 256
+        arg_fmt = getattr(opc, 'opcode_arg_fmt', {})
+        for op in range(opc.HAVE_ARGUMENT, 256):
+            if op in opc.hasconst:
+                kinds[op] = ARG_CONST
+            elif op in opc.hasname:
+                kinds[op] = ARG_NAME
+            elif op in opc.hasjrel:
+                kinds[op] = ARG_JREL
+            elif op in opc.hasjabs:
+                kinds[op] = ARG_JABS
+            elif op in opc.haslocal:
+                kinds[op] = ARG_LOCAL
+            elif op in opc.hascompare:
+                kinds[op] = ARG_COMPARE
+            elif op in opc.hasfree:
+                kinds[op] = ARG_FREE
+            elif op in opc.hasnargs:
+                kinds[op] = ARG_NARGS
+            elif opc.opname[op] in arg_fmt:
+                kinds[op] = ARG_FORMAT
+        _arg_kinds[opc] = kinds
+    return kinds
+
+class CodeInstructions(object):
+    """
+    The instructions of code object *co*, as decoded by *scanner*,
+    whose code must be that of *co*. For the i-th instruction,
+    offsets[i], ops[i] and args[i] are its offset, opcode and full
+    argument, or -1 if it has none.
+    """
+    def __init__(self, scanner, co):
+        table = scanner.get_instructions()
+        self.co = co
+        self.code = scanner.code
+        self.opc = opc = scanner.opc
+        self.wordcode = wordcode = scanner.version >= 3.6
+        self.sizes = scanner.op_sizes
+        self.kinds = arg_kinds(opc)
+        self.offsets = table.offsets
+        self.ops = ops = table.ops
+        self.cells = None
+
+        extended_arg = opc.opmap.get('EXTENDED_ARG')
+        if extended_arg not in table.by_op:
+            self.args = table.args
+            return
+        self.args = args = array('i', table.args)
+        extended = 0
+        for i, arg in enumerate(args):
+            if arg < 0:
+                continue
+            if wordcode:
+                arg |= extended
+                extended = (arg << 8) if ops[i] == extended_arg else 0
+            else:
+                arg += extended
+                extended = arg * 65536 if ops[i] == extended_arg else 0
+            args[i] = arg
+        return
+
+    def argval(self, i):
+        """Return the argval of the i-th instruction, or None if it has
+        no argument."""
+        arg = self.args[i]
+        if arg < 0:
+            return None
+        kind = self.kinds[self.ops[i]]
+        if kind == ARG_CONST:
+            return self.co.co_consts[arg]
+        elif kind == ARG_NAME:
+            return self.name(arg, self.co.co_names)
+        elif kind == ARG_JREL:
+            return self.offsets[i] + self.sizes[self.ops[i]] + arg
+        elif kind == ARG_LOCAL:
+            return self.name(arg, self.co.co_varnames)
+        elif kind == ARG_COMPARE:
+            return self.opc.cmp_op[arg]
+        elif kind == ARG_FREE:
+            return self.name(arg, self.cell_names())
+        return arg
+
+    def argrepr(self, i):
+        """Return the argrepr of the i-th instruction: its argument as
+        shown in a disassembly, or '' if it has none."""
+        arg = self.args[i]
+        if arg < 0:
+            return ''
+        op = self.ops[i]
+        kind = self.kinds[op]
+        if kind in (ARG_NAME, ARG_LOCAL, ARG_FREE):
+            argval = self.argval(i)
+            if isinstance(argval, int):
+                # PyPy leaves some names out
+                return repr(argval)
+            return argval
+        elif kind in (ARG_JREL, ARG_JABS):
+            return 'to ' + repr(self.argval(i))
+        elif kind == ARG_CONST:
+            return repr(self.argval(i))
+        elif kind == ARG_COMPARE:
+            return self.argval(i)
+        elif kind == ARG_NARGS:
+            if self.wordcode:
+                return ''
+            offset = self.offsets[i]
+            return ("%d positional, %d keyword pair" %
+                    (self.code[offset+1], self.code[offset+2]))
+        elif kind == ARG_FORMAT:
+            return self.opc.opcode_arg_fmt[self.opc.opname[op]](arg)
+        return ''
+
+    def name(self, arg, names):
+        if arg < len(names):
+            return names[arg]
+        return arg
+
+    def cell_names(self):
+        if self.cells is None:
+            self.cells = self.co.co_cellvars + self.co.co_freevars
+        return self.cells
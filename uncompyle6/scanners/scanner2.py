@@ -22,7 +22,6 @@ Finally we save token information.
 
 from __future__ import print_function
 
-from collections import namedtuple
 from array import array
 
 from uncompyle6.scanner import op_has_argument
@@ -113,22 +112,20 @@ class Scanner2(scan.Scanner):
         # turn 'LOAD_GLOBAL' to 'LOAD_ASSERT'.
         # 'LOAD_ASSERT' is used in assert statements.
         self.load_asserts = set()
-        for i in self.op_range(0, codelen):
-            # We need to detect the difference between:
-            #   raise AssertionError
-            #  and
-            #   assert ...
-            # Below we use the heuristic that it is preceded by a POP_JUMP.
-            # however we could also use followed by RAISE_VARARGS
-            # or for PyPy there may be a JUMP_IF_NOT_DEBUG before.
-            # FIXME: remove uses of PJIF, and PJIT
-            if self.is_pypy:
-                have_pop_jump = self.code[i] in (self.opc.PJIF,
-                                                 self.opc.PJIT)
-            else:
-                have_pop_jump = self.code[i] == self.opc.PJIT
-
-            if have_pop_jump and self.code[i+3] == self.opc.LOAD_GLOBAL:
+        # We need to detect the difference between:
+        #   raise AssertionError
+        #  and
+        #   assert ...
+        # Below we use the heuristic that it is preceded by a POP_JUMP.
+        # however we could also use followed by RAISE_VARARGS
+        # or for PyPy there may be a JUMP_IF_NOT_DEBUG before.
+        # FIXME: remove uses of PJIF, and PJIT
+        if self.is_pypy:
+            pop_jumps = (self.opc.PJIF, self.opc.PJIT)
+        else:
+            pop_jumps = self.opc.PJIT
+        for i in self.all_instr(0, codelen, pop_jumps):
+            if self.code[i+3] == self.opc.LOAD_GLOBAL:
                 if names[self.get_argument(i+3)] == 'AssertionError':
                     self.load_asserts.add(i+3)
 
@@ -149,8 +146,9 @@ class Scanner2(scan.Scanner):
             last_stmt = i
             i = self.next_stmt[i]
 
+        table = self.get_instructions()
         extended_arg = 0
-        for offset in self.op_range(0, codelen):
+        for offset, op, arg in zip(table.offsets, table.ops, table.args):
             if offset in jump_targets:
                 jump_idx = 0
                 # We want to process COME_FROMs to the same offset to be in *descending*
@@ -177,13 +175,12 @@ class Scanner2(scan.Scanner):
                     jump_idx += 1
                     pass
 
-            op = self.code[offset]
             op_name = self.op_name(op)
 
             oparg = None; pattr = None
             has_arg = op_has_argument(op, self.opc)
             if has_arg:
-                oparg = self.get_argument(offset) + extended_arg
+                oparg = arg + extended_arg
                 extended_arg = 0
                 if op == self.opc.EXTENDED_ARG:
                     extended_arg = oparg * scan.L65536
@@ -288,11 +285,11 @@ class Scanner2(scan.Scanner):
             if offset not in replace:
                 tokens.append(Token(
                     op_name, oparg, pattr, offset, linestart, op,
-                    has_arg, self.opc))
+                    has_arg))
             else:
                 tokens.append(Token(
                     replace[offset], oparg, pattr, offset, linestart,
-                    op, has_arg, self.opc))
+                    op, has_arg))
                 pass
             pass
 
@@ -309,36 +306,33 @@ class Scanner2(scan.Scanner):
         The size of self.code is returned
         """
         self.code = array('B', co.co_code)
+        table = self.get_instructions()
 
         n = -1
-        for i in self.op_range(0, len(self.code)):
-            if self.code[i] in (self.opc.RETURN_VALUE, self.opc.END_FINALLY):
-                n = i + 1
-                pass
-            pass
+        for op in (self.opc.RETURN_VALUE, self.opc.END_FINALLY):
+            if op in table.by_op:
+                n = max(n, table.by_op[op][-1] + 1)
         assert n > -1, "Didn't find RETURN_VALUE or END_FINALLY"
         self.code = array('B', co.co_code[:n])
+        self.instructions = table.truncated(self.code)
 
         return n
 
     def build_prev_op(self, n):
-        self.prev = [0]
+        self.prev = prev = [0]
         # mapping addresses of instruction & argument
-        for i in self.op_range(0, n):
-            op = self.code[i]
-            self.prev.append(i)
-            if self.op_hasArgument(op):
-                self.prev.append(i)
-                self.prev.append(i)
-                pass
-            pass
+        table = self.get_instructions()
+        sizes = self.op_sizes
+        for offset, op in zip(table.offsets, table.ops):
+            if offset >= n:
+                break
+            prev.extend([offset] * sizes[op])
 
     def build_lines_data(self, co, n):
         """
         Initializes self.lines and self.linesstartoffsets
         """
-        self.lines = []
-        linetuple = namedtuple('linetuple', ['l_no', 'next'])
+        self.lines = lines = scan.LineTable()
 
         # self.linestarts is a tuple of (offset, line number).
         # Turn that in a has that we can index
@@ -350,13 +344,11 @@ class Scanner2(scan.Scanner):
         j = 0
         (prev_start_byte, prev_line_no) = self.linestarts[0]
         for (start_byte, line_no) in self.linestarts[1:]:
-            while j < start_byte:
-                self.lines.append(linetuple(prev_line_no, start_byte))
-                j += 1
+            if j < start_byte:
+                lines.extend(prev_line_no, start_byte, start_byte - j)
+                j = start_byte
             prev_line_no = start_byte
-        while j < n:
-            self.lines.append(linetuple(prev_line_no, n))
-            j+=1
+        lines.extend(prev_line_no, n, n - j)
         return
 
     def build_statement_indices(self):
@@ -373,19 +365,11 @@ class Scanner2(scan.Scanner):
 
         stmts = self.stmts = set(prelim)
         pass_stmts = set()
+        table = self.get_instructions()
         for seq in stmt_opcode_seqs:
-            for i in self.op_range(start, end-(len(seq)+1)):
-                match = True
-                for elem in seq:
-                    if elem != code[i]:
-                        match = False
-                        break
-                    i += self.op_size(code[i])
-
-                if match:
-                    i = self.prev[i]
-                    stmts.add(i)
-                    pass_stmts.add(i)
+            for i in table.sequence_ends(start, end-(len(seq)+1), seq):
+                stmts.add(i)
+                pass_stmts.add(i)
 
         if pass_stmts:
             stmt_list = list(stmts)
@@ -486,20 +470,10 @@ class Scanner2(scan.Scanner):
 
         code = self.code
 
-        # Detect parent structure
-        parent = self.structs[0]
-        start  = parent['start']
-        end    = parent['end']
-
-        # Pick inner-most parent for our offset
-        for struct in self.structs:
-            current_start = struct['start']
-            current_end   = struct['end']
-            if ((current_start <= offset < current_end)
-                and (current_start >= start and current_end <= end)):
-                start  = current_start
-                end    = current_end
-                parent = struct
+        # Detect parent structure: the inner-most one for our offset
+        parent = self.find_parent(offset)
+        start = parent['start']
+        end = parent['end']
 
         if op == self.opc.SETUP_LOOP:
 
@@ -978,9 +952,9 @@ class Scanner2(scan.Scanner):
         self.setup_loops = {}  # setup_loop offset given target
         self.thens = {} # JUMP_IF's that separate the 'then' part of an 'if'
 
+        table = self.get_instructions()
         targets = {}
-        for offset in self.op_range(0, n):
-            op = code[offset]
+        for offset, op, oparg in zip(table.offsets, table.ops, table.args):
 
             # Determine structures and fix jumps in Python versions
             # since 2.3
@@ -988,7 +962,6 @@ class Scanner2(scan.Scanner):
 
             if op_has_argument(op, self.opc):
                 label = self.fixed_jumps.get(offset)
-                oparg = self.get_argument(offset)
 
                 if label is None:
                     if op in self.opc.hasjrel and self.op_name(op) != 'FOR_ITER':
@@ -1057,22 +1030,8 @@ class Scanner2(scan.Scanner):
 
         assert(start>=0 and end<=len(self.code) and start <= end)
 
-        try:    None in instr
-        except: instr = [instr]
-
-        instr_offsets = []
-        for i in self.op_range(start, end):
-            op = self.code[i]
-            if op in instr:
-                if target is None:
-                    instr_offsets.append(i)
-                else:
-                    t = self.get_target(i, op)
-                    if include_beyond_target and t >= target:
-                        instr_offsets.append(i)
-                    elif t == target:
-                        instr_offsets.append(i)
-
+        instr_offsets = self.all_instr(start, end, instr, target,
+                                       include_beyond_target)
         pjits = self.all_instr(start, end, self.opc.PJIT)
         filtered = []
         for pjit in pjits:
@@ -115,13 +115,12 @@ class Scanner26(scan.Scanner2):
         # turn 'LOAD_GLOBAL' to 'LOAD_ASSERT'.
         # 'LOAD_ASSERT' is used in assert statements.
         self.load_asserts = set()
-        for i in self.op_range(0, codelen):
+        for i in self.all_instr(0, codelen, self.opc.JUMP_IF_TRUE):
             # We need to detect the difference between:
             #   raise AssertionError
             #  and
             #   assert ...
-            if (self.code[i] == self.opc.JUMP_IF_TRUE and
-                i + 4 < codelen and
+            if (i + 4 < codelen and
                 self.code[i+3] == self.opc.POP_TOP and
                 self.code[i+4] == self.opc.LOAD_GLOBAL):
                 if names[self.get_argument(i+4)] == 'AssertionError':
@@ -144,9 +143,9 @@ class Scanner26(scan.Scanner2):
             last_stmt = i
             i = self.next_stmt[i]
 
+        table = self.get_instructions()
         extended_arg = 0
-        for offset in self.op_range(0, codelen):
-            op = self.code[offset]
+        for offset, op, arg in zip(table.offsets, table.ops, table.args):
             op_name = self.opname[op]
             oparg = None; pattr = None
 
@@ -175,7 +174,7 @@ class Scanner26(scan.Scanner2):
 
             has_arg = (op >= self.opc.HAVE_ARGUMENT)
             if has_arg:
-                oparg = self.get_argument(offset) + extended_arg
+                oparg = arg + extended_arg
                 extended_arg = 0
                 if op == self.opc.EXTENDED_ARG:
                     raise NotImplementedError
@@ -284,11 +283,11 @@ class Scanner26(scan.Scanner2):
             if offset not in replace:
                 tokens.append(Token(
                     op_name, oparg, pattr, offset, linestart, op,
-                    has_arg, self.opc))
+                    has_arg))
             else:
                 tokens.append(Token(
                     replace[offset], oparg, pattr, offset, linestart, op,
-                    has_arg, self.opc))
+                    has_arg))
                 pass
             pass
 
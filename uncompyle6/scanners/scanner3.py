@@ -22,13 +22,13 @@ Finally we save token information.
 
 from __future__ import print_function
 
-from collections import namedtuple
 from array import array
 
-from uncompyle6.scanner import Scanner, op_has_argument
+from uncompyle6.scanner import Scanner, LineTable, op_has_argument
 from xdis.code import iscode
 from xdis.bytecode import Bytecode
 from uncompyle6.scanner import Token, parse_fn_counts
+from uncompyle6.scanners.decoder import CodeInstructions
 
 # Get all the opcodes into globals
 import xdis.opcodes.opcode_33 as op3
@@ -165,50 +165,27 @@ class Scanner3(Scanner):
         if self.is_pypy:
             customize['PyPy'] = 1
 
+        # Decode the instructions once; the analyses below all work
+        # from the table of them
         self.code = array('B', co.co_code)
+        self.get_instructions()
         self.build_lines_data(co)
         self.build_prev_op()
-
-        bytecode = Bytecode(co, self.opc)
-
-        # FIXME: put as its own method?
-        # Scan for assertions. Later we will
-        # turn 'LOAD_GLOBAL' to 'LOAD_ASSERT'.
-        # 'LOAD_ASSERT' is used in assert statements.
-        self.load_asserts = set()
-        bs = list(bytecode)
-        n = len(bs)
-        for i in range(n):
-            inst = bs[i]
-
-            # We need to detect the difference between
-            # "raise AssertionError" and "assert"
-            # If we have a JUMP_FORWARD after the
-            # RAISE_VARARGS then we have a "raise" statement
-            # else we have an "assert" statement.
-            if inst.opname == 'POP_JUMP_IF_TRUE' and i+1 < n:
-                next_inst = bs[i+1]
-                if (next_inst.opname == 'LOAD_GLOBAL' and
-                    next_inst.argval == 'AssertionError'):
-                    for j in range(i+2, n):
-                        raise_inst = bs[j]
-                        if raise_inst.opname.startswith('RAISE_VARARGS'):
-                            if j+1 >= n or bs[j+1].opname != 'JUMP_FORWARD':
-                                self.load_asserts.add(next_inst.offset)
-                                pass
-                            break
-                    pass
-                pass
+        self.find_load_asserts(co)
 
         # Get jump targets
         # Format: {target offset: [jump offsets]}
         jump_targets = self.find_jump_targets(show_asm)
         last_op_was_break = False
 
-        for inst in bytecode:
-
-            argval = inst.argval
-            if inst.offset in jump_targets:
+        # Decoded arguments; argval and argrepr are only worked out for
+        # the instructions that need them
+        instructions = CodeInstructions(self, co)
+        hasconst = self.opc.hasconst
+        for i, offset in enumerate(instructions.offsets):
+            op = instructions.ops[i]
+            argval = instructions.argval(i)
+            if offset in jump_targets:
                 jump_idx = 0
                 # We want to process COME_FROMs to the same offset to be in *descending*
                 # offset order so we have the larger range or biggest instruction interval
@@ -216,40 +193,43 @@ class Scanner3(Scanner):
                 # we sort them). That way, specific COME_FROM tags will match up
                 # properly. For example, a "loop" with an "if" nested in it should have the
                 # "loop" tag last so the grammar rule matches that properly.
-                for jump_offset in sorted(jump_targets[inst.offset], reverse=True):
+                for jump_offset in sorted(jump_targets[offset], reverse=True):
                     come_from_name = 'COME_FROM'
                     opname = self.opname_for_offset(jump_offset)
                     if opname.startswith('SETUP_'):
                         come_from_type = opname[len('SETUP_'):]
                         come_from_name = 'COME_FROM_%s' % come_from_type
                         pass
-                    elif inst.offset in self.except_targets:
+                    elif offset in self.except_targets:
                         come_from_name = 'COME_FROM_EXCEPT_CLAUSE'
                         if self.version <= 3.2:
                             continue
                         pass
                     tokens.append(Token(come_from_name,
                                         None, repr(jump_offset),
-                                        offset='%s_%s' % (inst.offset, jump_idx),
-                                        has_arg = True, opc=self.opc))
+                                        offset='%s_%s' % (offset, jump_idx),
+                                        has_arg = True))
                     jump_idx += 1
                     pass
                 pass
-            elif inst.offset in self.else_start:
-                end_offset = self.else_start[inst.offset]
+            elif offset in self.else_start:
+                end_offset = self.else_start[offset]
                 tokens.append(Token('ELSE',
                                     None, repr(end_offset),
-                                    offset='%s' % (inst.offset),
-                                    has_arg = True, opc=self.opc))
+                                    offset='%s' % (offset),
+                                    has_arg = True))
 
                 pass
 
-            pattr =  inst.argrepr
-            opname = inst.opname
-            op = inst.opcode
+            if op in hasconst:
+                # The constant's repr() isn't wanted
+                pattr = None
+            else:
+                pattr = instructions.argrepr(i)
+            opname = self.opname[op]
 
             if opname in ['LOAD_CONST']:
-                const = inst.argval
+                const = argval
                 if iscode(const):
                     if const.co_name == '<lambda>':
                         opname = 'LOAD_LAMBDA'
@@ -271,7 +251,7 @@ class Scanner3(Scanner):
                     pattr = const
                     pass
             elif opname in ('MAKE_FUNCTION', 'MAKE_CLOSURE'):
-                pos_args, name_pair_args, annotate_args = parse_fn_counts(inst.argval)
+                pos_args, name_pair_args, annotate_args = parse_fn_counts(argval)
                 if name_pair_args > 0:
                     opname = '%s_N%d' % (opname, name_pair_args)
                     pass
@@ -286,8 +266,8 @@ class Scanner3(Scanner):
                         type_ = opname,
                         attr = (pos_args, name_pair_args, annotate_args),
                         pattr = pattr,
-                        offset = inst.offset,
-                        linestart = inst.starts_line,
+                        offset = offset,
+                        linestart = self.linestarts.get(offset),
                         op = op,
                         has_arg = op_has_argument(op, op3),
                         opc = self.opc
@@ -295,7 +275,7 @@ class Scanner3(Scanner):
                 )
                 continue
             elif op in self.varargs_ops:
-                pos_args = inst.argval
+                pos_args = argval
                 if self.is_pypy and not pos_args and opname == 'BUILD_MAP':
                     opname = 'BUILD_MAP_n'
                 else:
@@ -307,9 +287,9 @@ class Scanner3(Scanner):
                 customize[opname] = 0
             elif opname == 'UNPACK_EX':
                 # FIXME: try with scanner and parser by
-                # changing inst.argval
-                before_args = inst.argval & 0xFF
-                after_args = (inst.argval >> 8) & 0xff
+                # changing argval
+                before_args = argval & 0xFF
+                after_args = (argval >> 8) & 0xff
                 pattr = "%d before vararg, %d after" % (before_args, after_args)
                 argval = (before_args, after_args)
                 opname = '%s_%d+%d' % (opname, before_args, after_args)
@@ -326,12 +306,13 @@ class Scanner3(Scanner):
                 # comprehensions we might sometimes classify JUMP_BACK
                 # as CONTINUE, but that's okay since we add a grammar
                 # rule for that.
-                pattr = inst.argval
-                target = self.get_target(inst.offset)
-                if target <= inst.offset:
-                    next_opname = self.opname[self.code[inst.offset+3]]
-                    if (inst.offset in self.stmts and
-                        (self.version != 3.0 or (hasattr(inst, 'linestart'))) and
+                pattr = argval
+                target = self.get_target(offset)
+                if target <= offset:
+                    next_opname = self.opname[self.code[offset+3]]
+                    if (offset in self.stmts and
+                        # 3.0 never checked for a line start here
+                        self.version != 3.0 and
                         (next_opname not in ('END_FINALLY', 'POP_BLOCK',
                                             # Python 3.0 only uses POP_TOP
                                             'POP_TOP'))):
@@ -353,9 +334,9 @@ class Scanner3(Scanner):
                         last_op_was_break = False
                         continue
             elif op == self.opc.RETURN_VALUE:
-                if inst.offset in self.return_end_ifs:
+                if offset in self.return_end_ifs:
                     opname = 'RETURN_END_IF'
-            elif inst.offset in self.load_asserts:
+            elif offset in self.load_asserts:
                 opname = 'LOAD_ASSERT'
 
             last_op_was_break = opname == 'BREAK_LOOP'
@@ -364,8 +345,8 @@ class Scanner3(Scanner):
                     type_ = opname,
                     attr = argval,
                     pattr = pattr,
-                    offset = inst.offset,
-                    linestart = inst.starts_line,
+                    offset = offset,
+                    linestart = self.linestarts.get(offset),
                     op = op,
                     has_arg = (op >= op3.HAVE_ARGUMENT),
                     opc = self.opc
@@ -391,39 +372,66 @@ class Scanner3(Scanner):
         self.linestart_offsets = set(a for (a, _) in linestarts)
         # 'List-map' which shows line number of current op and offset of
         # first op on following line, given offset of op as index
-        self.lines = lines = []
-        LineTuple = namedtuple('LineTuple', ['l_no', 'next'])
+        self.lines = lines = LineTable()
         # Iterate through available linestarts, and fill
         # the data for all code offsets encountered until
         # last linestart offset
         _, prev_line_no = linestarts[0]
         offset = 0
         for start_offset, line_no in linestarts[1:]:
-            while offset < start_offset:
-                lines.append(LineTuple(prev_line_no, start_offset))
-                offset += 1
+            if offset < start_offset:
+                lines.extend(prev_line_no, start_offset, start_offset - offset)
+                offset = start_offset
             prev_line_no = line_no
         # Fill remaining offsets with reference to last line number
         # and code length as start offset of following non-existing line
         codelen = len(self.code)
-        while offset < codelen:
-            lines.append(LineTuple(prev_line_no, codelen))
-            offset += 1
+        lines.extend(prev_line_no, codelen, codelen - offset)
 
     def build_prev_op(self):
         """
         Compose 'list-map' which allows to jump to previous
         op, given offset of current op as index.
         """
-        code = self.code
-        codelen = len(code)
+        table = self.get_instructions()
+        sizes = self.op_sizes
         # 2.x uses prev 3.x uses prev_op. Sigh
         # Until we get this sorted out.
-        self.prev = self.prev_op = [0]
-        for offset in self.op_range(0, codelen):
-            op = code[offset]
-            for _ in range(self.op_size(op)):
-                self.prev_op.append(offset)
+        self.prev = self.prev_op = prev_op = [0]
+        for offset, op in zip(table.offsets, table.ops):
+            prev_op.extend([offset] * sizes[op])
+
+    def find_load_asserts(self, co):
+        """
+        Find the LOAD_GLOBALs of AssertionError that are part of
+        assert statements. Later we will turn 'LOAD_GLOBAL' into
+        'LOAD_ASSERT', which is used in assert statements.
+        """
+        self.load_asserts = set()
+        table = self.get_instructions()
+        offsets, ops, args = table.offsets, table.ops, table.args
+        n = len(offsets)
+        # Python 3.0 has no POP_JUMP_IF_TRUE
+        pop_jump_if_true = self.opc.opmap.get('POP_JUMP_IF_TRUE')
+        for offset in table.by_op.get(pop_jump_if_true, []):
+            i = table.index[offset] + 1
+            if (i < n and ops[i] == self.opc.LOAD_GLOBAL and
+                co.co_names[args[i]] == 'AssertionError'):
+                # We need to detect the difference between
+                # "raise AssertionError" and "assert"
+                # If we have a JUMP_FORWARD after the
+                # RAISE_VARARGS then we have a "raise" statement
+                # else we have an "assert" statement.
+                raise_offset = self.first_instr(offsets[i], len(self.code),
+                                                self.opc.RAISE_VARARGS)
+                if raise_offset is not None:
+                    j = table.index[raise_offset] + 1
+                    if j >= n or ops[j] != self.opc.JUMP_FORWARD:
+                        self.load_asserts.add(offsets[i])
+                    pass
+                pass
+            pass
+        return
 
     def find_jump_targets(self, debug):
         """
@@ -457,9 +465,9 @@ class Scanner3(Scanner):
         self.setup_loop_targets = {}  # target given setup_loop offset
         self.setup_loops = {}  # setup_loop offset given target
 
+        table = self.get_instructions()
         targets = {}
-        for offset in self.op_range(0, n):
-            op = code[offset]
+        for offset, op, oparg in zip(table.offsets, table.ops, table.args):
 
             # Determine structures and fix jumps in Python versions
             # since 2.3
@@ -468,10 +476,6 @@ class Scanner3(Scanner):
             has_arg = (op >= op3.HAVE_ARGUMENT)
             if has_arg:
                 label = self.fixed_jumps.get(offset)
-                if self.version >= 3.6:
-                    oparg = code[offset+1]
-                else:
-                    oparg = code[offset+1] + code[offset+2] * 256
                 next_offset = self.next_offset(op, offset)
 
                 if label is None:
@@ -511,19 +515,11 @@ class Scanner3(Scanner):
 
         # Same for opcode sequences
         pass_stmts = set()
+        table = self.get_instructions()
         for sequence in self.statement_opcode_sequences:
-            for i in self.op_range(start, end-(len(sequence)+1)):
-                match = True
-                for elem in sequence:
-                    if elem != code[i]:
-                        match = False
-                        break
-                    i += self.op_size(code[i])
-
-                if match is True:
-                    i = self.prev_op[i]
-                    stmts.add(i)
-                    pass_stmts.add(i)
+            for i in table.sequence_ends(start, end-(len(sequence)+1), sequence):
+                stmts.add(i)
+                pass_stmts.add(i)
 
         # Initialize statement list with the full data we've gathered so far
         if pass_stmts:
@@ -605,21 +601,11 @@ class Scanner3(Scanner):
         code = self.code
         op = code[offset]
 
-        # Detect parent structure
-        parent = self.structs[0]
+        # Detect parent structure: the inner-most one for our offset
+        parent = self.find_parent(offset)
         start = parent['start']
         end = parent['end']
 
-        # Pick inner-most parent for our offset
-        for struct in self.structs:
-            current_start = struct['start']
-            current_end   = struct['end']
-            if ((current_start <= offset < current_end)
-                and (current_start >= start and current_end <= end)):
-                start = current_start
-                end = current_end
-                parent = struct
-
         if op == self.opc.SETUP_LOOP:
             # We categorize loop types: 'for', 'while', 'while 1' with
             # possibly suffixes '-loop' and '-else'
@@ -8,13 +8,31 @@ from uncompyle6 import PYTHON3
 if PYTHON3:
     intern = sys.intern
 
-class Token:
+class Token(object):
     """
     Class representing a byte-code instruction.
 
     A byte-code token is equivalent to Python 3's dis.instruction or
     the contents of one line as output by dis.dis().
+
+    There is one of these per instruction, all alive while the code is
+    parsed, so the fields live in slots rather than a per-token dict.
+    parent, start and finish are set by the fragments deparser; other
+    attributes can still be added and go in a dict created on demand.
+
+    The opcode module, opc, comes from the class rather than each
+    token: a scanner makes its tokens from token_class(), which gives
+    its own opc.
     """
+    # Tokens stay objects rather than columns in parallel arrays: every
+    # token ends up as a leaf of the parse tree, so a columnar stream
+    # would still need an object per token, and the parser looks at a
+    # token's type only once, when it starts the token's Earley set.
+    __slots__ = ('type', 'op', 'has_arg', 'attr', 'pattr', 'offset',
+                 'linestart', 'parent', 'start', 'finish', '__dict__')
+
+    opc = None
+
     # FIXME: match Python 3.4's terms:
     #    type_ should be opname
     #    linestart = starts_line
@@ -32,7 +50,8 @@ class Token:
         if has_arg is False:
             self.attr = None
             self.pattr = None
-        self.opc = opc
+        if opc is not None and opc is not self.opc:
+            self.opc = opc
 
     def __eq__(self, o):
         """ '==', but it's okay if offsets and linestarts are different"""
@@ -90,4 +109,18 @@ class Token:
     def __getitem__(self, i):
         raise IndexError
 
+# Token classes made by token_class(), by (base class, opc)
+token_classes = {}
+
+def token_class(base, opc):
+    """Return a subclass of Token class *base* whose tokens have opcode
+    module *opc*."""
+    key = (base, opc)
+    cls = token_classes.get(key)
+    if cls is None:
+        cls = token_classes[key] = type(base.__name__, (base,),
+                                        {'__slots__': (), 'opc': opc,
+                                         '__module__': base.__module__})
+    return cls
+
 NoneToken = Token('LOAD_CONST', offset=-1, attr=None, pattr=None)
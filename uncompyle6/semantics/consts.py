@@ -2,6 +2,7 @@
 """Constants used in pysource.py"""
 
 import re, sys
+from operator import attrgetter
 from uncompyle6.parsers.astnode import AST
 from uncompyle6 import PYTHON3
 from uncompyle6.scanners.tok import Token, NoneToken
@@ -350,3 +351,58 @@ escape = re.compile(r'''
                 ((?P<type> [^{] ) |
                  ( [{] (?P<expr> [^}]* ) [}] ))
         ''', re.VERBOSE)
+
+identifier = re.compile(r'^[A-Za-z_][A-Za-z_0-9]*$')
+
+class NodeAttributes(object):
+    """Mapping of a node's attributes, which may be in slots, for
+    evaluating %{...} expressions in"""
+    def __init__(self, node):
+        self.node = node
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self.node, name)
+        except AttributeError:
+            raise KeyError(name)
+
+# Format strings already compiled by compile_format()
+compiled_formats = {}
+
+def compile_format(fmt):
+    """Compile format string *fmt* of a table entry into a list of ops,
+    one per escape, plus the literal text after the last escape.
+
+    Each op is (prefix, child, type, getter): the literal text before
+    the escape, the index of the child to walk down to or None, the
+    escape type ('{' for %{...}), and for %{...} a function returning
+    its value for a node. The result is cached.
+    """
+    compiled = compiled_formats.get(fmt)
+    if compiled is not None:
+        return compiled
+
+    ops = []
+    i = 0
+    m = escape.search(fmt)
+    while m:
+        i = m.end()
+        child = m.group('child')
+        if child:
+            child = int(child)
+        else:
+            child = None
+        typ = m.group('type') or '{'
+        getter = None
+        if typ == '{':
+            expr = m.group('expr')
+            if identifier.match(expr):
+                getter = attrgetter(expr)
+            else:
+                code = compile(expr, '<format>', 'eval')
+                getter = lambda node, code=code: eval(code, {},
+                                                      NodeAttributes(node))
+        ops.append((m.group('prefix'), child, typ, getter))
+        m = escape.search(fmt, i)
+    compiled = compiled_formats[fmt] = (ops, fmt[i:])
+    return compiled
@@ -59,7 +59,7 @@ from uncompyle6 import PYTHON3, IS_PYPY
 from xdis.code import iscode
 from uncompyle6.semantics import pysource
 from uncompyle6 import parser
-from uncompyle6.scanner import Token, Code, get_scanner
+from uncompyle6.scanner import Token, get_scanner
 from uncompyle6.semantics.check_ast import checker
 from uncompyle6.semantics.helper import print_docstring
 
@@ -76,7 +76,7 @@ from uncompyle6.semantics.pysource import (
 
 from uncompyle6.semantics.consts import (
     INDENT_PER_LEVEL, NONE, PRECEDENCE,
-    TABLE_DIRECT, escape, minint, MAP
+    TABLE_DIRECT, compile_format, minint, MAP
     )
 
 from uncompyle6.semantics.make_function import (
@@ -562,7 +562,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
 
         assert iscode(cn.attr)
 
-        code = Code(cn.attr, self.scanner, self.currentclass)
+        code = self.ingest_code(cn.attr)
         ast = self.build_ast(code._tokens, code._customize)
         self.customize(code._customize)
         ast = ast[0][0][0]
@@ -605,7 +605,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
 
         assert iscode(code)
         code_name = code.co_name
-        code = Code(code, self.scanner, self.currentclass)
+        code = self.ingest_code(code)
 
         ast = self.build_ast(code._tokens, code._customize)
         self.customize(code._customize)
@@ -695,7 +695,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
         p = self.prec
         self.prec = 27
 
-        code = Code(node[1].attr, self.scanner, self.currentclass)
+        code = self.ingest_code(node[1].attr)
         ast = self.build_ast(code._tokens, code._customize)
         self.customize(code._customize)
         ast = ast[0][0][0][0][0]
@@ -828,7 +828,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
         p = self.prec
         self.prec = 27
 
-        code = Code(node[1].attr, self.scanner, self.currentclass)
+        code = self.ingest_code(node[1].attr)
         ast = self.build_ast(code._tokens, code._customize)
         self.customize(code._customize)
         ast = ast[0][0][0]
@@ -1422,22 +1422,18 @@ class FragmentsWalker(pysource.SourceWalker, object):
         startnode_start = len(self.f.getvalue())
         start = startnode_start
 
-        fmt = entry[0]
+        ops, tail = compile_format(entry[0])
         arg = 1
-        i = 0
         lastC = -1
         recurse_node = False
 
-        m = escape.search(fmt)
-        while m:
-            i = m.end()
-            self.write(m.group('prefix'))
+        for prefix, child, typ, getter in ops:
+            self.write(prefix)
 
-            typ = m.group('type') or '{'
             node = startnode
             try:
-                if m.group('child'):
-                    node = node[int(m.group('child'))]
+                if child is not None:
+                    node = node[child]
                     node.parent = startnode
             except:
                 print(node.__dict__)
@@ -1540,19 +1536,16 @@ class FragmentsWalker(pysource.SourceWalker, object):
                 arg += 1
 
             elif typ == '{':
-                d = node.__dict__
-                expr = m.group('expr')
                 try:
                     start = len(self.f.getvalue())
-                    self.write(eval(expr, d, d))
+                    self.write(getter(node))
                     self.set_pos_info(node, start, len(self.f.getvalue()))
                 except:
                     print(node)
                     raise
-            m = escape.search(fmt, i)
             pass
 
-        self.write(fmt[i:])
+        self.write(tail)
         fin = len(self.f.getvalue())
         if recurse_node:
             self.set_pos_info_recurse(startnode, startnode_start, fin)
@@ -1635,7 +1628,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
             code = code.attr
 
         assert iscode(code)
-        code = Code(code, self.scanner, self.currentclass)
+        code = self.ingest_code(code)
 
         # add defaults values to parameter names
         argc = code.co_argcount
@@ -1744,8 +1737,6 @@ def deparse_code(version, co, out=StringIO(), showasm=False, showast=False,
     # store final output stream for case of error
     scanner = get_scanner(version, is_pypy=is_pypy)
 
-    tokens, customize = scanner.ingest(co)
-
     tokens, customize = scanner.ingest(co)
     maybe_show_asm(showasm, tokens)
 
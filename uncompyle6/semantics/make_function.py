@@ -4,7 +4,6 @@
 All the crazy things we have to do to handle Python functions
 """
 from xdis.code import iscode
-from uncompyle6.scanner import Code
 from uncompyle6.parsers.astnode import AST
 from uncompyle6 import PYTHON3
 from uncompyle6.semantics.parser_error import ParserError
@@ -58,6 +57,12 @@ def code_has_star_star_arg(code):
 
 # FIXME: DRY the below code...
 
+def build_body_ast(self, code, isLambda):
+    return self.build_ast(code._tokens,
+                          code._customize,
+                          isLambda = isLambda,
+                          noneInNames = ('None' in code.co_names))
+
 def make_function3_annotate(self, node, isLambda, nested=1,
                             codeNode=None, annotate_last=-1):
     """
@@ -128,7 +133,7 @@ def make_function3_annotate(self, node, isLambda, nested=1,
         code = codeNode.attr
 
     assert iscode(code)
-    code = Code(code, self.scanner, self.currentclass)
+    code = self.ingest_code(code)
 
     # add defaults values to parameter names
     argc = code.co_argcount
@@ -344,7 +349,7 @@ def make_function2(self, node, isLambda, nested=1, codeNode=None):
         code = codeNode.attr
 
     assert iscode(code)
-    code = Code(code, self.scanner, self.currentclass)
+    code = self.ingest_code(code)
 
     # add defaults values to parameter names
     argc = code.co_argcount
@@ -353,15 +358,21 @@ def make_function2(self, node, isLambda, nested=1, codeNode=None):
     # defaults are for last n parameters, thus reverse
     paramnames.reverse(); defparams.reverse()
 
-    try:
-        ast = self.build_ast(code._tokens,
-                             code._customize,
-                             isLambda = isLambda,
-                             noneInNames = ('None' in code.co_names))
-    except ParserError as p:
-        self.write(str(p))
-        self.ERROR = p
-        return
+    # A body generated before can be written out without parsing it
+    # again, unless the parameters need the parse tree.
+    cached = None
+    if not isLambda:
+        cached = self.cached_body(code, 'def')
+    if (cached is not None and cached[1] is not None
+        and not any(name.startswith('.') for name in paramnames)):
+        ast = None
+    else:
+        try:
+            ast = build_body_ast(self, code, isLambda)
+        except ParserError as p:
+            self.write(str(p))
+            self.ERROR = p
+            return
 
     kw_pairs = args_node.attr[1] if self.version >= 3.0 else 0
     indent = self.indent
@@ -409,21 +420,33 @@ def make_function2(self, node, isLambda, nested=1, codeNode=None):
     else:
         self.println("):")
 
-    if len(code.co_consts) > 0 and code.co_consts[0] is not None and not isLambda: # ugly
-        # docstring exists, dump it
-        print_docstring(self, indent, code.co_consts[0])
-
-    code._tokens = None # save memory
-    assert ast == 'stmts'
-
-    all_globals = find_all_globals(ast, set())
-    for g in ((all_globals & self.mod_globs) | find_globals(ast, set())):
-        self.println(self.indent, 'global ', g)
-    self.mod_globs -= all_globals
-    has_none = 'None' in code.co_names
-    rn = has_none and not find_none(ast)
-    self.gen_source(ast, code.co_name, code._customize, isLambda=isLambda,
-                    returnNone=rn)
+    if self.replay_body(cached, code):
+        code._tokens = None; code._customize = None # save memory
+        return
+    if ast is None:
+        try:
+            ast = build_body_ast(self, code, isLambda)
+        except ParserError as p:
+            self.write(str(p))
+            self.ERROR = p
+            return
+
+    with self.record_body(cached, code):
+        if len(code.co_consts) > 0 and code.co_consts[0] is not None and not isLambda: # ugly
+            # docstring exists, dump it
+            print_docstring(self, indent, code.co_consts[0])
+
+        code._tokens = None # save memory
+        assert ast == 'stmts'
+
+        all_globals = find_all_globals(ast, set())
+        for g in ((all_globals & self.mod_globs) | find_globals(ast, set())):
+            self.println(self.indent, 'global ', g)
+        self.mod_globs -= all_globals
+        has_none = 'None' in code.co_names
+        rn = has_none and not find_none(ast)
+        self.gen_source(ast, code.co_name, code._customize, isLambda=isLambda,
+                        returnNone=rn)
     code._tokens = None; code._customize = None # save memory
 
 
@@ -479,7 +502,7 @@ def make_function3(self, node, isLambda, nested=1, codeNode=None):
         code = codeNode.attr
 
     assert iscode(code)
-    code = Code(code, self.scanner, self.currentclass)
+    code = self.ingest_code(code)
 
     # add defaults values to parameter names
     argc = code.co_argcount
@@ -489,15 +512,21 @@ def make_function3(self, node, isLambda, nested=1, codeNode=None):
     if not 3.0 <= self.version <= 3.2:
         paramnames.reverse(); defparams.reverse()
 
-    try:
-        ast = self.build_ast(code._tokens,
-                             code._customize,
-                             isLambda = isLambda,
-                             noneInNames = ('None' in code.co_names))
-    except ParserError as p:
-        self.write(str(p))
-        self.ERROR = p
-        return
+    # A body generated before can be written out without parsing it
+    # again, unless the parameters need the parse tree.
+    cached = None
+    if not isLambda:
+        cached = self.cached_body(code, 'def')
+    if (cached is not None and cached[1] is not None
+        and not any(name.startswith('.') for name in paramnames)):
+        ast = None
+    else:
+        try:
+            ast = build_body_ast(self, code, isLambda)
+        except ParserError as p:
+            self.write(str(p))
+            self.ERROR = p
+            return
 
     kw_pairs = args_node.attr[1] if self.version >= 3.0 else 0
     indent = self.indent
@@ -598,19 +627,31 @@ def make_function3(self, node, isLambda, nested=1, codeNode=None):
     else:
         self.println("):")
 
-    if len(code.co_consts) > 0 and code.co_consts[0] is not None and not isLambda: # ugly
-        # docstring exists, dump it
-        print_docstring(self, self.indent, code.co_consts[0])
-
-    code._tokens = None # save memory
-    assert ast == 'stmts'
-
-    all_globals = find_all_globals(ast, set())
-    for g in ((all_globals & self.mod_globs) | find_globals(ast, set())):
-        self.println(self.indent, 'global ', g)
-    self.mod_globs -= all_globals
-    has_none = 'None' in code.co_names
-    rn = has_none and not find_none(ast)
-    self.gen_source(ast, code.co_name, code._customize, isLambda=isLambda,
-                    returnNone=rn)
+    if self.replay_body(cached, code):
+        code._tokens = None; code._customize = None # save memory
+        return
+    if ast is None:
+        try:
+            ast = build_body_ast(self, code, isLambda)
+        except ParserError as p:
+            self.write(str(p))
+            self.ERROR = p
+            return
+
+    with self.record_body(cached, code):
+        if len(code.co_consts) > 0 and code.co_consts[0] is not None and not isLambda: # ugly
+            # docstring exists, dump it
+            print_docstring(self, self.indent, code.co_consts[0])
+
+        code._tokens = None # save memory
+        assert ast == 'stmts'
+
+        all_globals = find_all_globals(ast, set())
+        for g in ((all_globals & self.mod_globs) | find_globals(ast, set())):
+            self.println(self.indent, 'global ', g)
+        self.mod_globs -= all_globals
+        has_none = 'None' in code.co_names
+        rn = has_none and not find_none(ast)
+        self.gen_source(ast, code.co_name, code._customize, isLambda=isLambda,
+                        returnNone=rn)
     code._tokens = None; code._customize = None # save memory
@@ -85,13 +85,14 @@ from uncompyle6.semantics.make_function import (
 from uncompyle6.semantics.parser_error import ParserError
 from uncompyle6.semantics.check_ast import checker
 from uncompyle6.semantics.helper import print_docstring
+from uncompyle6.stats import code_scope, count_nodes, maybe_code, maybe_phase
 from uncompyle6.scanners.tok import Token
 
 from uncompyle6.semantics.consts import (
     LINE_LENGTH, RETURN_LOCALS, NONE, RETURN_NONE, PASS,
     ASSIGN_DOC_STRING, NAME_MODULE, TAB,
     INDENT_PER_LEVEL, TABLE_R, TABLE_DIRECT, MAP_DIRECT,
-    MAP, PRECEDENCE, ASSIGN_TUPLE_PARAM, escape, maxint, minint)
+    MAP, PRECEDENCE, ASSIGN_TUPLE_PARAM, compile_format, maxint, minint)
 
 
 from uncompyle6.show import (
@@ -110,6 +111,148 @@ def is_docstring(node):
     except:
         return False
 
+class StreamingOutput(object):
+    """A file-like object standing in for SourceWalker.f that passes the
+    text written to it on to *out* each time flush() is called.
+
+    Text reaches *out* as SourceWalker.write() would have written it had
+    it all come in one piece: leading newlines are merged with
+    *pending_newlines*, and trailing ones are held back for finish() to
+    return as the new pending newline count.
+
+    getvalue() returns just the last line of the text already passed on
+    followed by the text written since, which is all SourceWalker looks
+    at.
+    """
+    def __init__(self, out, pending_newlines=0):
+        self.out = out
+        self.pending_newlines = pending_newlines
+        self.held_newlines = 0
+        self.started = False
+        self.buffer = StringIO()
+        self.tail = ''
+
+    def write(self, data):
+        self.buffer.write(data)
+
+    def getvalue(self):
+        return self.tail + self.buffer.getvalue()
+
+    def flush(self):
+        text = self.buffer.getvalue()
+        if not text:
+            return
+        self.buffer = StringIO()
+        i = text.rfind('\n')
+        if i >= 0:
+            self.tail = text[i+1:]
+        else:
+            self.tail += text
+
+        out = text.rstrip('\n')
+        trailing = len(text) - len(out)
+        if self.started:
+            self.out.write('\n' * self.held_newlines)
+        else:
+            stripped = out.lstrip('\n')
+            if not stripped:
+                self.held_newlines += len(text)
+                return
+            self.held_newlines += len(out) - len(stripped)
+            self.out.write('\n' * max(self.pending_newlines,
+                                      self.held_newlines))
+            self.started = True
+            out = stripped
+        self.out.write(out)
+        self.held_newlines = trailing
+
+    def finish(self):
+        """Pass on any remaining text and return the number of newlines
+        left pending."""
+        self.flush()
+        if self.started:
+            return self.held_newlines
+        return max(self.pending_newlines, self.held_newlines)
+
+def find_code(co, target):
+    """Return the indices leading from code object *co* through its
+    constants to code object *target*, or None if it isn't there."""
+    if co is target:
+        return []
+    for i, const in enumerate(co.co_consts):
+        if iscode(const):
+            path = find_code(const, target)
+            if path is not None:
+                return [i] + path
+    return None
+
+class BodyRecorder(object):
+    """Context manager around the generation of the body of a function
+    or class, which stores what it wrote and did in the walker's
+    function_cache so that SourceWalker.replay_body() can do the same
+    next time. *cached* is what SourceWalker.cached_body() returned;
+    if it is None, nothing is recorded.
+
+    Nothing is stored if an error comes up in the body.
+    """
+    def __init__(self, walker, co, cached):
+        self.walker = walker
+        self.co = co
+        self.cached = cached
+
+    def __enter__(self):
+        if self.cached is None:
+            return self
+        walker = self.walker
+        self.state = walker.body_state(self.co)
+        self.errors = (walker.ERROR, len(walker.ast_errors))
+        self.mod_globs = set(walker.mod_globs)
+        self.ingested = walker.last_ingested
+        self.customized = []
+        # What the body writes is collected here and then passed on
+        self.params = walker.params
+        self.out = self.params['f']
+        self.buffer = self.params['f'] = StringIO()
+        walker.recorders.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.cached is None:
+            return False
+        walker = self.walker
+        walker.recorders.pop()
+        self.params['f'] = self.out
+        source = self.buffer.getvalue()
+        self.out.write(source)
+        if (exc_type is not None
+            or (walker.ERROR, len(walker.ast_errors)) != self.errors):
+            return False
+
+        # The scanner is left as the last code object ingested had it,
+        # and that has to be the same after a replay.
+        if walker.last_ingested is self.ingested:
+            ingested = None
+        else:
+            co, classname = walker.last_ingested
+            path = find_code(self.co, co)
+            if path is None:
+                return False
+            ingested = (path, classname)
+
+        key, states = self.cached
+        states = dict(states or {})
+        states[self.state] = {
+            'source': source,
+            'pending_newlines': walker.pending_newlines,
+            'prec': walker.prec,
+            'line_number': walker.line_number - self.co.co_firstlineno,
+            'mod_globs': sorted(self.mod_globs - walker.mod_globs),
+            'customize': self.customized,
+            'ingested': ingested,
+            }
+        walker.function_cache.put(key, states)
+        return False
+
 class SourceWalkerError(Exception):
     def __init__(self, errmsg):
         self.errmsg = errmsg
@@ -123,9 +266,17 @@ class SourceWalker(GenericASTTraversal, object):
     def __init__(self, version, out, scanner, showast=False,
                  debug_parser=PARSER_DEFAULT_DEBUG,
                  compile_mode='exec', is_pypy=False,
-                 linestarts={}):
+                 linestarts={}, stats=None, stream=False,
+                 function_cache=None):
         GenericASTTraversal.__init__(self, ast=None)
         self.scanner = scanner
+        # (code object, class name) last ingested
+        self.last_ingested = None
+        # An uncompyle6.cache.ResultCache of function and class bodies,
+        # or None; see cached_body()
+        self.function_cache = function_cache
+        # BodyRecorders of the bodies being generated, innermost last
+        self.recorders = []
         params = {
             'f': out,
             'indent': '',
@@ -147,6 +298,10 @@ class SourceWalker(GenericASTTraversal, object):
         self.linestarts = linestarts
         self.line_number = 0
         self.ast_errors = []
+        # An uncompyle6.stats.DecompileStats, or None
+        self.stats = stats
+        # Write out each top-level statement as soon as it is generated?
+        self.stream = stream
 
         # hide_internal suppresses displaying the additional instructions that sometimes
         # exist in code but but were not written in the source code.
@@ -312,8 +467,10 @@ class SourceWalker(GenericASTTraversal, object):
                         break
 
                 # FIXME: handle and pass full annotate args
-                make_function3_annotate(self, node, isLambda=False,
-                                        codeNode=code, annotate_last=annotate_last)
+                with maybe_code(self.stats, 'function'):
+                    make_function3_annotate(self, node, isLambda=False,
+                                            codeNode=code,
+                                            annotate_last=annotate_last)
 
                 if len(self.param_stack) > 1:
                     self.write('\n\n')
@@ -467,36 +624,66 @@ class SourceWalker(GenericASTTraversal, object):
         self.pending_newlines = p
         return result
 
+    def stream_source(self, ast):
+        """Like self.println(self.traverse(ast)), but passes each
+        top-level statement in *ast* on to the output as soon as it has
+        been generated, rather than the whole module at the end. The
+        text isn't kept in self.text.
+        """
+        self.param_stack.append(self.params)
+        out = StreamingOutput(self.f, self.pending_newlines)
+        self.pending_newlines = 0
+        self.params = {
+            '_globals': {},
+            'f': out,
+            'indent': self.indent,
+            'isLambda': False,
+            }
+        name = 'n_' + self.typestring(ast)
+        if (hasattr(self, name) or hasattr(self, name + '_exit')
+            or ast.type in self._get_mapping(ast)[0]):
+            self.preorder(ast)
+        else:
+            # What preorder() would do, a statement at a time
+            for node in ast:
+                self.preorder(node)
+                out.flush()
+            self.set_pos_info(ast)
+        out.write('\n'*self.pending_newlines)
+        self.params = self.param_stack.pop()
+        self.pending_newlines = max(out.finish(), 1)
+
     def write(self, *data):
-        if (len(data) == 0) or (len(data) == 1 and data[0] == ''):
+        if len(data) == 1:
+            out = data[0]
+            if out == '':
+                return
+            if type(out) is not str:
+                out = str(out)
+        elif not data:
             return
-        out = ''.join((str(j) for j in data))
-        n = 0
-        for i in out:
-            if i == '\n':
-                n += 1
-                if n == len(out):
-                    self.pending_newlines = max(self.pending_newlines, n)
-                    return
-            elif n:
-                self.pending_newlines = max(self.pending_newlines, n)
-                out = out[n:]
-                break
-            else:
-                break
+        else:
+            out = ''.join([str(j) for j in data])
+
+        # Leading and trailing newlines aren't written right away but
+        # are kept pending, so that runs of them can be merged.
+        if out[:1] == '\n':
+            stripped = out.lstrip('\n')
+            n = len(out) - len(stripped)
+            if n > self.pending_newlines:
+                self.pending_newlines = n
+            if not stripped:
+                return
+            out = stripped
 
         if self.pending_newlines > 0:
             self.f.write('\n'*self.pending_newlines)
             self.pending_newlines = 0
 
-        for i in out[::-1]:
-            if i == '\n':
-                self.pending_newlines += 1
-            else:
-                break
-
-        if self.pending_newlines:
-            out = out[:-self.pending_newlines]
+        if out[-1:] == '\n':
+            stripped = out.rstrip('\n')
+            self.pending_newlines = len(out) - len(stripped)
+            out = stripped
         self.f.write(out)
 
     def println(self, *data):
@@ -895,10 +1082,11 @@ class SourceWalker(GenericASTTraversal, object):
 
     def make_function(self, node, isLambda, nested=1,
                       codeNode=None, annotate=None):
-        if self.version >= 3.0:
-            make_function3(self, node, isLambda, nested, codeNode)
-        else:
-            make_function2(self, node, isLambda, nested, codeNode)
+        with maybe_code(self.stats, 'lambda' if isLambda else 'function'):
+            if self.version >= 3.0:
+                make_function3(self, node, isLambda, nested, codeNode)
+            else:
+                make_function2(self, node, isLambda, nested, codeNode)
 
     def n_mklambda(self, node):
         self.make_function(node, isLambda=True, codeNode=node[-2])
@@ -998,6 +1186,7 @@ class SourceWalker(GenericASTTraversal, object):
         self.prec = p
         self.prune() # stop recursing
 
+    @code_scope('comprehension')
     def comprehension_walk(self, node, iter_index, code_index=-5):
         p = self.prec
         self.prec = 27
@@ -1032,7 +1221,7 @@ class SourceWalker(GenericASTTraversal, object):
 
         assert iscode(cn.attr)
 
-        code = Code(cn.attr, self.scanner, self.currentclass)
+        code = self.ingest_code(cn.attr)
         ast = self.build_ast(code._tokens, code._customize)
         self.customize(code._customize)
         ast = ast[0][0][0]
@@ -1083,6 +1272,7 @@ class SourceWalker(GenericASTTraversal, object):
         self.write('}')
         self.prune()
 
+    @code_scope('comprehension')
     def comprehension_walk3(self, node, iter_index, code_index=-5):
         """
         List comprehensions the way they are done in Python3.
@@ -1094,7 +1284,7 @@ class SourceWalker(GenericASTTraversal, object):
         code = node[code_index].attr
 
         assert iscode(code), node[code_index]
-        code = Code(code, self.scanner, self.currentclass)
+        code = self.ingest_code(code)
 
         ast = self.build_ast(code._tokens, code._customize)
         self.customize(code._customize)
@@ -1164,6 +1354,7 @@ class SourceWalker(GenericASTTraversal, object):
             self.preorder(if_node)
         self.prec = p
 
+    @code_scope('comprehension')
     def listcomprehension_walk2(self, node):
         """List comprehensions the way they are done in Python 2.
         They're more other comprehensions, e.g. set comprehensions
@@ -1172,7 +1363,7 @@ class SourceWalker(GenericASTTraversal, object):
         p = self.prec
         self.prec = 27
 
-        code = Code(node[1].attr, self.scanner, self.currentclass)
+        code = self.ingest_code(node[1].attr)
         ast = self.build_ast(code._tokens, code._customize)
         self.customize(code._customize)
         if node == 'setcomp':
@@ -1223,6 +1414,7 @@ class SourceWalker(GenericASTTraversal, object):
 
     n_dictcomp = n_setcomp
 
+    @code_scope('comprehension')
     def setcomprehension_walk3(self, node, collection_index):
         """List comprehensions the way they are done in Python3.
         They're more other comprehensions, e.g. set comprehensions
@@ -1231,7 +1423,7 @@ class SourceWalker(GenericASTTraversal, object):
         p = self.prec
         self.prec = 27
 
-        code = Code(node[1].attr, self.scanner, self.currentclass)
+        code = self.ingest_code(node[1].attr)
         ast = self.build_ast(code._tokens, code._customize)
         self.customize(code._customize)
         ast = ast[0][0][0]
@@ -1678,20 +1870,16 @@ class SourceWalker(GenericASTTraversal, object):
         %c, %C, and so on.
         """
         # self.println("----> ", startnode.type, ', ', entry[0])
-        fmt = entry[0]
+        ops, tail = compile_format(entry[0])
         arg = 1
-        i = 0
 
-        m = escape.search(fmt)
-        while m:
-            i = m.end()
-            self.write(m.group('prefix'))
+        for prefix, child, typ, getter in ops:
+            self.write(prefix)
 
-            typ = m.group('type') or '{'
             node = startnode
             try:
-                if m.group('child'):
-                    node = node[int(m.group('child'))]
+                if child is not None:
+                    node = node[child]
             except:
                 print(node.__dict__)
                 raise
@@ -1764,15 +1952,12 @@ class SourceWalker(GenericASTTraversal, object):
                 self.prec = p
                 arg += 1
             elif typ == '{':
-                d = node.__dict__
-                expr = m.group('expr')
                 try:
-                    self.write(eval(expr, d, d))
+                    self.write(getter(node))
                 except:
                     print(node)
                     raise
-            m = escape.search(fmt, i)
-        self.write(fmt[i:])
+        self.write(tail)
 
     def default(self, node):
         mapping = self._get_mapping(node)
@@ -1792,6 +1977,12 @@ class SourceWalker(GenericASTTraversal, object):
         Special handling for opcodes, such as those that take a variable number
         of arguments -- we add a new entry for each in TABLE_R.
         """
+        if self.recorders:
+            # Code objects can't be stored, and aren't used below
+            customize = dict((k, v) for k, v in customize.items()
+                             if not iscode(v))
+            for recorder in self.recorders:
+                recorder.customized.append(customize)
         for k, v in list(customize.items()):
             if k in TABLE_R:
                 continue
@@ -1880,98 +2071,166 @@ class SourceWalker(GenericASTTraversal, object):
             # return self.traverse(node[1])
         raise Exception("Can't find tuple parameter " + name)
 
+    @code_scope('class')
     def build_class(self, code):
         """Dump class definition, doc string and class body."""
 
         assert iscode(code)
         self.classes.append(self.currentclass)
-        code = Code(code, self.scanner, self.currentclass)
+        code = self.ingest_code(code)
+        cached = self.cached_body(code, 'class')
+        if self.replay_body(cached, code):
+            code._tokens = None; code._customize = None # save memory
+            self.classes.pop(-1)
+            return
 
-        indent = self.indent
-        # self.println(indent, '#flags:\t', int(code.co_flags))
-        ast = self.build_ast(code._tokens, code._customize)
-        code._tokens = None # save memory
-        assert ast == 'stmts'
+        with self.record_body(cached, code):
+            indent = self.indent
+            # self.println(indent, '#flags:\t', int(code.co_flags))
+            ast = self.build_ast(code._tokens, code._customize)
+            code._tokens = None # save memory
+            assert ast == 'stmts'
+
+            first_stmt = ast[0][0]
+            if 3.0 <= self.version <= 3.3:
+                try:
+                    if first_stmt[0] == 'store_locals':
+                        if self.hide_internal:
+                            del ast[0]
+                            first_stmt = ast[0][0]
+                except:
+                    pass
 
-        first_stmt = ast[0][0]
-        if 3.0 <= self.version <= 3.3:
             try:
-                if first_stmt[0] == 'store_locals':
+                if first_stmt == NAME_MODULE:
                     if self.hide_internal:
                         del ast[0]
                         first_stmt = ast[0][0]
-            except:
                 pass
-
-        try:
-            if first_stmt == NAME_MODULE:
-                if self.hide_internal:
-                    del ast[0]
-                    first_stmt = ast[0][0]
-            pass
-        except:
-            pass
-
-        have_qualname = False
-        if self.version < 3.0:
-            # Should we ditch this in favor of the "else" case?
-            qualname = '.'.join(self.classes)
-            QUAL_NAME = AST('stmt',
-                            [ AST('assign',
-                                  [ AST('expr', [Token('LOAD_CONST', pattr=qualname)]),
-                                    AST('designator', [ Token('STORE_NAME', pattr='__qualname__')])
-                                  ])])
-            have_qualname = (ast[0][0] == QUAL_NAME)
-        else:
-            # Python 3.4+ has constants like 'cmp_to_key.<locals>.K'
-            # which are not simple classes like the < 3 case.
-            try:
-                if (first_stmt[0] == 'assign' and
-                    first_stmt[0][0][0] == 'LOAD_CONST' and
-                    first_stmt[0][1] == 'designator' and
-                    first_stmt[0][1][0] == Token('STORE_NAME', pattr='__qualname__')):
-                    have_qualname = True
             except:
                 pass
 
-        if have_qualname:
-            if self.hide_internal: del ast[0]
-            pass
-
-        # if docstring exists, dump it
-        if (code.co_consts and code.co_consts[0] is not None and len(ast) > 0):
-            do_doc = False
-            if is_docstring(ast[0]):
-                i = 0
-                do_doc = True
-            elif (len(ast) > 1 and is_docstring(ast[1])):
-                i = 1
-                do_doc = True
-            if do_doc and self.hide_internal:
+            have_qualname = False
+            if self.version < 3.0:
+                # Should we ditch this in favor of the "else" case?
+                qualname = '.'.join(self.classes)
+                QUAL_NAME = AST('stmt',
+                                [ AST('assign',
+                                      [ AST('expr', [Token('LOAD_CONST', pattr=qualname)]),
+                                        AST('designator', [ Token('STORE_NAME', pattr='__qualname__')])
+                                      ])])
+                have_qualname = (ast[0][0] == QUAL_NAME)
+            else:
+                # Python 3.4+ has constants like 'cmp_to_key.<locals>.K'
+                # which are not simple classes like the < 3 case.
                 try:
-                    docstring = ast[i][0][0][0][0].pattr
+                    if (first_stmt[0] == 'assign' and
+                        first_stmt[0][0][0] == 'LOAD_CONST' and
+                        first_stmt[0][1] == 'designator' and
+                        first_stmt[0][1][0] == Token('STORE_NAME', pattr='__qualname__')):
+                        have_qualname = True
                 except:
-                    docstring = code.co_consts[0]
-                if print_docstring(self, indent, docstring):
-                    self.println()
-                    del ast[i]
-
-        # the function defining a class normally returns locals(); we
-        # don't want this to show up in the source, thus remove the node
-        if len(ast) > 0 and ast[-1][0] == RETURN_LOCALS:
-            if self.hide_internal: del ast[-1] # remove last node
-        # else:
-        #    print ast[-1][-1]
+                    pass
 
-        for g in find_globals(ast, set()):
-            self.println(indent, 'global ', g)
+            if have_qualname:
+                if self.hide_internal: del ast[0]
+                pass
 
-        old_name = self.name
-        self.gen_source(ast, code.co_name, code._customize)
-        self.name = old_name
-        code._tokens = None; code._customize = None # save memory
+            # if docstring exists, dump it
+            if (code.co_consts and code.co_consts[0] is not None and len(ast) > 0):
+                do_doc = False
+                if is_docstring(ast[0]):
+                    i = 0
+                    do_doc = True
+                elif (len(ast) > 1 and is_docstring(ast[1])):
+                    i = 1
+                    do_doc = True
+                if do_doc and self.hide_internal:
+                    try:
+                        docstring = ast[i][0][0][0][0].pattr
+                    except:
+                        docstring = code.co_consts[0]
+                    if print_docstring(self, indent, docstring):
+                        self.println()
+                        del ast[i]
+
+            # the function defining a class normally returns locals(); we
+            # don't want this to show up in the source, thus remove the node
+            if len(ast) > 0 and ast[-1][0] == RETURN_LOCALS:
+                if self.hide_internal: del ast[-1] # remove last node
+            # else:
+            #    print ast[-1][-1]
+
+            for g in find_globals(ast, set()):
+                self.println(indent, 'global ', g)
+
+            old_name = self.name
+            self.gen_source(ast, code.co_name, code._customize)
+            self.name = old_name
+            code._tokens = None; code._customize = None # save memory
         self.classes.pop(-1)
 
+    def ingest_code(self, co):
+        """Disassemble nested code object *co* into a Code object."""
+        with maybe_phase(self.stats, 'ingest'):
+            code = Code(co, self.scanner, self.currentclass)
+        self.last_ingested = (co, self.currentclass)
+        if self.stats is not None:
+            self.stats.update(name=co.co_name, tokens=len(code._tokens))
+        return code
+
+    def cached_body(self, co, kind):
+        """Look up the bodies generated in earlier runs for *co*, the
+        code of a 'def' or 'class' (*kind*), in self.function_cache.
+
+        Returns None if there is no cache, and otherwise (key, states),
+        where states is None if *co* hasn't been seen before, or a dict
+        from body_state() to what generating the body did in that
+        state. *co* is known to parse if states isn't None.
+        """
+        if self.function_cache is None:
+            return None
+        key = self.function_cache.code_key(co, (kind, self.version,
+                                                self.is_pypy,
+                                                self.hide_internal))
+        return key, self.function_cache.get(key)
+
+    def body_state(self, co):
+        """The walker state that the body of *co* is generated from"""
+        return (self.indent, self.pending_newlines, self.prec,
+                self.line_number - co.co_firstlineno,
+                self.currentclass, tuple(self.classes),
+                tuple(sorted(self.mod_globs)))
+
+    def record_body(self, cached, co):
+        return BodyRecorder(self, co, cached)
+
+    def replay_body(self, cached, co):
+        """Write out the body of *co* as it was generated in an earlier
+        run from the current state, if it was. *cached* is what
+        cached_body() returned. Returns True if the body was written."""
+        if cached is None or cached[1] is None:
+            return False
+        entry = cached[1].get(self.body_state(co))
+        if entry is None:
+            return False
+        for customize in entry['customize']:
+            self.customize(customize)
+        if entry['ingested'] is not None:
+            path, classname = entry['ingested']
+            nested = co
+            for i in path:
+                nested = nested.co_consts[i]
+            with maybe_phase(self.stats, 'ingest'):
+                self.scanner.ingest(nested, classname)
+            self.last_ingested = (nested, classname)
+        self.f.write(entry['source'])
+        self.pending_newlines = entry['pending_newlines']
+        self.prec = entry['prec']
+        self.line_number = co.co_firstlineno + entry['line_number']
+        self.mod_globs -= set(entry['mod_globs'])
+        return True
+
     def gen_source(self, ast, name, customize, isLambda=False, returnNone=False):
         """convert AST to Python source code"""
 
@@ -1979,19 +2238,31 @@ class SourceWalker(GenericASTTraversal, object):
         self.return_none = returnNone
         old_name = self.name
         self.name = name
-        # if code would be empty, append 'pass'
-        if len(ast) == 0:
-            self.println(self.indent, 'pass')
-        else:
-            self.customize(customize)
-            if isLambda:
-                self.write(self.traverse(ast, isLambda=isLambda))
+        with maybe_phase(self.stats, 'gen_source'):
+            # if code would be empty, append 'pass'
+            if len(ast) == 0:
+                self.println(self.indent, 'pass')
             else:
-                self.text = self.traverse(ast, isLambda=isLambda)
-                self.println(self.text)
+                self.customize(customize)
+                if isLambda:
+                    self.write(self.traverse(ast, isLambda=isLambda))
+                elif self.stream and not self.param_stack:
+                    self.stream_source(ast)
+                else:
+                    self.text = self.traverse(ast, isLambda=isLambda)
+                    self.println(self.text)
         self.name = old_name
         self.return_none = rn
 
+    def parse_tokens(self, tokens, customize):
+        """Parse *tokens*, timing it when there are stats"""
+        if self.stats is None:
+            return python_parser.parse(self.p, tokens, customize)
+        with self.stats.phase('parse'):
+            ast = python_parser.parse(self.p, tokens, customize)
+        self.stats.update(parse_items=self.p.item_count)
+        return ast
+
     def build_ast(self, tokens, customize, isLambda=False,
                   noneInNames=False, isTopLevel=False):
 
@@ -2000,7 +2271,7 @@ class SourceWalker(GenericASTTraversal, object):
         if isLambda:
             tokens.append(Token('LAMBDA_MARKER'))
             try:
-                ast = python_parser.parse(self.p, tokens, customize)
+                ast = self.parse_tokens(tokens, customize)
             except (python_parser.ParserError, AssertionError) as e:
                 raise ParserError(e, tokens)
             maybe_show_ast(self.showast, ast)
@@ -2027,13 +2298,16 @@ class SourceWalker(GenericASTTraversal, object):
 
         # Build AST from disassembly.
         try:
-            ast = python_parser.parse(self.p, tokens, customize)
+            ast = self.parse_tokens(tokens, customize)
         except (python_parser.ParserError, AssertionError) as e:
             raise ParserError(e, tokens)
 
         maybe_show_ast(self.showast, ast)
 
-        checker(ast, False, self.ast_errors)
+        with maybe_phase(self.stats, 'checker'):
+            checker(ast, False, self.ast_errors)
+        if self.stats is not None:
+            self.stats.update(ast_nodes=count_nodes(ast))
 
         return ast
 
@@ -2043,16 +2317,41 @@ class SourceWalker(GenericASTTraversal, object):
 
 
 def deparse_code(version, co, out=sys.stdout, showasm=None, showast=False,
-                 showgrammar=False, code_objects={}, compile_mode='exec', is_pypy=False):
+                 showgrammar=False, code_objects={}, compile_mode='exec',
+                 is_pypy=False, stats=None, stream=False, function_cache=None):
     """
     ingests and deparses a given code block 'co'
+
+    If *stats* is an uncompyle6.stats.DecompileStats, the time spent in
+    each phase is recorded there.
+
+    If *stream* is True, each top-level statement is written to *out* as
+    soon as it has been generated, so the whole module is never held in
+    memory as text; the output is the same, unless deparsing fails part
+    way through.
+
+    If *function_cache* is an uncompyle6.cache.ResultCache, the bodies
+    of functions and classes generated in earlier runs are taken from
+    it rather than parsed again, and new ones are stored there.
     """
 
     assert iscode(co)
+    with maybe_code(stats, 'code', co.co_name):
+        return _deparse_code(version, co, out, showasm, showast, showgrammar,
+                             code_objects, compile_mode, is_pypy, stats,
+                             stream, function_cache)
+
+def _deparse_code(version, co, out, showasm, showast, showgrammar,
+                  code_objects, compile_mode, is_pypy, stats, stream,
+                  function_cache):
     # store final output stream for case of error
     scanner = get_scanner(version, is_pypy=is_pypy)
 
-    tokens, customize = scanner.ingest(co, code_objects=code_objects, show_asm=showasm)
+    with maybe_phase(stats, 'ingest'):
+        tokens, customize = scanner.ingest(co, code_objects=code_objects,
+                                           show_asm=showasm)
+    if stats is not None:
+        stats.update(tokens=len(tokens))
 
     debug_parser = dict(PARSER_DEFAULT_DEBUG)
     if showgrammar:
@@ -2064,7 +2363,8 @@ def deparse_code(version, co, out=sys.stdout, showasm=None, showast=False,
     deparsed = SourceWalker(version, out, scanner, showast=showast,
                             debug_parser=debug_parser, compile_mode=compile_mode,
                             is_pypy=is_pypy,
-                            linestarts=linestarts)
+                            linestarts=linestarts, stats=stats,
+                            stream=stream, function_cache=function_cache)
 
     isTopLevel = co.co_name == '<module>'
     deparsed.ast = deparsed.build_ast(tokens, customize, isTopLevel=isTopLevel)
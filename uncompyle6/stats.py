@@ -0,0 +1,245 @@
+#  Copyright (c) 2017 by Rocky Bernstein
+"""
+Optional instrumentation of decompilation.
+
+Pass a DecompileStats object as the *stats* parameter of
+uncompyle6.main.main(), decompile_file(), decompile() or
+uncompyle6.semantics.pysource.deparse_code() and it records, for each
+file and each code object in it, how long each phase took:
+
+  load        reading and unmarshalling the bytecode file
+  ingest      disassembling a code object into tokens
+  parse       parsing the tokens into an AST
+  checker     checking the AST for grammar-rule errors
+  gen_source  turning the AST into source text
+
+along with the number of tokens, Earley items and AST nodes and, as
+'max_rss_growth', how much the peak resident set size of the process
+went up during each phase, in getrusage()'s units (kilobytes on Linux).
+A phase that only reuses memory freed earlier shows no growth.
+
+Code objects for functions, lambdas, classes and comprehensions are
+recorded as children of the code object they are defined in. Their
+work mostly happens while the parent generates source, so a phase has
+both 'seconds', which includes the time spent on nested code objects,
+and 'self_seconds', which doesn't. Likewise max_rss_growth includes
+the growth while nested code objects were worked on, and
+'self_max_rss_growth' doesn't.
+
+Example:
+
+    from uncompyle6.stats import DecompileStats
+    stats = DecompileStats()
+    main(in_base, out_base, files, [], stats=stats)
+    print(stats.totals())
+"""
+
+import time
+
+from spark_parser.ast import AST
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PHASES = ('load', 'ingest', 'parse', 'checker', 'gen_source')
+
+
+def max_rss():
+    """Return the peak resident set size of this process so far, as
+    reported by getrusage(), or None if that isn't available."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class CodeStats(object):
+    """Measurements for one file or code object."""
+    def __init__(self, kind, name=None):
+        self.kind = kind
+        self.name = name
+        self.seconds = 0.0
+        self.phases = {}
+        self.tokens = None
+        self.parse_items = None
+        self.ast_nodes = None
+        self.children = []
+        # Time taken by nested code objects in the phase in progress
+        self.nested_seconds = 0.0
+        # Peak RSS growth while they were worked on
+        self.nested_rss_growth = 0
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'name': self.name,
+            'seconds': self.seconds,
+            'phases': self.phases,
+            'tokens': self.tokens,
+            'parse_items': self.parse_items,
+            'ast_nodes': self.ast_nodes,
+            'children': [child.as_dict() for child in self.children],
+            }
+
+
+class _Timer(object):
+    """Context manager calling *start()* on entry and *done(seconds)*
+    on exit."""
+    def __init__(self, done, start=None):
+        self.done = done
+        self.on_start = start
+
+    def __enter__(self):
+        if self.on_start:
+            self.on_start()
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.done(time.time() - self.start)
+        return False
+
+
+class _NoTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NO_TIMER = _NoTimer()
+
+
+class DecompileStats(object):
+    def __init__(self):
+        # Top-level records, one per file or top-level code object
+        self.records = []
+        self._stack = []
+
+    @property
+    def current(self):
+        return self._stack[-1] if self._stack else None
+
+    def code(self, kind, name=None):
+        """Return a context manager recording a new file or code object
+        nested inside the current one."""
+        record = CodeStats(kind, name)
+        # Peak resident set size when the code object was started on
+        rss_before = []
+
+        def start():
+            rss_before.append(max_rss())
+            if self._stack:
+                self._stack[-1].children.append(record)
+            else:
+                self.records.append(record)
+            self._stack.append(record)
+
+        def done(seconds):
+            record.seconds = seconds
+            self._stack.pop()
+            before, after = rss_before.pop(), max_rss()
+            if self._stack:
+                self._stack[-1].nested_seconds += seconds
+                if after is not None:
+                    self._stack[-1].nested_rss_growth += after - before
+        return _Timer(done, start)
+
+    def phase(self, name):
+        """Return a context manager timing phase *name* of the current
+        code object."""
+        record = self.current
+        if record is None:
+            return NO_TIMER
+
+        # Peak resident set size when the phase started
+        rss_before = []
+
+        def start():
+            record.nested_seconds = 0.0
+            record.nested_rss_growth = 0
+            rss_before.append(max_rss())
+
+        def done(seconds):
+            phase = record.phases.setdefault(name, {'seconds': 0.0,
+                                                    'self_seconds': 0.0})
+            # seconds includes nested code objects; self_seconds doesn't
+            phase['seconds'] += seconds
+            phase['self_seconds'] += seconds - record.nested_seconds
+            before, after = rss_before.pop(), max_rss()
+            if after is not None:
+                growth = after - before
+                phase['max_rss_growth'] = (phase.get('max_rss_growth', 0)
+                                           + growth)
+                phase['self_max_rss_growth'] = (
+                    phase.get('self_max_rss_growth', 0)
+                    + growth - record.nested_rss_growth)
+            record.nested_seconds = 0.0
+            record.nested_rss_growth = 0
+        return _Timer(done, start)
+
+    def update(self, **fields):
+        """Set *fields*, e.g. tokens=..., on the current code object."""
+        record = self.current
+        if record is not None:
+            for field, value in fields.items():
+                setattr(record, field, value)
+
+    def totals(self, field='self_seconds'):
+        """Return a dict mapping each phase to the total seconds spent
+        in it over all records, not counting nested code objects twice.
+        With *field* 'self_max_rss_growth', total the growth in peak
+        RSS instead."""
+        totals = dict((phase, 0.0) for phase in PHASES)
+
+        def add(record):
+            for name, phase in record.phases.items():
+                totals[name] += phase.get(field, 0)
+            for child in record.children:
+                add(child)
+        for record in self.records:
+            add(record)
+        return totals
+
+    def as_dict(self):
+        return {'totals': self.totals(),
+                'records': [record.as_dict() for record in self.records]}
+
+
+def maybe_phase(stats, name):
+    """Like stats.phase(name), but does nothing if *stats* is None."""
+    if stats is None:
+        return NO_TIMER
+    return stats.phase(name)
+
+
+def maybe_code(stats, kind, name=None):
+    """Like stats.code(kind, name), but does nothing if *stats* is None."""
+    if stats is None:
+        return NO_TIMER
+    return stats.code(kind, name)
+
+
+def code_scope(kind):
+    """Decorator for SourceWalker methods handling a nested code object,
+    recording it as a *kind* code object when the walker has stats."""
+    def decorator(method):
+        def wrapper(self, *args, **kwargs):
+            if self.stats is None:
+                return method(self, *args, **kwargs)
+            with self.stats.code(kind):
+                return method(self, *args, **kwargs)
+        wrapper.__name__ = method.__name__
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+    return decorator
+
+
+def count_nodes(ast):
+    """Return the number of nodes, including tokens, in *ast*."""
+    count = 1
+    if isinstance(ast, AST):
+        for kid in ast:
+            count += count_nodes(kid)
+    return count
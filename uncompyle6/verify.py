@@ -133,6 +133,63 @@ class CmpErrorMember(VerifyCmpError):
 # these members are ignored
 __IGNORE_CODE_MEMBERS__ = ['co_filename', 'co_firstlineno', 'co_lnotab', 'co_stacksize', 'co_names']
 
+# Scanners made by get_scanner(), by (version, is_pypy)
+_scanners = {}
+
+def get_scanner(version, is_pypy):
+    """Return (scanner module, scanner) for byte code of *version*. The
+    scanner is made on first use and then kept, so a process verifying
+    many files sets up each scanner only once."""
+    key = (version, is_pypy)
+    if key in _scanners:
+        return _scanners[key]
+    if version == 2.3:
+        import uncompyle6.scanners.scanner23 as scan
+        scanner = scan.Scanner23(show_asm=False)
+    elif version == 2.4:
+        import uncompyle6.scanners.scanner24 as scan
+        scanner = scan.Scanner24(show_asm=False)
+    elif version == 2.5:
+        import uncompyle6.scanners.scanner25 as scan
+        scanner = scan.Scanner25(show_asm=False)
+    elif version == 2.6:
+        import uncompyle6.scanners.scanner26 as scan
+        scanner = scan.Scanner26(show_asm=False)
+    elif version == 2.7:
+        if is_pypy:
+            import uncompyle6.scanners.pypy27 as scan
+            scanner = scan.ScannerPyPy27(show_asm=False)
+        else:
+            import uncompyle6.scanners.scanner27 as scan
+            scanner = scan.Scanner27()
+    elif version == 3.0:
+        import uncompyle6.scanners.scanner30 as scan
+        scanner = scan.Scanner30()
+    elif version == 3.1:
+        import uncompyle6.scanners.scanner32 as scan
+        scanner = scan.Scanner32()
+    elif version == 3.2:
+        if is_pypy:
+            import uncompyle6.scanners.pypy32 as scan
+            scanner = scan.ScannerPyPy32()
+        else:
+            import uncompyle6.scanners.scanner32 as scan
+            scanner = scan.Scanner32()
+    elif version == 3.3:
+        import uncompyle6.scanners.scanner33 as scan
+        scanner = scan.Scanner33()
+    elif version == 3.4:
+        import uncompyle6.scanners.scanner34 as scan
+        scanner = scan.Scanner34()
+    elif version == 3.5:
+        import uncompyle6.scanners.scanner35 as scan
+        scanner = scan.Scanner35()
+    elif version == 3.6:
+        import uncompyle6.scanners.scanner36 as scan
+        scanner = scan.Scanner36()
+    _scanners[key] = scan, scanner
+    return scan, scanner
+
 def cmp_code_objects(version, is_pypy, code_obj1, code_obj2,
                      name='', ignore_code=False):
     """
@@ -182,50 +239,7 @@ def cmp_code_objects(version, is_pypy, code_obj1, code_obj2,
         if member in __IGNORE_CODE_MEMBERS__ or ignore_code:
             pass
         elif member == 'co_code' and not ignore_code:
-            if version == 2.3:
-                import uncompyle6.scanners.scanner23 as scan
-                scanner = scan.Scanner23(show_asm=False)
-            elif version == 2.4:
-                import uncompyle6.scanners.scanner24 as scan
-                scanner = scan.Scanner24(show_asm=False)
-            elif version == 2.5:
-                import uncompyle6.scanners.scanner25 as scan
-                scanner = scan.Scanner25(show_asm=False)
-            elif version == 2.6:
-                import uncompyle6.scanners.scanner26 as scan
-                scanner = scan.Scanner26(show_asm=False)
-            elif version == 2.7:
-                if is_pypy:
-                    import uncompyle6.scanners.pypy27 as scan
-                    scanner = scan.ScannerPyPy27(show_asm=False)
-                else:
-                    import uncompyle6.scanners.scanner27 as scan
-                    scanner = scan.Scanner27()
-            elif version == 3.0:
-                import uncompyle6.scanners.scanner30 as scan
-                scanner = scan.Scanner30()
-            elif version == 3.1:
-                import uncompyle6.scanners.scanner32 as scan
-                scanner = scan.Scanner32()
-            elif version == 3.2:
-                if is_pypy:
-                    import uncompyle6.scanners.pypy32 as scan
-                    scanner = scan.ScannerPyPy32()
-                else:
-                    import uncompyle6.scanners.scanner32 as scan
-                    scanner = scan.Scanner32()
-            elif version == 3.3:
-                import uncompyle6.scanners.scanner33 as scan
-                scanner = scan.Scanner33()
-            elif version == 3.4:
-                import uncompyle6.scanners.scanner34 as scan
-                scanner = scan.Scanner34()
-            elif version == 3.5:
-                import uncompyle6.scanners.scanner35 as scan
-                scanner = scan.Scanner35()
-            elif version == 3.6:
-                import uncompyle6.scanners.scanner36 as scan
-                scanner = scan.Scanner36()
+            scan, scanner = get_scanner(version, is_pypy)
 
             global JUMP_OPs
             JUMP_OPs = list(scan.JUMP_OPs) + ['JUMP_BACK']